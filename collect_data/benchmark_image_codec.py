@@ -0,0 +1,88 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 13:42:27
+LastEditors: WANG Maonan
+Description: 比较不同 image codec 的编码速度和文件大小 (使用采集得到的真实图片)
++ Command Example: python benchmark_image_codec.py --frames ../exp_dataset/France_Massy_easy_high_density_none/ --workers 8
++ 不指定 --frames 时使用 assets/dataset 中的 low_quality_rgb 图片
+LastEditTime: 2026-10-18 13:42:30
+'''
+import os
+import cv2
+import glob
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from tshub.utils.get_abs_path import get_abs_path
+from utils.io_utils.image_codec import make_image_codec
+
+path_convert = get_abs_path(__file__)
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=str, default=path_convert("../assets/dataset/"), help="图片所在的文件夹, 会查找所有 low_quality_rgb 中的 png")
+    parser.add_argument("--codecs", type=str, nargs="+", default=["png", "png:1", "png:3", "png:9", "webp", "jpeg:95", "jpeg:85", "raw"])
+    parser.add_argument("--max-frames", type=int, default=200, help="最多使用多少张图片")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并行编码的线程数量")
+    return parser.parse_args()
+
+def load_frames(root_dir, max_frames):
+    """读取 low_quality_rgb 中的图片, 返回 RGB 格式
+    """
+    image_paths = sorted(glob.glob(os.path.join(root_dir, "**", "low_quality_rgb", "*.png"), recursive=True))
+    frames = []
+    for image_path in image_paths[:max_frames]:
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if image is not None:
+            frames.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    if not frames:
+        raise FileNotFoundError(f"{root_dir} 中没有找到 low_quality_rgb 图片")
+    return frames
+
+def benchmark_codec(codec, frames, workers):
+    # 单线程编码
+    start_time = time.perf_counter()
+    encoded = [codec.encode(_frame) for _frame in frames]
+    encode_ms = (time.perf_counter() - start_time) * 1000 / len(frames)
+
+    # 解码 (检查是否无损)
+    start_time = time.perf_counter()
+    decoded = [codec.decode(_data) for _data in encoded]
+    decode_ms = (time.perf_counter() - start_time) * 1000 / len(frames)
+    lossless = all(np.array_equal(_frame, _decoded) for _frame, _decoded in zip(frames, decoded))
+
+    # 多线程编码, 与 AsyncArtifactWriter 相同
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        start_time = time.perf_counter()
+        list(executor.map(codec.encode, frames))
+        parallel_fps = len(frames) / (time.perf_counter() - start_time)
+
+    return {
+        "encode_ms": encode_ms,
+        "decode_ms": decode_ms,
+        "bytes": sum(len(_data) for _data in encoded) / len(frames),
+        "parallel_fps": parallel_fps,
+        "lossless": lossless,
+    }
+
+if __name__ == '__main__':
+    args = parse_args()
+    frames = load_frames(args.frames, args.max_frames)
+    height, width = frames[0].shape[:2]
+    print(f"图片数量: {len(frames)}, 分辨率: {width}x{height}, 并行线程: {args.workers}")
+
+    raw_bytes = np.mean([_frame.nbytes for _frame in frames]) # 不压缩时每张图片的大小
+    print(f"{'codec':<10}{'encode ms/frame':>18}{'decode ms/frame':>18}{'KB/frame':>12}{'ratio':>8}{'fps (parallel)':>16}{'lossless':>10}")
+    for codec_name in args.codecs:
+        result = benchmark_codec(make_image_codec(codec_name), frames, args.workers)
+        print(
+            f"{codec_name:<10}"
+            f"{result['encode_ms']:>18.2f}"
+            f"{result['decode_ms']:>18.2f}"
+            f"{result['bytes']/1024:>12.1f}"
+            f"{raw_bytes/result['bytes']:>8.1f}"
+            f"{result['parallel_fps']:>16.1f}"
+            f"{str(result['lossless']):>10}"
+        )
@@ -0,0 +1,62 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 20:58:42
+LastEditors: WANG Maonan
+Description: 生成场景和车辆模型的缓存 (.bam), 之后 TSCEnvironment3D 启动时直接读取缓存, 见 utils/env_utils/asset_cache.py
++ Command Example: python build_asset_cache.py --map France_Massy
++ 只转换变化的模型 (sha1 与 sources.json 不同), --rebuild 重新转换所有模型
+LastEditTime: 2026-10-18 22:21:30
+'''
+import os
+import time
+import argparse
+from loguru import logger
+from tshub.utils.get_abs_path import get_abs_path
+
+from utils.env_utils.asset_cache import (
+    enable_model_cache,
+    model_files,
+    file_sha1,
+    load_cache_manifest,
+    save_cache_manifest,
+)
+
+path_convert = get_abs_path(__file__)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="生成 3D 模型的缓存")
+    parser.add_argument("--map", type=str, required=True, help="场景名称, 例如 France_Massy")
+    parser.add_argument("--no-vehicles", action="store_true", help="不转换 tshub 中的车辆模型")
+    parser.add_argument("--rebuild", action="store_true", help="重新转换所有模型")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    scenario_glb_dir = path_convert(f"../exp_networks/{args.map}/3d_assets/")
+    if not os.path.isdir(scenario_glb_dir):
+        raise FileNotFoundError(f"{scenario_glb_dir} 不存在")
+    enable_model_cache(scenario_glb_dir, create=True) # 需要在 ShowBase 之前设置
+
+    from panda3d.core import Filename
+    from direct.showbase.ShowBase import ShowBase
+    base = ShowBase(windowType='none') # 不需要窗口, 只使用 loader
+
+    # 模型的名称: 场景模型使用相对 3d_assets 的路径, 车辆模型使用 tshub/ 开头的路径
+    models = model_files(scenario_glb_dir, include_vehicles=not args.no_vehicles)
+
+    manifest = {} if args.rebuild else load_cache_manifest(scenario_glb_dir)
+    num_built = 0
+    for _name, _path in sorted(models.items()):
+        _sha1 = file_sha1(_path)
+        if manifest.get(_name) == _sha1:
+            continue
+        start_time = time.perf_counter()
+        base.loader.loadModel(Filename.fromOsSpecific(_path), noCache=False) # 加载时写入缓存
+        manifest[_name] = _sha1
+        num_built += 1
+        logger.info(f"SIM: 缓存 {_name}, {time.perf_counter() - start_time:.2f} s")
+
+    manifest = {_name: _sha1 for _name, _sha1 in manifest.items() if _name in models} # 删除已经不存在的模型
+    save_cache_manifest(scenario_glb_dir, manifest)
+    logger.info(f"SIM: {len(models)} 个模型, 转换 {num_built} 个, 缓存在 {scenario_glb_dir}")
+    base.destroy()
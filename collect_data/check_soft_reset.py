@@ -0,0 +1,112 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 23:38:05
+LastEditors: WANG Maonan
+Description: 检查 soft reset 之后的 episode 与完整 reset 的 episode 保存的数据是否相同
++ 同一个环境 (COLLECT.SOFT_RESET=true) 使用相同的事故和固定配时运行两个 episode:
+  第一个 episode 是完整的 reset (创建 3D 场景), 第二个 episode 是 soft reset (只重启 SUMO)
++ 比较两个 episode 的 manifest: 每个 step 的文件和 crc32 (图片, 3d_vehs.json, annotations, ...) 都需要相同
++ 数据保存在 exp_dataset/<MAP>_<SCENE>_soft_reset_check/{full,soft}/, 不一致时报错
++ Command Example: MAP=France_Massy SCENE=easy_high_density_none python check_soft_reset.py COLLECT.SOFT_RESET=true NUM_SECONDS=120
+LastEditTime: 2026-10-18 23:38:10
+'''
+import hydra
+from loguru import logger
+from omegaconf import DictConfig, OmegaConf
+
+from tshub.utils.get_abs_path import get_abs_path
+from tshub.utils.init_log import set_logger
+
+from utils.env_utils.make_env import make_env, parse_collect_config
+from utils.io_utils.episode_manifest import load_manifest
+
+path_convert = get_abs_path(__file__)
+set_logger(path_convert('./'))
+
+def compare_manifests(full_path: str, soft_path: str):
+    """两个 episode 中不同的文件, [(step, key, 原因), ...]
+    """
+    full_manifest, soft_manifest = load_manifest(full_path) or {}, load_manifest(soft_path) or {}
+    differences = []
+    for _step in sorted(set(full_manifest) | set(soft_manifest)):
+        if _step not in full_manifest or _step not in soft_manifest:
+            differences.append((_step, None, "只有一个 episode 保存了这个 step"))
+            continue
+        full_files, soft_files = full_manifest[_step]['files'], soft_manifest[_step]['files']
+        for _key in sorted(set(full_files) | set(soft_files)):
+            if _key not in full_files or _key not in soft_files:
+                differences.append((_step, _key, "只有一个 episode 有这个文件"))
+            elif full_files[_key]['crc32'] != soft_files[_key]['crc32']:
+                differences.append((_step, _key, "内容不同"))
+    return differences
+
+@hydra.main(
+    config_path=path_convert("../exp_networks/_config/"), # 配置文件所在的文件夹
+    config_name="selector"
+)
+def main(cfg: DictConfig):
+    OmegaConf.resolve(cfg) # 解析 cfg
+    if not cfg.COLLECT.SOFT_RESET:
+        raise ValueError("需要使用 COLLECT.SOFT_RESET=true")
+    SCENARIO_IDX = f"{cfg.map}_{cfg.scene}" # 场景 id
+    SCENARIO_NAME = cfg.SCENARIO_NAME
+    JUNCTION_NAME = cfg.JUNCTION_NAME
+
+    # 初始化场景飞行器位置, 获得俯视角图像
+    aircraft_inits = {
+        'a1': {
+            "aircraft_type": "drone",
+            "action_type": "stationary", # 水平移动
+            "position": cfg.CENTER_COORDINATES, "speed":3, "heading":(1,1,0), # 初始位置
+            "communication_range":100, 
+            "if_sumo_visualization":True, "img_file":None,
+            "custom_update_cover_radius":None # 使用自定义的计算
+        },
+    }
+
+    check_path = path_convert(f"../exp_dataset/{SCENARIO_IDX}_soft_reset_check/")
+    env3d = None # 第一个 episode 创建 (完整的 reset), 第二个 episode 使用 soft reset
+    for _episode in ["full", "soft"]:
+        tsc_env = make_env(
+            tls_id=JUNCTION_NAME,
+            sumo_cfg=path_convert(f"../exp_networks/{SCENARIO_NAME}/{cfg.SUMOCFG}"),
+            net_file=path_convert(f"../exp_networks/{SCENARIO_NAME}/{cfg.NETFILE}"),
+            scenario_glb_dir=path_convert(f"../exp_networks/{SCENARIO_NAME}/3d_assets/"),
+            trip_info=f"{check_path}/tripinfo.out.xml",
+            movement_num=cfg.MOVEMENT_NUMBER,
+            phase_num=cfg.PHASE_NUMBER,
+            num_seconds=cfg.NUM_SECONDS,
+            accident_config=cfg.ACCIDENTS,
+            special_vehicle_config=cfg.SPECIAL_VEHICLES,
+            use_gui=cfg.COLLECT.USE_GUI,
+            aircraft_inits=aircraft_inits,
+            preset="480P",
+            vehicle_model='high',
+            resolution=1,
+            base_path=f"{check_path}/{_episode}/",
+            env=env3d,
+            **{**parse_collect_config(cfg.COLLECT), 'resume': False},
+        )
+        env3d = tsc_env.env
+
+        # 固定配时, 两个 episode 的动作相同
+        dones = False
+        tsc_env.reset()
+        index = 0
+        REPEAT_NUMBER = 5 # 每个 traffic phase 重复的次数
+        while not dones:
+            action = (index // REPEAT_NUMBER) % cfg.PHASE_NUMBER
+            states, rewards, truncated, dones, infos = tsc_env.step(action=action)
+            index += 1
+        tsc_env.close_outputs()
+    env3d.close()
+
+    differences = compare_manifests(f"{check_path}/full/", f"{check_path}/soft/")
+    for _step, _key, _reason in differences[:20]:
+        logger.error(f"SIM: step {_step}, {_key}: {_reason}")
+    if differences:
+        raise RuntimeError(f"soft reset 与完整 reset 的数据不同, {len(differences)} 处, 见 {check_path}")
+    logger.info(f"SIM: soft reset 与完整 reset 的数据相同 ({check_path})")
+
+if __name__ == '__main__':
+    main()
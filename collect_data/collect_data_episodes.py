@@ -0,0 +1,137 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 22:57:12
+LastEditors: WANG Maonan
+Description: 同一个地图依次收集多个事故配置 (envs/<MAP>/accident/), 使用固定配时, 所有 episode 共用一个 SUMO 和 3D 场景
++ COLLECT.SOFT_RESET=true 时每个 episode 只重启 SUMO, 不重新加载地图和模型 (见 tsc_env3d.py)
++ 事故配置使用 set_special_events 更换, 特殊车辆使用场景中的配置
++ 每个 episode 保存在 exp_dataset/<MAP>_<SCENE>/<accident>/
++ Command Example: MAP=France_Massy SCENE=easy_high_density_none python collect_data_episodes.py COLLECT.SOFT_RESET=true COLLECT.USE_GUI=false
+LastEditTime: 2026-10-18 22:57:15
+'''
+import os
+import glob
+import hydra
+from loguru import logger
+from omegaconf import DictConfig, OmegaConf
+
+from tshub.utils.get_abs_path import get_abs_path
+from tshub.utils.init_log import set_logger
+from tshub.utils.format_dict import save_str_to_json
+
+from utils.env_utils.make_env import make_env, parse_collect_config
+
+path_convert = get_abs_path(__file__)
+set_logger(path_convert('./'))
+
+def load_accident_sets(map_name: str, accident_names=None):
+    """{名称: ACCIDENTS}, accident_names 为 None 时读取 envs/<map_name>/accident/ 中的全部配置
+    """
+    accident_dir = path_convert(f"../exp_networks/_config/envs/{map_name}/accident/")
+    if accident_names is None:
+        accident_names = sorted(
+            os.path.splitext(os.path.basename(_file))[0] for _file in glob.glob(os.path.join(accident_dir, "*.yaml"))
+        )
+    accident_sets = {}
+    for _name in accident_names:
+        _accidents = OmegaConf.load(os.path.join(accident_dir, f"{_name}.yaml")).ACCIDENTS
+        accident_sets[_name] = OmegaConf.to_container(_accidents) if _accidents is not None else None # none.yaml 没有事故
+    return accident_sets
+
+@hydra.main(
+    config_path=path_convert("../exp_networks/_config/"), # 配置文件所在的文件夹
+    config_name="selector"
+)
+def main(cfg: DictConfig):
+    OmegaConf.resolve(cfg) # 解析 cfg
+    print(f"Running on map: {cfg.map}")
+    print(f"Using scene: {cfg.scene}")
+    # 读取场景配置
+    SCENARIO_IDX = f"{cfg.map}_{cfg.scene}" # 场景 id
+    # base
+    SCENARIO_NAME = cfg.SCENARIO_NAME
+    JUNCTION_NAME = cfg.JUNCTION_NAME
+    NUM_SECONDS = cfg.NUM_SECONDS # 仿真时间
+    CENTER_COORDINATES = cfg.CENTER_COORDINATES
+    PHASE_NUMBER = cfg.PHASE_NUMBER # 绿灯相位数量
+    MOVEMENT_NUMBER = cfg.MOVEMENT_NUMBER # 有效 movement 的数量
+    # networks & sumocfg
+    SUMOCFG = cfg.SUMOCFG
+    NETFILE = cfg.NETFILE
+    # accidents & sepcial vehicles
+    ACCIDENT_SETS = load_accident_sets(cfg.map, cfg.COLLECT.EPISODE_ACCIDENTS) # 每个 episode 的事故
+    SPECIAL_VEHICLES = cfg.SPECIAL_VEHICLES # 定义特殊车辆
+
+    # 初始化场景飞行器位置, 获得俯视角图像
+    aircraft_inits = {
+        'a1': {
+            "aircraft_type": "drone",
+            "action_type": "stationary", # 水平移动
+            "position": CENTER_COORDINATES, "speed":3, "heading":(1,1,0), # 初始位置
+            "communication_range":100, 
+            "if_sumo_visualization":True, "img_file":None,
+            "custom_update_cover_radius":None # 使用自定义的计算
+        },
+    }
+
+    # 初始化仿真参数
+    sumo_cfg = path_convert(f"../exp_networks/{SCENARIO_NAME}/{SUMOCFG}")
+    net_file = path_convert(f"../exp_networks/{SCENARIO_NAME}/{NETFILE}")
+    scenario_glb_dir = path_convert(f"../exp_networks/{SCENARIO_NAME}/3d_assets/")
+    trip_info = path_convert(f"../exp_dataset/{SCENARIO_IDX}/tripinfo_episodes.out.xml") # 每个 episode 覆盖
+
+    env3d = None # 第一个 episode 创建, 之后的 episode 共用
+    for _accident_name, _accidents in ACCIDENT_SETS.items():
+        base_path = path_convert(f"../exp_dataset/{SCENARIO_IDX}/{_accident_name}/") # 存储路径
+        logger.info(f"SIM: episode {_accident_name}, 保存在 {base_path}")
+        tsc_env = make_env(
+            tls_id=JUNCTION_NAME,
+            sumo_cfg=sumo_cfg,
+            net_file=net_file,
+            scenario_glb_dir=scenario_glb_dir,
+            trip_info=trip_info,
+            movement_num=MOVEMENT_NUMBER,
+            phase_num=PHASE_NUMBER,
+            num_seconds=NUM_SECONDS,
+            accident_config=_accidents,
+            special_vehicle_config=SPECIAL_VEHICLES,
+            use_gui=cfg.COLLECT.USE_GUI,
+            aircraft_inits=aircraft_inits,
+            preset="480P",
+            vehicle_model='high',
+            resolution=1,
+            base_path=base_path,
+            env=env3d,
+            **parse_collect_config(cfg.COLLECT),
+        )
+        env3d = tsc_env.env
+        env3d.set_special_events(_accidents, SPECIAL_VEHICLES) # 下一次 reset 时生效
+
+        # Interact with Environment
+        dones = False
+        rl_state, infos = tsc_env.reset()
+        index = len(tsc_env.replayed_actions) # resume 时从重放之后的决策继续
+        REPEAT_NUMBER = 5 # 每个 traffic phase 重复的次数
+
+        while not dones:
+            action = (index // REPEAT_NUMBER) % tsc_env.phase_num
+            states, rewards, truncated, dones, infos = tsc_env.step(action=action)
+            index += 1
+
+        # 存储全局信息
+        global_infos = {
+            "scenario_name": SCENARIO_NAME,
+            "tls_id": JUNCTION_NAME,
+            "accidents": _accident_name,
+            "can_perform_action": {**tsc_env.can_perform_action_infos},
+            "capture_policy": str(tsc_env.capture_policy),
+            "captured_steps": tsc_env.captured_steps, # 保存了图片和 JSON 的时刻
+        }
+        save_str_to_json(global_infos, os.path.join(base_path, "global.json"))
+        tsc_env.close_outputs() # 只关闭这个 episode 的文件, 环境留给下一个 episode
+
+    if env3d is not None:
+        env3d.close()
+
+if __name__ == '__main__':
+    main()
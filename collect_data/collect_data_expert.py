@@ -4,7 +4,7 @@ Date: 2025-07-10 17:41:22
 LastEditors: WANG Maonan
 Description: 专家策略, rl+rule
 + Command Example: MAP=France_Massy SCENE=easy_random_perturbation_barrier python collect_data_expert.py
-LastEditTime: 2025-08-12 11:51:51
+LastEditTime: 2026-10-18 19:36:12
 '''
 import os
 import torch
@@ -16,7 +16,7 @@ from tshub.utils.get_abs_path import get_abs_path
 from tshub.utils.init_log import set_logger
 from tshub.utils.format_dict import save_str_to_json
 
-from utils.env_utils.make_env import make_env
+from utils.env_utils.make_env import make_env, parse_collect_config
 from utils.rl_utils.simple_int import IntersectionNet
 
 from parse_infos.get_expert_action import ExpertTrafficSignalController # 专家决策器
@@ -97,11 +97,12 @@ def main(cfg: DictConfig):
         num_seconds=NUM_SECONDS,
         accident_config=ACCIDENTS,
         special_vehicle_config=SPECIAL_VEHICLES,
-        use_gui=True,
+        use_gui=cfg.COLLECT.USE_GUI,
         aircraft_inits=aircraft_inits,
         preset="480P",
         resolution=1,
         base_path=base_path,
+        **parse_collect_config(cfg.COLLECT),
     )
 
     # Interact with Environment
@@ -126,7 +127,9 @@ def main(cfg: DictConfig):
     global_infos = {
         "scenario_name": SCENARIO_NAME,
         "tls_id": JUNCTION_NAME,
-        "can_perform_action": {**tsc_env.can_perform_action_infos}
+        "can_perform_action": {**tsc_env.can_perform_action_infos},
+        "capture_policy": str(tsc_env.capture_policy),
+        "captured_steps": tsc_env.captured_steps, # 保存了图片和 JSON 的时刻
     }
     save_str_to_json(global_infos, os.path.join(base_path, "global.json"))
 
@@ -4,7 +4,7 @@ Date: 2025-07-10 17:41:22
 LastEditors: WANG Maonan
 Description: max queue length + rule
 + Command Example: MAP=Hongkong_YMT SCENE=normal_fluctuating_commuter_barrier python collect_data_expert_rule.py
-LastEditTime: 2025-12-19 14:12:55
+LastEditTime: 2026-10-18 19:36:12
 '''
 import os
 import hydra
@@ -14,7 +14,7 @@ from tshub.utils.get_abs_path import get_abs_path
 from tshub.utils.init_log import set_logger
 from tshub.utils.format_dict import save_str_to_json
 
-from utils.env_utils.make_env import make_env
+from utils.env_utils.make_env import make_env, parse_collect_config
 
 from parse_infos.get_expert_action_maxq import ExpertTrafficSignalController # 专家决策器
 
@@ -86,11 +86,12 @@ def main(cfg: DictConfig):
         num_seconds=NUM_SECONDS,
         accident_config=ACCIDENTS,
         special_vehicle_config=SPECIAL_VEHICLES,
-        use_gui=True,
+        use_gui=cfg.COLLECT.USE_GUI,
         aircraft_inits=aircraft_inits,
         preset="480P",
         resolution=1,
         base_path=base_path,
+        **parse_collect_config(cfg.COLLECT),
     )
 
     # Interact with Environment
@@ -105,6 +106,12 @@ def main(cfg: DictConfig):
     current_phase = None  # 当前相位
     phase_duration = 0    # 当前相位持续时间（秒）
     GREEN_TIME_STEP = 5   # 每步绿灯时间（秒）
+    for decision in tsc_env.replayed_actions: # resume 时根据重放的动作恢复相位的持续时间
+        if decision == current_phase:
+            phase_duration += GREEN_TIME_STEP
+        else:
+            current_phase = decision
+            phase_duration = GREEN_TIME_STEP
 
     while not dones:
         decision = expert_decision.decide(
@@ -128,7 +135,9 @@ def main(cfg: DictConfig):
     global_infos = {
         "scenario_name": SCENARIO_NAME,
         "tls_id": JUNCTION_NAME,
-        "can_perform_action": {**tsc_env.can_perform_action_infos}
+        "can_perform_action": {**tsc_env.can_perform_action_infos},
+        "capture_policy": str(tsc_env.capture_policy),
+        "captured_steps": tsc_env.captured_steps, # 保存了图片和 JSON 的时刻
     }
     save_str_to_json(global_infos, os.path.join(base_path, "global.json"))
 
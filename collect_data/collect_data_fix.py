@@ -3,7 +3,7 @@ Author: WANG Maonan
 Date: 2025-06-25 16:45:03
 LastEditors: WANG Maonan
 Description: 使用固定配时收集信息
-LastEditTime: 2025-09-28 18:25:23
+LastEditTime: 2026-10-18 19:36:12
 '''
 import os
 import hydra
@@ -13,7 +13,7 @@ from tshub.utils.get_abs_path import get_abs_path
 from tshub.utils.init_log import set_logger
 from tshub.utils.format_dict import save_str_to_json
 
-from utils.env_utils.make_env import make_env
+from utils.env_utils.make_env import make_env, parse_collect_config
 
 def convert_rgb_to_bgr(image):
     # Convert an RGB image to BGR
@@ -79,18 +79,19 @@ def main(cfg: DictConfig):
         num_seconds=NUM_SECONDS,
         accident_config=ACCIDENTS,
         special_vehicle_config=SPECIAL_VEHICLES,
-        use_gui=True,
+        use_gui=cfg.COLLECT.USE_GUI,
         aircraft_inits=aircraft_inits,
         preset="480P",
         vehicle_model='high',
         resolution=1,
         base_path=base_path,
+        **parse_collect_config(cfg.COLLECT),
     )
 
     # Interact with Environment
     dones = False
     rl_state, infos = tsc_env.reset()
-    index = 0
+    index = len(tsc_env.replayed_actions) # resume 时从重放之后的决策继续
     REPEAT_NUMBER = 5 # 每个 traffic phase 重复的次数
 
     while not dones:
@@ -102,7 +103,9 @@ def main(cfg: DictConfig):
     global_infos = {
         "scenario_name": SCENARIO_NAME,
         "tls_id": JUNCTION_NAME,
-        "can_perform_action": {**tsc_env.can_perform_action_infos}
+        "can_perform_action": {**tsc_env.can_perform_action_infos},
+        "capture_policy": str(tsc_env.capture_policy),
+        "captured_steps": tsc_env.captured_steps, # 保存了图片和 JSON 的时刻
     }
     save_str_to_json(global_infos, os.path.join(base_path, "global.json"))
         
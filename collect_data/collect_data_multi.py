@@ -0,0 +1,126 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 20:12:31
+LastEditors: WANG Maonan
+Description: 多路口同时收集 (一个 SUMO 和一个 3D 场景), 每个路口使用固定配时, 数据保存在 exp_dataset/<场景>/<tls_id>/
++ 路口使用配置中的 JUNCTION_NAMES, 没有时只使用 JUNCTION_NAME
++ 每个路口的相位和 movement 数量使用 JUNCTION_PHASE_NUMBERS 和 JUNCTION_MOVEMENT_NUMBERS ({tls_id: int}),
+  没有时所有路口使用 PHASE_NUMBER 和 MOVEMENT_NUMBER (其他脚本使用的 int)
++ 俯视的飞行器图片所有路口相同, 只保存在 exp_dataset/<场景>/<step>/ 中
++ Command Example: 
+    MAP=SouthKorea_Songdo_3INTS SCENE=normal_high_density python collect_data_multi.py \
+        JUNCTION_NAMES=[J1,J2,J3] JUNCTION_PHASE_NUMBERS={J1:4,J2:4,J3:4} JUNCTION_MOVEMENT_NUMBERS={J1:12,J2:12,J3:12}
+LastEditTime: 2026-10-18 23:20:15
+'''
+import os
+import hydra
+from omegaconf import DictConfig, OmegaConf
+
+from tshub.utils.get_abs_path import get_abs_path
+from tshub.utils.init_log import set_logger
+from tshub.utils.format_dict import save_str_to_json
+
+from utils.env_utils.make_env import make_env, parse_collect_config
+
+path_convert = get_abs_path(__file__)
+set_logger(path_convert('./'))
+
+@hydra.main(
+    config_path=path_convert("../exp_networks/_config/"), # 配置文件所在的文件夹
+    config_name="selector"
+)
+def main(cfg: DictConfig):
+    OmegaConf.resolve(cfg) # 解析 cfg
+    print(f"Running on map: {cfg.map}")
+    print(f"Using scene: {cfg.scene}")
+    # 读取场景配置
+    SCENARIO_IDX = f"{cfg.map}_{cfg.scene}" # 场景 id
+    for _key in ["JUNCTION_NAMES", "JUNCTION_PHASE_NUMBERS", "JUNCTION_MOVEMENT_NUMBERS"]:
+        if _key in cfg.keys() and OmegaConf.is_missing(cfg, _key): # 配置中是 ??? (`in cfg` 对 ??? 返回 False)
+            raise ValueError(f"{_key} 需要在命令行中指定, 见 envs/{cfg.map}/base.yaml")
+    # base
+    SCENARIO_NAME = cfg.SCENARIO_NAME
+    JUNCTION_NAMES = list(cfg.get("JUNCTION_NAMES", [cfg.JUNCTION_NAME])) # 所有路口的 tls id
+    NUM_SECONDS = cfg.NUM_SECONDS # 仿真时间
+    CENTER_COORDINATES = cfg.CENTER_COORDINATES
+    PHASE_NUMBER = cfg.get("JUNCTION_PHASE_NUMBERS", cfg.PHASE_NUMBER) # 绿灯相位数量 ({tls_id: int} 或所有路口相同的 int)
+    MOVEMENT_NUMBER = cfg.get("JUNCTION_MOVEMENT_NUMBERS", cfg.MOVEMENT_NUMBER) # 有效 movement 的数量 ({tls_id: int} 或 int)
+    # networks & sumocfg
+    SUMOCFG = cfg.SUMOCFG
+    NETFILE = cfg.NETFILE
+    # accidents & sepcial vehicles
+    ACCIDENTS = cfg.ACCIDENTS # 定义的事故
+    SPECIAL_VEHICLES = cfg.SPECIAL_VEHICLES # 定义特殊车辆
+
+    # 初始化场景飞行器位置, 获得俯视角图像 (所有路口共用, 保存在 base_path 中)
+    aircraft_inits = {
+        'a1': {
+            "aircraft_type": "drone",
+            "action_type": "stationary", # 水平移动
+            "position": CENTER_COORDINATES, "speed":3, "heading":(1,1,0), # 初始位置
+            "communication_range":100,
+            "if_sumo_visualization":True, "img_file":None,
+            "custom_update_cover_radius":None # 使用自定义的计算
+        },
+    }
+
+    # 初始化仿真参数
+    sumo_cfg = path_convert(f"../exp_networks/{SCENARIO_NAME}/{SUMOCFG}")
+    net_file = path_convert(f"../exp_networks/{SCENARIO_NAME}/{NETFILE}")
+    scenario_glb_dir = path_convert(f"../exp_networks/{SCENARIO_NAME}/3d_assets/")
+    # 输出文件夹, 每个路口一个子文件夹
+    base_path = path_convert(f"../exp_dataset/{SCENARIO_IDX}/") # 存储路径
+    trip_info = path_convert(f"../exp_dataset/{SCENARIO_IDX}/tripinfo_multi.out.xml")
+
+    # Init Env
+    tsc_env = make_env(
+        tls_id=JUNCTION_NAMES,
+        sumo_cfg=sumo_cfg,
+        net_file=net_file,
+        scenario_glb_dir=scenario_glb_dir,
+        trip_info=trip_info,
+        movement_num=MOVEMENT_NUMBER,
+        phase_num=PHASE_NUMBER,
+        num_seconds=NUM_SECONDS,
+        accident_config=ACCIDENTS,
+        special_vehicle_config=SPECIAL_VEHICLES,
+        use_gui=cfg.COLLECT.USE_GUI,
+        aircraft_inits=aircraft_inits,
+        preset="480P",
+        vehicle_model='high',
+        resolution=1,
+        base_path=base_path,
+        **parse_collect_config(cfg.COLLECT),
+    )
+
+    # Interact with Environment
+    dones = False
+    rl_state, infos = tsc_env.reset()
+    decision_index = {_tls_id: 0 for _tls_id in JUNCTION_NAMES} # 每个路口的决策次数
+    REPEAT_NUMBER = 5 # 每个 traffic phase 重复的次数
+
+    while not dones:
+        action = {
+            _tls_id: (_index // REPEAT_NUMBER) % tsc_env.junctions[_tls_id].phase_num
+            for _tls_id, _index in decision_index.items()
+        }
+        states, rewards, truncated, dones, infos = tsc_env.step(action=action)
+        for _tls_id, _can_perform_action in infos['can_perform_action'].items():
+            decision_index[_tls_id] += int(_can_perform_action) # 只有做了决策的路口切换到下一个动作
+
+    # 存储每个路口的全局信息
+    for _tls_id, _junction in tsc_env.junctions.items():
+        global_infos = {
+            "scenario_name": SCENARIO_NAME,
+            "tls_id": _tls_id,
+            "junction_ids": JUNCTION_NAMES, # 同一个仿真中的所有路口
+            "can_perform_action": {**_junction.can_perform_action_infos},
+            "capture_policy": str(_junction.capture_policy),
+            "captured_steps": _junction.captured_steps, # 保存了图片和 JSON 的时刻
+        }
+        save_str_to_json(global_infos, os.path.join(_junction.base_path, "global.json"))
+
+    tsc_env.close()
+
+if __name__ == '__main__':
+    main()
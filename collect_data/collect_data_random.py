@@ -12,7 +12,7 @@ MAP: Beijing_Beihuan, Beijing_Beishahe, France_Massy
 
 可以使用预设的配置文件, 通过 selector 文件
 也可以自己组合文件
-LastEditTime: 2025-08-07 18:31:59
+LastEditTime: 2026-10-18 19:36:12
 '''
 import os
 import random
@@ -23,7 +23,7 @@ from tshub.utils.get_abs_path import get_abs_path
 from tshub.utils.init_log import set_logger
 from tshub.utils.format_dict import save_str_to_json
 
-from utils.env_utils.make_env import make_env
+from utils.env_utils.make_env import make_env, parse_collect_config
  
 def convert_rgb_to_bgr(image):
     # Convert an RGB image to BGR
@@ -88,12 +88,13 @@ def main(cfg: DictConfig):
         num_seconds=NUM_SECONDS,
         accident_config=ACCIDENTS,
         special_vehicle_config=SPECIAL_VEHICLES,
-        use_gui=True,
+        use_gui=cfg.COLLECT.USE_GUI,
         aircraft_inits=aircraft_inits,
         preset="480P",
         vehicle_model='high',
         resolution=1,
         base_path=base_path,
+        **parse_collect_config(cfg.COLLECT),
     )
 
     # Interact with Environment
@@ -108,7 +109,9 @@ def main(cfg: DictConfig):
     global_infos = {
         "scenario_name": SCENARIO_NAME,
         "tls_id": JUNCTION_NAME,
-        "can_perform_action": {**tsc_env.can_perform_action_infos}
+        "can_perform_action": {**tsc_env.can_perform_action_infos},
+        "capture_policy": str(tsc_env.capture_policy),
+        "captured_steps": tsc_env.captured_steps, # 保存了图片和 JSON 的时刻
     }
     save_str_to_json(global_infos, os.path.join(base_path, "global.json"))
         
@@ -0,0 +1,110 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 21:41:12
+LastEditors: WANG Maonan
+Description: 重放之前采集时保存的动作 (actions.jsonl), 不需要加载模型 (没有 torch/SB3)
++ 用于使用其他分辨率或图片格式重新生成数据集, 仿真与原来的数据相同 (相同的 SUMO seed 和动作)
++ 默认读取 exp_dataset/<MAP>_<SCENE>/actions.jsonl, 可以使用 COLLECT.REPLAY_ACTIONS 指定
++ 数据保存在 exp_dataset/<MAP>_<SCENE>_replay/
++ Command Example: MAP=France_Massy SCENE=easy_high_density_none python collect_data_replay.py COLLECT.REPLAY_PRESET=1080P COLLECT.IMAGE_CODEC=webp:90
+LastEditTime: 2026-10-18 21:41:15
+'''
+import os
+import hydra
+from omegaconf import DictConfig, OmegaConf
+
+from tshub.utils.get_abs_path import get_abs_path
+from tshub.utils.init_log import set_logger
+from tshub.utils.format_dict import save_str_to_json
+
+from utils.env_utils.make_env import make_env, parse_collect_config
+
+path_convert = get_abs_path(__file__)
+set_logger(path_convert('./'))
+
+@hydra.main(
+    config_path=path_convert("../exp_networks/_config/"), # 配置文件所在的文件夹
+    config_name="selector"
+)
+def main(cfg: DictConfig):
+    OmegaConf.resolve(cfg) # 解析 cfg
+    print(f"Running on map: {cfg.map}")
+    print(f"Using scene: {cfg.scene}")
+    # 读取场景配置
+    SCENARIO_IDX = f"{cfg.map}_{cfg.scene}" # 场景 id
+    # base
+    SCENARIO_NAME = cfg.SCENARIO_NAME
+    JUNCTION_NAME = cfg.JUNCTION_NAME # tls id
+    NUM_SECONDS = cfg.NUM_SECONDS # 仿真时间
+    CENTER_COORDINATES = cfg.CENTER_COORDINATES
+    PHASE_NUMBER = cfg.PHASE_NUMBER # 绿灯相位数量
+    MOVEMENT_NUMBER = cfg.MOVEMENT_NUMBER # 有效 movement 的数量
+    # networks & sumocfg
+    SUMOCFG = cfg.SUMOCFG
+    NETFILE = cfg.NETFILE
+    # accidents & sepcial vehicles
+    ACCIDENTS = cfg.ACCIDENTS # 定义的事故
+    SPECIAL_VEHICLES = cfg.SPECIAL_VEHICLES # 定义特殊车辆
+
+    # 初始化场景飞行器位置, 获得俯视角图像
+    aircraft_inits = {
+        'a1': {
+            "aircraft_type": "drone",
+            "action_type": "stationary", # 水平移动
+            "position": CENTER_COORDINATES, "speed":3, "heading":(1,1,0), # 初始位置
+            "communication_range":100,
+            "if_sumo_visualization":True, "img_file":None,
+            "custom_update_cover_radius":None # 使用自定义的计算
+        },
+    }
+
+    # configs for sim
+    sumo_cfg = path_convert(f"../exp_networks/{SCENARIO_NAME}/{SUMOCFG}")
+    net_file = path_convert(f"../exp_networks/{SCENARIO_NAME}/{NETFILE}")
+    scenario_glb_dir = path_convert(f"../exp_networks/{SCENARIO_NAME}/3d_assets/")
+    replay_actions = cfg.COLLECT.REPLAY_ACTIONS or path_convert(f"../exp_dataset/{SCENARIO_IDX}/actions.jsonl") # 需要重放的动作
+    base_path = path_convert(f"../exp_dataset/{SCENARIO_IDX}_replay/") # 存储路径
+    trip_info = path_convert(f"../exp_dataset/{SCENARIO_IDX}_replay/tripinfo_replay.out.xml")
+
+    # Init Env
+    tsc_env = make_env(
+        tls_id=JUNCTION_NAME,
+        sumo_cfg=sumo_cfg,
+        net_file=net_file,
+        scenario_glb_dir=scenario_glb_dir,
+        trip_info=trip_info,
+        movement_num=MOVEMENT_NUMBER,
+        phase_num=PHASE_NUMBER,
+        num_seconds=NUM_SECONDS,
+        accident_config=ACCIDENTS,
+        special_vehicle_config=SPECIAL_VEHICLES,
+        use_gui=cfg.COLLECT.USE_GUI,
+        aircraft_inits=aircraft_inits,
+        preset=cfg.COLLECT.REPLAY_PRESET,
+        resolution=1,
+        base_path=base_path,
+        replay_actions=replay_actions,
+        **parse_collect_config(cfg.COLLECT),
+    )
+
+    # Interact with Environment, 动作来自 actions.jsonl
+    dones = False
+    rl_state, infos = tsc_env.reset()
+    while not dones:
+        rl_state, rewards, truncated, dones, infos = tsc_env.step()
+
+    # 存储全局信息
+    global_infos = {
+        "scenario_name": SCENARIO_NAME,
+        "tls_id": JUNCTION_NAME,
+        "replay_actions": replay_actions,
+        "can_perform_action": {**tsc_env.can_perform_action_infos},
+        "capture_policy": str(tsc_env.capture_policy),
+        "captured_steps": tsc_env.captured_steps, # 保存了图片和 JSON 的时刻
+    }
+    save_str_to_json(global_infos, os.path.join(base_path, "global.json"))
+
+    tsc_env.close()
+
+if __name__ == '__main__':
+    main()
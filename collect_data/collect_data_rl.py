@@ -2,11 +2,13 @@
 Author: Maonan Wang
 Date: 2025-01-16 18:51:18
 Description: 使用 RL 执行策略并收集信息
++ Command Example: python collect_data_rl.py --no-gui (libsumo, 无界面)
 LastEditors: WANG Maonan
-LastEditTime: 2025-07-29 15:56:33
+LastEditTime: 2026-10-18 22:05:41
 '''
 import os
 import torch
+import argparse
 from stable_baselines3 import PPO
 
 from tshub.utils.get_abs_path import get_abs_path
@@ -51,7 +53,13 @@ aircraft_inits = {
     },
 }
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="使用 RL 策略收集数据")
+    parser.add_argument("--no-gui", action="store_true", help="不打开 sumo-gui, 使用 libsumo 仿真 (与 COLLECT.USE_GUI=false 相同)")
+    return parser.parse_args()
+
 if __name__ == '__main__':
+    args = parse_args()
     tls_id = JUNCTION_NAME
     sumo_cfg = path_convert(f"../exp_networks/{SCENARIO_NAME}/{SUMOCFG}")
     net_file = path_convert(f"../exp_networks/{SCENARIO_NAME}/{NETFILE}")
@@ -84,7 +92,7 @@ if __name__ == '__main__':
         num_seconds=NUM_SECONDS,
         accident_config=ACCIDENTS,
         special_vehicle_config=SPECIAL_VEHICLES,
-        use_gui=True,
+        use_gui=not args.no_gui,
         aircraft_inits=aircraft_inits,
         preset="480P",
         resolution=1,
@@ -103,7 +111,9 @@ if __name__ == '__main__':
     global_infos = {
         "scenario_name": SCENARIO_NAME,
         "tls_id": JUNCTION_NAME,
-        "can_perform_action": {**tsc_env.can_perform_action_infos}
+        "can_perform_action": {**tsc_env.can_perform_action_infos},
+        "capture_policy": str(tsc_env.capture_policy),
+        "captured_steps": tsc_env.captured_steps, # 保存了图片和 JSON 的时刻
     }
     save_str_to_json(global_infos, os.path.join(base_path, "global.json"))
 
@@ -9,48 +9,59 @@ Description: 根据 JSON 文件产生描述图片的 QA
 @ 定量问题
 -> 进口道每个车道有多少车
 -> 出口道每个车道有多少车
++ Command Example: python generate_vqa.py --json-codec zstd:10 (QA 保存为 .json.zst, 默认不压缩)
 LastEditors: WANG Maonan
-LastEditTime: 2025-09-11 16:38:37
+LastEditTime: 2026-10-18 23:45:10
 '''
 import os
 import json
+import argparse
 from parse_infos.json2vqa import TrafficLightVQA
+from utils.io_utils.episode_reader import EpisodeReader
+from utils.io_utils.json_codec import make_json_codec
 from tshub.utils.get_abs_path import get_abs_path
 
 path_convert = get_abs_path(__file__)
 
-def generate_and_save_vqa(root_dir, distance_mapping):
+def save_dictionary(root_dir):
+    """zstd 字典保存在 episode 中, 与采集时的字典放在一起
+    """
+    def _save(key, dict_data):
+        dict_path = os.path.join(root_dir, key)
+        os.makedirs(os.path.dirname(dict_path), exist_ok=True)
+        with open(dict_path, 'wb') as f:
+            f.write(dict_data)
+    return _save
+
+def generate_and_save_vqa(root_dir, distance_mapping, json_codec="json"):
     """
     批量处理JSON目录结构并保存VQA结果到各timestep/qa目录
     
     Args:
         root_dir: 根目录路径 (包含timestep子目录)
         distance_mapping: 字典 {1: 100, 2: 200, 3: 50}
+        json_codec: QA 的保存方式, json 或是 zstd (保存为 .json.zst, 使用 EpisodeReader/load_json_file 读取)
     """
-    # 遍历每个timestep目录
-    for timestep in os.listdir(root_dir):
-        timestep_path = os.path.join(root_dir, timestep, 'annotations')
-        if not os.path.isdir(timestep_path):
+    codec = make_json_codec(json_codec, on_dictionary=save_dictionary(root_dir))
+    # 使用 manifest 获得所有 timestep (之前的数据遍历文件夹), annotation 会与 topology.json 合并
+    reader = EpisodeReader(root_dir)
+    for timestep in reader.steps():
+        directions = reader.directions(timestep)
+        if not directions:
             continue
         
         # 创建 qa 目录
-        qa_dir = os.path.join(timestep_path, '../QA')
+        qa_dir = os.path.join(root_dir, str(timestep), 'QA')
         os.makedirs(qa_dir, exist_ok=True)
         
-        # 处理该timestep下的每个JSON文件
-        for json_file in sorted(os.listdir(timestep_path)):
-            if not json_file.endswith('.json'):
-                continue
-                
-            # 从文件名提取数字 (如"1.json" -> 1)
-            file_num = int(os.path.splitext(json_file)[0])    
+        # 处理该timestep下的每个方向
+        for file_num in directions:
+            json_file = f"{file_num}.json"
             # 获取对应的max_distance
             max_dist = distance_mapping.get(file_num, 100)  # 默认100
             
             # 加载JSON数据
-            json_path = os.path.join(timestep_path, json_file)
-            with open(json_path, 'r') as f:
-                data = json.load(f)
+            data = reader.read_annotation(timestep, file_num)
             
             # 初始化并生成VQA数据
             vqa_results = TrafficLightVQA(
@@ -60,12 +71,21 @@ def generate_and_save_vqa(root_dir, distance_mapping):
             
             # 保存到qa目录 (保留原文件名)
             output_path = os.path.join(qa_dir, json_file)
-            with open(output_path, 'w') as f:
-                json.dump(vqa_results, f, indent=2)
+            if codec is None:
+                with open(output_path, 'w') as f:
+                    json.dump(vqa_results, f, indent=2)
+            else:
+                with open(f"{output_path}{codec.extension}", 'wb') as f:
+                    f.write(codec.dumps(vqa_results))
             
-            print(f"Generated: {os.path.join(timestep, 'qa', json_file)}")
+            print(f"Generated: {os.path.join(str(timestep), 'qa', json_file)}")
+    reader.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json-codec", default="json", help="QA 的保存方式: json, zstd 或 zstd:<1-22>")
+    args = parser.parse_args()
+
     for i in [
         "SouthKorea_Songdo_easy_fluctuating_commuter_barrier",
         "SouthKorea_Songdo_easy_fluctuating_commuter_branch",
@@ -96,4 +116,4 @@ if __name__ == "__main__":
         } # 每个方向的观测距离
         
         # 生成并保存结果
-        results = generate_and_save_vqa(DATA_ROOT, DISTANCE_MAPPING)
\ No newline at end of file
+        results = generate_and_save_vqa(DATA_ROOT, DISTANCE_MAPPING, json_codec=args.json_codec)
\ No newline at end of file
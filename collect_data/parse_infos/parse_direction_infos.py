@@ -6,9 +6,14 @@ Description: 将路口信息处理为每个方向的信息
     - 获得 road 对应的 lane（可以计算车道数）
     - vehicles 筛选出当前 in_road 的车辆
     - 所有 phase 的信息, 和 this phase index
+- 不变的信息 (road, lane 长度, traffic phase) 每个 episode 只保存一次 (topology.json),
+  每个时刻的 annotations 只保存变化的信息 (current phase, vehicles), 读取时使用 merge_direction_info 合并
+  (topology 使用 EpisodeReader.read_topology 读取, 支持 shard 和 zstd)
 LastEditors: WANG Maonan
-LastEditTime: 2025-07-16 17:13:45
+LastEditTime: 2026-10-18 22:18:20
 '''
+TOPOLOGY_FILE = "topology.json"
+
 class TrafficState2DICT(object):
     def __init__(self, tls_id: str, raw_infos):
         """初始化类并计算不变的信息, 需要计算:
@@ -25,6 +30,7 @@ class TrafficState2DICT(object):
             key=tls_info['in_roads_heading'].get
         ) # 进入路口的车道 ID
         self.sorted_out_road_ids = self.__calculate_sorted_out_road_ids(tls_info) # 离开路口的车道 ID
+        self.topology = self.get_topology(raw_infos) # 路口不变的信息
     
     def __calculate_sorted_out_road_ids(self, tls_info):
         """计算并返回旋转后的 sorted_out_road_ids
@@ -39,25 +45,38 @@ class TrafficState2DICT(object):
     
     # -----
 
-    def get_direction_info(self, raw_infos):
-        """将 info 转换为每个方向的信息
+    def get_topology(self, raw_infos):
+        """路口不变的信息, 每个 episode 保存一次
         """
         tls_info = raw_infos['state']['tls'][self.tls_id]
-        vehicle_info = raw_infos['state']['vehicle']
         lane_info = raw_infos['state']['lane']
 
-        direction_infos = {}
+        directions = {}
         for direction_idx, (_in_road_id, _out_road_id) in enumerate(zip(self.sorted_in_road_ids, self.sorted_out_road_ids)):
-            _direction_info = {
+            directions[direction_idx] = {
                 'in_road': _in_road_id,
                 'out_road': _out_road_id,
                 'in_lanes': {_lane_id:lane_info[_lane_id]['length'] for _lane_id in tls_info['roads_lanes'][_in_road_id]},
                 'out_lanes': {_lane_id:lane_info[_lane_id]['length'] for _lane_id in tls_info['roads_lanes'][_out_road_id]},
+            }
+        return {
+            'tls_id': self.tls_id,
+            'traffic_phase': tls_info['phase2movements'],
+            'directions': directions,
+        }
+
+    def get_direction_info(self, raw_infos):
+        """将 info 转换为每个方向的信息 (只包含变化的信息, 完整的信息需要与 topology 合并)
+        """
+        tls_info = raw_infos['state']['tls'][self.tls_id]
+        vehicle_info = raw_infos['state']['vehicle']
+
+        direction_infos = {}
+        for direction_idx, (_in_road_id, _out_road_id) in enumerate(zip(self.sorted_in_road_ids, self.sorted_out_road_ids)):
+            direction_infos[direction_idx] = {
                 'current_phase': tls_info['this_phase_index'],
-                'traffic_phase': tls_info['phase2movements'],
                 'vehicles': self._get_direction_vehicles(_in_road_id, _out_road_id, vehicle_info)
             }
-            direction_infos[direction_idx] = _direction_info
         return direction_infos
 
     def _get_direction_vehicles(self, in_road_id, out_road_id, vehicle_info):
@@ -73,4 +92,21 @@ class TrafficState2DICT(object):
                     'lane_position': _veh_info['lane_position'],
                     'event': None  # TODO: 根据需要添加事件信息
                 }
-        return direction_vehicles
\ No newline at end of file
+        return direction_vehicles
+
+def merge_direction_info(topology, direction_idx, direction_info):
+    """将 topology 和每个时刻的 annotation 合并为完整的方向信息 (TrafficLightVQA 的输入).
+    之前采集的 annotation 已经包含完整的信息, 直接返回.
+    """
+    if topology is None or 'in_road' in direction_info:
+        return direction_info
+    direction_topology = topology['directions'][str(direction_idx)] # JSON 的 key 是字符串
+    return {
+        'in_road': direction_topology['in_road'],
+        'out_road': direction_topology['out_road'],
+        'in_lanes': direction_topology['in_lanes'],
+        'out_lanes': direction_topology['out_lanes'],
+        'current_phase': direction_info['current_phase'],
+        'traffic_phase': topology['traffic_phase'],
+        'vehicles': direction_info['vehicles'],
+    }
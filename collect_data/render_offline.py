@@ -0,0 +1,98 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 21:58:36
+LastEditors: WANG Maonan
+Description: 离线渲染第一阶段 (COLLECT.SIM_ONLY=true) 保存的数据, 多个进程同时渲染不同的 step, 见 utils/env_utils/offline_render.py
++ Command Example:
+    -> MAP=France_Massy SCENE=easy_high_density_none python collect_data_fix.py COLLECT.SIM_ONLY=true (只仿真)
+    -> MAP=France_Massy SCENE=easy_high_density_none python render_offline.py COLLECT.RENDER_WORKERS=8 COLLECT.REPLAY_PRESET=1080P (渲染)
++ 每个进程都从 step 0 重新仿真, 进程数量的取舍见 collect/default.yaml 中的 RENDER_WORKERS
+LastEditTime: 2026-10-18 22:24:10
+'''
+import os
+import time
+import hydra
+import multiprocessing as mp
+from loguru import logger
+from omegaconf import DictConfig, OmegaConf
+
+from tshub.utils.get_abs_path import get_abs_path
+from tshub.utils.init_log import set_logger
+
+from utils.env_utils.offline_render import RENDER_DIR, split_step_ranges, render_shard, merge_render_shards
+from utils.io_utils.episode_manifest import ACTION_LOG_FILE, load_manifest, read_action_log
+from utils.io_utils.episode_storage import is_shard_episode
+
+path_convert = get_abs_path(__file__)
+set_logger(path_convert('./'))
+
+@hydra.main(
+    config_path=path_convert("../exp_networks/_config/"), # 配置文件所在的文件夹
+    config_name="selector"
+)
+def main(cfg: DictConfig):
+    OmegaConf.resolve(cfg) # 解析 cfg
+    print(f"Running on map: {cfg.map}")
+    print(f"Using scene: {cfg.scene}")
+    # 读取场景配置
+    SCENARIO_IDX = f"{cfg.map}_{cfg.scene}" # 场景 id
+    SCENARIO_NAME = cfg.SCENARIO_NAME
+    JUNCTION_NAME = cfg.JUNCTION_NAME # tls id
+    CENTER_COORDINATES = cfg.CENTER_COORDINATES
+
+    # 第一阶段保存的数据
+    base_path = path_convert(f"../exp_dataset/{SCENARIO_IDX}/")
+    if is_shard_episode(base_path):
+        raise ValueError("离线渲染只支持目录存储 (COLLECT.STORAGE_FORMAT=directory)")
+    manifest = load_manifest(base_path)
+    if not manifest:
+        raise ValueError(f"{base_path} 中没有 manifest.jsonl, 需要先使用 COLLECT.SIM_ONLY=true 采集")
+    _, decisions = read_action_log(os.path.join(base_path, ACTION_LOG_FILE))
+
+    # 初始化场景飞行器位置, 获得俯视角图像
+    aircraft_inits = {
+        'a1': {
+            "aircraft_type": "drone",
+            "action_type": "stationary", # 水平移动
+            "position": CENTER_COORDINATES, "speed":3, "heading":(1,1,0), # 初始位置
+            "communication_range":100,
+            "if_sumo_visualization":True, "img_file":None,
+            "custom_update_cover_radius":None # 使用自定义的计算
+        },
+    }
+    env_kwargs = {
+        'sumo_cfg': path_convert(f"../exp_networks/{SCENARIO_NAME}/{cfg.SUMOCFG}"),
+        'net_file': path_convert(f"../exp_networks/{SCENARIO_NAME}/{cfg.NETFILE}"),
+        'scenario_glb_dir': path_convert(f"../exp_networks/{SCENARIO_NAME}/3d_assets/"),
+        'num_seconds': cfg.NUM_SECONDS,
+        'accident_config': OmegaConf.to_container(cfg.ACCIDENTS), # 需要传递给子进程
+        'special_vehicle_config': OmegaConf.to_container(cfg.SPECIAL_VEHICLES),
+        'preset': cfg.COLLECT.REPLAY_PRESET,
+        'resolution': 1,
+        'use_gui': False, # 每个进程一个 libsumo
+        'aircraft_inits': aircraft_inits,
+    }
+    writer_kwargs = {
+        'image_codec': cfg.COLLECT.IMAGE_CODEC,
+        'dedup_images': cfg.COLLECT.DEDUP_FRAMES,
+        'json_codec': "json", # render_scene.py 需要不压缩的 3d_vehs.json
+    }
+
+    # 每个进程渲染一段连续的 step
+    step_shards = split_step_ranges(list(manifest), cfg.COLLECT.RENDER_WORKERS or os.cpu_count())
+    shard_paths = [os.path.join(base_path, RENDER_DIR, str(_shard_idx)) for _shard_idx in range(len(step_shards))]
+    logger.info(f"SIM: 离线渲染 {len(manifest)} 个 step, {len(step_shards)} 个进程")
+
+    start_time = time.perf_counter()
+    ctx = mp.get_context("spawn") # 子进程中重新创建 SUMO 和 panda3d
+    with ctx.Pool(processes=len(step_shards), maxtasksperchild=1) as pool:
+        pool.starmap(render_shard, [
+            (_shard_path, _steps, decisions, JUNCTION_NAME,
+             {**env_kwargs, 'trip_info': os.path.join(_shard_path, "tripinfo.out.xml")}, writer_kwargs)
+            for _shard_path, _steps in zip(shard_paths, step_shards)
+        ])
+    merge_render_shards(base_path, shard_paths)
+    logger.info(f"SIM: 离线渲染完成, {time.perf_counter() - start_time:.1f} s")
+
+if __name__ == '__main__':
+    main()
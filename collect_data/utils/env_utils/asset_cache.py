@@ -0,0 +1,98 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 20:55:16
+LastEditors: WANG Maonan
+Description: 3D 模型的缓存 (panda3d 的 model cache, 保存为 .bam, 读取时不需要重新解析 GLB)
++ 缓存保存在 exp_networks/<map>/3d_assets/.model_cache/, 使用 build_asset_cache.py 生成 (包括场景和 tshub 的车辆模型)
++ sources.json 记录每个模型的 sha1, 重新生成时跳过没有变化的模型
++ 缓存存在时, TSCEnvironment3D 创建之前调用 enable_model_cache, 之后 panda3d 加载模型时直接读取 .bam
++ 启动时比较模型的 sha1 与 sources.json, 有模型变化 (或没有缓存) 时不使用缓存, 需要重新运行 build_asset_cache.py
+LastEditTime: 2026-10-18 22:20:40
+'''
+import os
+import glob
+import json
+import hashlib
+from loguru import logger
+from typing import Dict, List
+
+MODEL_CACHE_DIR = ".model_cache"
+MODEL_CACHE_MANIFEST = "sources.json" # {模型: sha1}
+MODEL_EXTENSIONS = (".glb", ".gltf", ".egg")
+
+def model_cache_dir(scenario_glb_dir: str) -> str:
+    return os.path.join(scenario_glb_dir, MODEL_CACHE_DIR)
+
+def find_models(root_dir: str) -> List[str]:
+    """root_dir 中所有需要转换的模型 (不包括缓存)
+    """
+    return sorted(
+        _path for _path in glob.glob(os.path.join(root_dir, "**", "*"), recursive=True)
+        if _path.lower().endswith(MODEL_EXTENSIONS) and f"{os.sep}{MODEL_CACHE_DIR}{os.sep}" not in _path
+    )
+
+def vehicle_model_dir() -> str:
+    """车辆模型在 tshub 中
+    """
+    import tshub
+    return os.path.dirname(tshub.__file__)
+
+def file_sha1(file_path: str) -> str:
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for _chunk in iter(lambda: f.read(1024*1024), b""):
+            sha1.update(_chunk)
+    return sha1.hexdigest()
+
+def load_cache_manifest(scenario_glb_dir: str) -> Dict[str, str]:
+    manifest_path = os.path.join(model_cache_dir(scenario_glb_dir), MODEL_CACHE_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_cache_manifest(scenario_glb_dir: str, manifest: Dict[str, str]) -> None:
+    manifest_path = os.path.join(model_cache_dir(scenario_glb_dir), MODEL_CACHE_MANIFEST)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+def model_files(scenario_glb_dir: str, include_vehicles: bool = True) -> Dict[str, str]:
+    """{模型名称: 路径}, 场景模型使用相对 3d_assets 的路径, 车辆模型使用 tshub/ 开头的路径
+    """
+    files = {os.path.relpath(_path, scenario_glb_dir): _path for _path in find_models(scenario_glb_dir)}
+    if include_vehicles:
+        tshub_dir = vehicle_model_dir()
+        files.update({
+            f"tshub/{os.path.relpath(_path, tshub_dir)}": _path for _path in find_models(tshub_dir)
+        })
+    return files
+
+def stale_models(scenario_glb_dir: str) -> List[str]:
+    """与 sources.json 不一致的模型: 场景模型没有缓存或 sha1 不同, 以及缓存过的车辆模型 sha1 不同
+    """
+    manifest = load_cache_manifest(scenario_glb_dir)
+    include_vehicles = any(_name.startswith("tshub/") for _name in manifest) # --no-vehicles 时只检查场景模型
+    return sorted(
+        _name for _name, _path in model_files(scenario_glb_dir, include_vehicles).items()
+        if (_name in manifest or not _name.startswith("tshub/")) and manifest.get(_name) != file_sha1(_path)
+    )
+
+def enable_model_cache(scenario_glb_dir: str, create: bool = False) -> bool:
+    """使用 scenario_glb_dir 中的模型缓存, 需要在 panda3d 加载模型之前调用. 
+    缓存不存在或模型已经变化时返回 False (create=True 时新建, 用于 build_asset_cache.py)
+    """
+    cache_dir = model_cache_dir(scenario_glb_dir)
+    if not create:
+        if not os.path.isdir(cache_dir):
+            return False
+        changed_models = stale_models(scenario_glb_dir)
+        if changed_models:
+            logger.warning(
+                f"SIM: {len(changed_models)} 个模型与缓存不一致 (例如 {changed_models[0]}), 不使用缓存, 请重新运行 build_asset_cache.py"
+            )
+            return False
+    os.makedirs(cache_dir, exist_ok=True)
+    from panda3d.core import loadPrcFileData
+    loadPrcFileData("model-cache", f"model-cache-dir {cache_dir}\nmodel-cache-textures 1")
+    logger.info(f"SIM: 使用模型缓存 {cache_dir}")
+    return True
@@ -0,0 +1,135 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 21:26:40
+LastEditors: WANG Maonan
+Description: 反事实分支, 计算每个相位的 Q 值 (标签)
++ 在决策时刻保存 SUMO 的状态 (saveState), 每个相位一个分支, 在 worker 进程中同时从这个状态开始仿真 (loadState)
++ 每个分支在 horizon 秒内保持这个相位, 奖励与 TSCEnvWrapper.reward_wrapper 相同 (负的平均累积等待时间), 累加得到 Q 值
++ worker 进程只运行 SUMO (libsumo, 没有 3D 场景), 每个进程一个仿真, 启动时 reset 一次, 之后只 loadState
++ loadState 之后 tshub 的信号灯控制器 (choose_next_phase) 中的相位和计时仍然是 t=0 的, 因此分支直接使用 libsumo 控制信号灯:
+  与 choose_next_phase 相同, 切换到其他相位时先运行当前相位之后的黄灯, 然后保持目标绿灯相位
++ 分支中不会插入之后出现的事故车辆 (由 TSCEnvironment3D 插入), horizon 较短时影响不大
+LastEditTime: 2026-10-18 22:27:35
+'''
+import os
+import shutil
+import tempfile
+import multiprocessing as mp
+from loguru import logger
+from typing import List, Tuple
+
+_BRANCH_ENV = None # 每个 worker 进程中的 SUMO 环境
+
+def _init_worker(sumo_cfg: str, tls_id: str, num_seconds: int) -> None:
+    from tshub.tshub_env.tshub_env import TshubEnvironment
+    global _BRANCH_ENV
+    _BRANCH_ENV = TshubEnvironment(
+        sumo_cfg=sumo_cfg,
+        is_aircraft_builder_initialized=False,
+        is_vehicle_builder_initialized=False, # 分支直接使用 libsumo 读取 waiting time
+        is_traffic_light_builder_initialized=True,
+        tls_ids=[tls_id],
+        num_seconds=num_seconds,
+        tls_action_type='choose_next_phase',
+        use_gui=False,
+        is_libsumo=True,
+    )
+    _BRANCH_ENV.reset() # 初始化路网和信号灯, 之后每个分支只读取状态
+
+def _waiting_reward(sumo) -> float:
+    """与 TSCEnvWrapper.reward_wrapper 相同 (负的平均累积等待时间)
+    """
+    veh_ids = sumo.vehicle.getIDList()
+    if len(veh_ids) == 0:
+        return 0.0
+    total_waiting_time = sum(sumo.vehicle.getAccumulatedWaitingTime(_veh_id) for _veh_id in veh_ids)
+    return -total_waiting_time / len(veh_ids)
+
+def _phase_schedule(sumo, tls_id: str, phase: int) -> Tuple[int, int, int]:
+    """(黄灯在 SUMO 程序中的 index, 黄灯时间, 目标绿灯的 index), 不需要黄灯时黄灯的 index 为 None
+    phase 与 choose_next_phase 相同, 是第几个绿灯相位
+    """
+    program_id = sumo.trafficlight.getProgram(tls_id)
+    logic = next(
+        _logic for _logic in sumo.trafficlight.getAllProgramLogics(tls_id) if _logic.programID == program_id
+    )
+    green_phases = [
+        _idx for _idx, _phase in enumerate(logic.phases)
+        if 'y' not in _phase.state.lower() and 'g' in _phase.state.lower()
+    ]
+    target_phase = green_phases[phase]
+    current_phase = sumo.trafficlight.getPhase(tls_id)
+    if current_phase == target_phase:
+        return None, 0, target_phase
+    yellow_phase = (current_phase + 1) % len(logic.phases)
+    if 'y' not in logic.phases[yellow_phase].state.lower(): # 当前相位之后没有黄灯
+        return None, 0, target_phase
+    return yellow_phase, int(logic.phases[yellow_phase].duration), target_phase
+
+def _run_branch(args) -> float:
+    """从 state_file 开始, 在 horizon 秒内保持 phase, 返回累积奖励
+    """
+    state_file, tls_id, phase, horizon = args
+    sumo = _BRANCH_ENV.sumo
+    sumo.simulation.loadState(state_file) # 信号灯的相位和剩余时间也从 state_file 中恢复
+    yellow_phase, yellow_time, target_phase = _phase_schedule(sumo, tls_id, phase)
+    branch_return = 0.0
+    for _step in range(horizon):
+        if _step in (0, yellow_time): # 开始 (黄灯或目标相位) 和黄灯结束时切换
+            sumo.trafficlight.setPhase(tls_id, yellow_phase if _step < yellow_time else target_phase)
+            sumo.trafficlight.setPhaseDuration(tls_id, horizon + 1) # 由分支控制切换, 不按照 SUMO 程序的时间
+        sumo.simulationStep()
+        branch_return += _waiting_reward(sumo)
+        if sumo.simulation.getMinExpectedNumber() <= 0: # 没有车辆
+            break
+    return branch_return
+
+
+class BranchLabeler(object):
+    def __init__(
+            self,
+            sumo_cfg: str,
+            tls_id: str,
+            phase_num: int,
+            num_seconds: int,
+            horizon: int = 15,
+            num_workers: int = 0,
+        ) -> None:
+        """
+        Args:
+            horizon (int): 每个分支仿真的时间 (s)
+            num_workers (int): worker 进程的数量, 0 表示每个相位一个 (不超过 CPU 数量)
+        """
+        if horizon < 1:
+            raise ValueError(f"horizon should be >= 1, got {horizon}")
+        self.tls_id = tls_id
+        self.phase_num = phase_num
+        self.horizon = horizon
+        self.num_workers = num_workers or min(phase_num, os.cpu_count() or 1)
+
+        # 决策时刻的 SUMO 状态, 每次决策覆盖
+        self.state_dir = tempfile.mkdtemp(prefix="branch_")
+        self.state_file = os.path.join(self.state_dir, "decision_state.xml")
+
+        start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn" # 不复制主进程中的 SUMO
+        self.pool = mp.get_context(start_method).Pool(
+            processes=self.num_workers,
+            initializer=_init_worker,
+            initargs=(sumo_cfg, tls_id, num_seconds + horizon), # 分支可以超过 episode 的结束时间
+        )
+        logger.info(f"SIM: 反事实分支, {self.phase_num} 个相位, horizon {self.horizon} s, {self.num_workers} 个 worker")
+
+    def label(self, env) -> List[float]:
+        """保存 env 当前的状态, 返回每个相位的 Q 值 (index 是相位)
+        """
+        env.save_state(self.state_file)
+        return self.pool.map(
+            _run_branch,
+            [(self.state_file, self.tls_id, _phase, self.horizon) for _phase in range(self.phase_num)],
+            chunksize=1, # 每个相位单独分配, 同时运行
+        )
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+        shutil.rmtree(self.state_dir, ignore_errors=True)
@@ -0,0 +1,132 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 14:02:50
+LastEditors: WANG Maonan
+Description: 决定哪些时刻 (每 1s 是一个 step) 需要保存图片和 JSON
++ all: 保存所有时刻 (默认)
++ decision_only: 只保存需要做决策的时刻 (can_perform_action=True)
++ every_n_seconds: 每 n 秒保存一次
++ decision_plus_k_before: 保存决策时刻, 以及决策之前的 k 个时刻 (先缓存在内存中)
++ event: 事件 (事故, 特殊车辆, 排队) 发生时保存, 包括之前 pre_seconds 和之后 post_seconds 的时刻, 事件见 event_trigger.py
++ needs_render: 在 step 之前判断这个时刻是否需要渲染, 其他时刻只仿真 (需要保存时再使用 render_current 渲染)
+  - decision_only: 决策只有在 step 之后才知道, step 时都不渲染, 决策时刻再渲染
+  - event: 任意时刻都可能在事件之前的 pre_seconds 中, 每个时刻都渲染 (缓存的时刻有图片);
+    frameless_pre_roll=True 时 step 时不渲染, 事件之前缓存的时刻没有图片 (只保存 step_info, state 和 annotations)
+  - decision_plus_k_before: 信号灯的最小绿灯和黄灯时间固定, 决策之间的时间只与是否切换相位有关.
+    使用之前的决策间隔预测下一次决策的时刻, 只渲染决策之前的 k 个时刻 (还没有对应的间隔时每个时刻都渲染),
+    预测错误时之前的时刻没有图片, 保存时会记录在 manifest 中 (missing_frames)
+LastEditTime: 2026-10-18 23:26:40
+'''
+CAPTURE_MODES = ["all", "decision_only", "every_n_seconds", "decision_plus_k_before", "event"]
+
+class CapturePolicy(object):
+    def __init__(
+            self, 
+            mode: str = "all", 
+            every_n_seconds: int = 5, 
+            k_before: int = 3,
+            event_pre_seconds: int = 10,
+            event_post_seconds: int = 10,
+            frameless_pre_roll: bool = False,
+        ) -> None:
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode: {mode}, should be one of {CAPTURE_MODES}")
+        if every_n_seconds < 1:
+            raise ValueError(f"every_n_seconds should be >= 1, got {every_n_seconds}")
+        self.mode = mode
+        self.every_n_seconds = every_n_seconds
+        self.k_before = k_before
+        self.event_pre_seconds = event_pre_seconds
+        self.event_post_seconds = event_post_seconds
+        self.frameless_pre_roll = frameless_pre_roll # event 模式中事件之前的时刻不渲染
+        self._capture_until = -1 # event 模式下, 在这个时刻之前都需要保存
+        # decision_plus_k_before 预测决策时刻, {是否保持相位: 决策间隔的 step 数量}
+        self._decision_intervals = {}
+        self._decision_start = None # 当前决策开始的 step, None 表示还没有开始
+        self._decision_key = None
+        self._last_action = None
+
+    @property
+    def needs_events(self) -> bool:
+        """是否需要检测事件
+        """
+        return self.mode == "event"
+
+    def reset(self) -> None:
+        """决策间隔 (_decision_intervals) 只与信号灯的配时有关, 不同的 episode 保留
+        """
+        self._capture_until = -1
+        self._decision_start = None
+        self._decision_key = None
+        self._last_action = None
+
+    @property
+    def pre_roll(self) -> int:
+        """需要在内存中缓存的时刻数量
+        """
+        if self.mode == "decision_plus_k_before":
+            return self.k_before
+        elif self.mode == "event":
+            return self.event_pre_seconds
+        return 0
+
+    def start_decision(self, step_idx: int, action: int) -> None:
+        """动作从 step_idx 开始执行, 已经开始的决策不会重复记录 (多路口时每次 step 都会调用)
+        """
+        if self._decision_start is None:
+            self._decision_start = step_idx
+            self._decision_key = action == self._last_action
+            self._last_action = action
+
+    def end_decision(self, step_idx: int) -> None:
+        """step_idx 是下一次决策的时刻, 记录这次决策的间隔
+        """
+        if self._decision_start is not None:
+            self._decision_intervals[self._decision_key] = step_idx - self._decision_start + 1
+        self._decision_start = None
+
+    def predicted_decision(self) -> int:
+        """下一次决策的时刻, 无法预测时返回 None
+        """
+        if self._decision_start is None or self._decision_key not in self._decision_intervals:
+            return None
+        return self._decision_start + self._decision_intervals[self._decision_key] - 1
+
+    def needs_render(self, step_idx: int) -> bool:
+        """step 之前调用, 这个时刻是否需要在 step 时渲染图片. 
+        返回 False 的时刻如果需要保存, 在 step 之后使用 TSCEnvironment3D.render_current 渲染
+        """
+        if self.mode == "every_n_seconds":
+            return step_idx % self.every_n_seconds == 0
+        elif self.mode == "decision_only":
+            return False
+        elif self.mode == "event": # 没有 pre-roll 时只需要渲染事件中的时刻 (step 之后渲染)
+            return self.event_pre_seconds > 0 and not self.frameless_pre_roll
+        elif self.mode == "decision_plus_k_before":
+            decision_step = self.predicted_decision()
+            return decision_step is None or decision_step - self.k_before <= step_idx <= decision_step
+        return True
+
+    def should_capture(self, step_idx: int, can_perform_action: bool, has_event: bool = False) -> bool:
+        """当前时刻是否需要保存
+        """
+        if self.mode == "all":
+            return True
+        elif self.mode == "every_n_seconds":
+            return step_idx % self.every_n_seconds == 0
+        elif self.mode == "event":
+            if has_event: # 事件持续时一直保存, 结束之后再保存 post_seconds
+                self._capture_until = step_idx + self.event_post_seconds
+            return step_idx <= self._capture_until
+        else: # decision_only, decision_plus_k_before
+            return can_perform_action
+
+    def __repr__(self) -> str:
+        if self.mode == "every_n_seconds":
+            return f"{self.mode}:{self.every_n_seconds}"
+        elif self.mode == "decision_plus_k_before":
+            return f"{self.mode}:{self.k_before}"
+        elif self.mode == "event":
+            frameless = ":frameless" if self.frameless_pre_roll else ""
+            return f"{self.mode}:{self.event_pre_seconds}:{self.event_post_seconds}{frameless}"
+        return self.mode
@@ -0,0 +1,70 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 16:45:18
+LastEditors: WANG Maonan
+Description: 检测需要保存的事件 (用于 capture_policy 的 event 模式)
++ emergency: 紧急车辆 (emergency, police, fire_engine) 在 in lane 上, 距离路口小于 emergency_distance
++ obstacle: in lane 上存在路障/事故 (ACCIDENTS 中的类型)
++ queue: 某个 movement 的排队车辆数大于 queue_threshold
+LastEditTime: 2026-10-18 16:45:21
+'''
+from typing import List
+
+EMERGENCY_TYPES = ['emergency', 'police', 'fire_engine'] # 与 get_expert_action_maxq 相同
+OBSTACLE_TYPES = [
+    'barrier_A', 'barrier_B', 'barrier_C', 'barrier_D', 'barrier_E',
+    'tree_branch_1lane', 'tree_branch_3lanes', 'pedestrian', 
+    'crash_vehicle_1lane', 'crash_vehicle_3lanes', 'other_accidents',
+]
+
+class EventTrigger(object):
+    def __init__(
+            self, 
+            tls_id: str, 
+            raw_infos, 
+            emergency_distance: float = 150, 
+            queue_threshold: int = 10,
+            detect_obstacles: bool = True
+        ) -> None:
+        """
+        Args:
+            tls_id (str): 路口 id
+            raw_infos: reset 时的 info, 用于获得 in lane 和车道长度
+            emergency_distance (float): 紧急车辆距离路口小于这个距离时触发. Defaults to 150.
+            queue_threshold (int): 排队车辆数超过这个数量时触发, 小于等于 0 表示不检测. Defaults to 10.
+            detect_obstacles (bool): 是否检测路障/事故. Defaults to True.
+        """
+        self.tls_id = tls_id
+        self.emergency_distance = emergency_distance
+        self.queue_threshold = queue_threshold
+        self.detect_obstacles = detect_obstacles
+
+        tls_info = raw_infos['state']['tls'][tls_id]
+        self.movement_ids = tls_info['movement_ids']
+        self.lane_lengths = {
+            _lane_id: raw_infos['state']['lane'][_lane_id]['length']
+            for _lanes in tls_info['movement_lane_ids'].values() for _lane_id in _lanes
+        } # 只检测 in lane 上的车辆
+
+    def __call__(self, raw_state) -> List[str]:
+        """返回当前时刻触发的事件, 例如 ["emergency:ambulance_0", "queue:E1--s"], 没有事件返回空列表
+        """
+        events = []
+        for _veh_id, _veh_info in raw_state['state']['vehicle'].items():
+            _lane_id = _veh_info['lane_id']
+            if _lane_id not in self.lane_lengths:
+                continue
+            _vehicle_type = _veh_info['vehicle_type']
+            if _vehicle_type in EMERGENCY_TYPES:
+                distance = self.lane_lengths[_lane_id] - _veh_info['lane_position'] # 距离路口的距离
+                if distance < self.emergency_distance:
+                    events.append(f"emergency:{_veh_id}")
+            elif self.detect_obstacles and _vehicle_type in OBSTACLE_TYPES:
+                events.append(f"obstacle:{_veh_id}")
+
+        if self.queue_threshold > 0:
+            jam_length = raw_state['state']['tls'][self.tls_id]['jam_length_vehicle']
+            for _movement_index, _movement_id in enumerate(self.movement_ids):
+                if jam_length[_movement_index] > self.queue_threshold:
+                    events.append(f"queue:{_movement_id}")
+        return events
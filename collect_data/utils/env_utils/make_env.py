@@ -3,12 +3,25 @@ Author: WANG Maonan
 Date: 2025-07-10 20:25:52
 LastEditors: WANG Maonan
 Description: ENV + Wrapper
-LastEditTime: 2025-07-28 21:52:55
++ tls_id 是一个 list 时创建多路口环境 (MultiTSCEnvWrapper), 每个路口的数据保存在 base_path/<tls_id>/,
+  所有路口共用的飞行器相机只保存一次, 在 base_path/<step>/ 中
++ branch_horizon > 0 时, 决策时刻使用反事实分支计算每个相位的 Q 值 (BranchLabeler)
++ replay_actions: 之前保存的 actions.jsonl, step 时按顺序使用记录的动作 (不需要策略)
++ sim_only: 只仿真不渲染, 图片之后使用 render_offline.py 在多个进程中生成
++ soft_reset: 之后的 reset 保留 3D 场景; env 不为 None 时使用已经创建的 TSCEnvironment3D (多个 episode 保存在不同的文件夹)
+LastEditTime: 2026-10-18 23:27:10
 '''
 import os
 from loguru import logger 
+from collections.abc import Mapping
+from typing import Any, Dict, List, Union
 from utils.env_utils.tsc_env3d import TSCEnvironment3D
 from utils.env_utils.tsc_wrapper import TSCEnvWrapper
+from utils.env_utils.multi_tsc_wrapper import MultiTSCEnvWrapper
+from utils.env_utils.capture_policy import CapturePolicy
+from utils.env_utils.branch_labeler import BranchLabeler
+from utils.io_utils.artifact_writer import make_artifact_writer
+from utils.io_utils.episode_manifest import read_action_log
 
 def ensure_directory_exists(file_path):
     """确保文件所在的目录存在，如果不存在则创建
@@ -19,12 +32,47 @@ def ensure_directory_exists(file_path):
         logger.info(f"SIM: 目录已创建: {directory}")
     else:
         logger.info(f"SIM: 目录已存在: {directory}")
-        
+
+def parse_collect_config(collect_cfg) -> Dict[str, Any]:
+    """将配置文件中的 COLLECT 转换为 make_env 的参数
+    """
+    return {
+        'capture_policy': collect_cfg.CAPTURE_POLICY,
+        'capture_every_n_seconds': collect_cfg.CAPTURE_EVERY_N_SECONDS,
+        'capture_k_before': collect_cfg.CAPTURE_K_BEFORE,
+        'event_pre_seconds': collect_cfg.EVENT_PRE_SECONDS,
+        'event_post_seconds': collect_cfg.EVENT_POST_SECONDS,
+        'event_frameless_pre_roll': collect_cfg.EVENT_FRAMELESS_PRE_ROLL,
+        'event_emergency_distance': collect_cfg.EVENT_EMERGENCY_DISTANCE,
+        'event_queue_threshold': collect_cfg.EVENT_QUEUE_THRESHOLD,
+        'event_obstacles': collect_cfg.EVENT_OBSTACLES,
+        'storage_format': collect_cfg.STORAGE_FORMAT,
+        'shard_size_mb': collect_cfg.SHARD_SIZE_MB,
+        'state_format': collect_cfg.STATE_FORMAT,
+        'image_codec': collect_cfg.IMAGE_CODEC,
+        'dedup_frames': collect_cfg.DEDUP_FRAMES,
+        'json_codec': collect_cfg.JSON_CODEC,
+        'async_writer': collect_cfg.ASYNC_WRITER,
+        'writer_executor': collect_cfg.WRITER_EXECUTOR,
+        'writer_workers': collect_cfg.WRITER_WORKERS,
+        'max_pending_writes': collect_cfg.MAX_PENDING_WRITES,
+        'resume': collect_cfg.RESUME,
+        'branch_horizon': collect_cfg.BRANCH_HORIZON,
+        'branch_workers': collect_cfg.BRANCH_WORKERS,
+        'sim_only': collect_cfg.SIM_ONLY,
+        'soft_reset': collect_cfg.SOFT_RESET,
+    }
+
+def _junction_value(value, tls_id:str):
+    """movement_num 和 phase_num 可以是所有路口相同的 int, 也可以是 {tls_id: int}
+    """
+    return value[tls_id] if isinstance(value, Mapping) else value
+
 def make_env(
-        tls_id:str, 
+        tls_id:Union[str, List[str]], 
         sumo_cfg:str, net_file:str,
         scenario_glb_dir:str, 
-        movement_num:int, phase_num:int,
+        movement_num:Union[int, Dict[str, int]], phase_num:Union[int, Dict[str, int]],
         num_seconds:int, use_gui:bool,
         trip_info:str,
         accident_config,
@@ -33,15 +81,55 @@ def make_env(
         preset:str="1080P", resolution:float=1,
         vehicle_model="high",
         base_path:str = None,
+        # 保存哪些时刻
+        capture_policy:str = "all",
+        capture_every_n_seconds:int = 5,
+        capture_k_before:int = 3,
+        event_pre_seconds:int = 10,
+        event_post_seconds:int = 10,
+        event_frameless_pre_roll:bool = False,
+        event_emergency_distance:float = 150,
+        event_queue_threshold:int = 10,
+        event_obstacles:bool = True,
+        # 文件写入
+        storage_format:str = "directory",
+        shard_size_mb:int = 1024,
+        state_format:str = "npy",
+        image_codec:str = "png",
+        dedup_frames:bool = False,
+        json_codec:str = "json",
+        async_writer:bool = False,
+        writer_executor:str = "thread",
+        writer_workers:int = 4,
+        max_pending_writes:int = 64,
+        # 从上一次中断的位置继续
+        resume:bool = False,
+        # 反事实分支 (每个相位的 Q 值)
+        branch_horizon:int = 0,
+        branch_workers:int = 0,
+        # 重放之前的动作 (actions.jsonl)
+        replay_actions:str = None,
+        # 只仿真, 之后离线渲染
+        sim_only:bool = False,
+        # 多个 episode 共用一个 3D 场景
+        soft_reset:bool = False,
+        env:TSCEnvironment3D = None,
     ):
     ensure_directory_exists(trip_info)
-    tsc_env = TSCEnvironment3D(
+    tls_ids = [tls_id] if isinstance(tls_id, str) else list(tls_id)
+    if len(tls_ids) > 1 and resume:
+        raise ValueError("多路口环境不支持 resume")
+    if len(tls_ids) > 1 and branch_horizon > 0:
+        raise ValueError("多路口环境不支持反事实分支")
+    if len(tls_ids) > 1 and replay_actions is not None:
+        raise ValueError("多路口环境不支持 replay")
+    tsc_env = env or TSCEnvironment3D(
         sumo_cfg=sumo_cfg,
         net_file=net_file,
         scenario_glb_dir=scenario_glb_dir,
         preset=preset, resolution=resolution,
         num_seconds=num_seconds,
-        tls_ids=[tls_id],
+        tls_ids=tls_ids,
         tls_action_type='choose_next_phase',
         trip_info=trip_info,
         use_gui=use_gui,
@@ -49,12 +137,81 @@ def make_env(
         aircraft_inits=aircraft_inits,
         accident_config=accident_config,
         special_vehicle_config=special_vehicle_config,
+        soft_reset=soft_reset,
     )
-    tsc_env = TSCEnvWrapper(
-        tsc_env, tls_id=tls_id, 
-        movement_num=movement_num,
-        phase_num=phase_num,
-        base_path=base_path,
-    )
 
-    return tsc_env
\ No newline at end of file
+    replay_decisions = None
+    if replay_actions is not None: # 先读取到内存, 之后 base_path 中的 actions.jsonl 会重新写入
+        replay_header, replay_decisions = read_action_log(replay_actions)
+        if not replay_decisions:
+            raise ValueError(f"{replay_actions} 中没有记录的决策")
+        logged_seed = replay_header.get('seeds', {}).get('sumo')
+        if logged_seed != tsc_env.sumo_seed:
+            logger.warning(f"SIM: replay 的 SUMO seed ({tsc_env.sumo_seed}) 与记录 ({logged_seed}) 不同, 仿真可能不一致")
+        logger.info(f"SIM: replay {replay_actions}, {len(replay_decisions)} 次决策")
+
+    def _make_writer(_base_path):
+        return make_artifact_writer(
+            base_path=_base_path,
+            storage_format=storage_format,
+            shard_size_mb=shard_size_mb,
+            image_codec=image_codec,
+            async_writer=async_writer,
+            num_workers=writer_workers,
+            max_pending=max_pending_writes,
+            executor_type=writer_executor,
+            dedup_images=dedup_frames,
+            json_codec=json_codec,
+        )
+
+    def _wrap_junction(_tls_id, _base_path, camera_elements=None):
+        return TSCEnvWrapper(
+            tsc_env, tls_id=_tls_id, 
+            movement_num=_junction_value(movement_num, _tls_id),
+            phase_num=_junction_value(phase_num, _tls_id),
+            base_path=_base_path,
+            writer=_make_writer(_base_path),
+            state_format=state_format,
+            state_capacity=num_seconds+1,
+            capture_policy=CapturePolicy(
+                mode=capture_policy,
+                every_n_seconds=capture_every_n_seconds,
+                k_before=capture_k_before,
+                event_pre_seconds=event_pre_seconds,
+                event_post_seconds=event_post_seconds,
+                frameless_pre_roll=event_frameless_pre_roll,
+            ),
+            event_trigger_config={
+                'emergency_distance': event_emergency_distance,
+                'queue_threshold': event_queue_threshold,
+                'detect_obstacles': event_obstacles,
+            },
+            resume=resume,
+            camera_elements=camera_elements,
+            branch_labeler=BranchLabeler(
+                sumo_cfg=sumo_cfg,
+                tls_id=_tls_id,
+                phase_num=_junction_value(phase_num, _tls_id),
+                num_seconds=num_seconds,
+                horizon=branch_horizon,
+                num_workers=branch_workers,
+            ) if branch_horizon > 0 else None,
+            replay_decisions=replay_decisions,
+            sim_only=sim_only,
+        )
+
+    if isinstance(tls_id, str):
+        return _wrap_junction(tls_id, base_path)
+
+    # 多路口: 每个路口只保存自己的路口相机, 俯视的飞行器 (所有路口相同) 保存在 base_path 中
+    aircraft_ids = list(aircraft_inits or {})
+    return MultiTSCEnvWrapper(
+        tsc_env,
+        junctions={
+            _tls_id: _wrap_junction(_tls_id, os.path.join(base_path, _tls_id), camera_elements=[_tls_id])
+            for _tls_id in tls_ids
+        },
+        base_path=base_path,
+        shared_writer=_make_writer(base_path) if aircraft_ids else None,
+        shared_elements=aircraft_ids,
+    )
\ No newline at end of file
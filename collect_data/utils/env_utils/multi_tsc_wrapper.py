@@ -0,0 +1,121 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 20:02:14
+LastEditors: WANG Maonan
+Description: 多路口 TSC Wrapper (collect data), 例如 SouthKorea_Songdo_3INTS
++ 多个路口共用一个 SUMO 和一个 3D 场景, 每个路口使用一个 TSCEnvWrapper 处理 state 和保存数据 (不单独 step 环境)
++ 每个路口的数据保存在 base_path/<tls_id>/ 中, 与单路口的 episode 结构相同 (可以直接使用 EpisodeReader)
++ step 的输入是 {tls_id: action}, 任意一个路口可以做决策时返回, infos['can_perform_action'] 是每个路口是否需要新的动作
++ 所有路口共用的相机 (俯视的飞行器) 只保存一次, 在 base_path/<step>/low_quality_rgb/ 中 (根目录的 manifest.jsonl 记录),
+  任意一个路口保存某个时刻时同时保存这个时刻的共用相机
++ 任意一个路口需要时 step 才渲染, 其他路口在 step 之后需要保存时使用 render_current (每个时刻最多渲染一次)
+LastEditTime: 2026-10-18 23:07:40
+'''
+import os
+import time
+import gymnasium as gym
+from loguru import logger
+from gymnasium.core import Env
+from typing import Dict, List, Set
+
+from utils.io_utils.artifact_writer import ArtifactWriter
+from utils.io_utils.io_stats import IO_STATS_FILE
+from utils.env_utils.tsc_wrapper import TSCEnvWrapper, write_sensor_outputs
+
+class MultiTSCEnvWrapper(gym.Wrapper):
+    def __init__(
+            self, 
+            env: Env, 
+            junctions: Dict[str, TSCEnvWrapper],
+            base_path: str = None,
+            shared_writer: ArtifactWriter = None,
+            shared_elements: List[str] = None,
+        ) -> None:
+        """
+        Args:
+            env (Env): TSCEnvironment3D, tls_ids 包含所有的路口
+            junctions (Dict[str, TSCEnvWrapper]): 每个路口的 wrapper, 使用同一个 env
+            base_path (str): episode 的根目录, 每个路口在 base_path/<tls_id>/
+            shared_writer (ArtifactWriter): 保存在 episode 根目录的共用相机, None 表示不保存
+            shared_elements (List[str]): 共用相机的 element, 例如 ['a1']
+        """
+        super().__init__(env)
+        self.junctions = junctions
+        self.tls_ids = list(junctions)
+        self.base_path = base_path
+        self.shared_writer = shared_writer
+        self.shared_elements = shared_elements or []
+        self.shared_steps: Set[int] = set() # 已经保存了共用相机的时刻
+        if self.shared_writer is not None:
+            for _junction in self.junctions.values():
+                _junction.on_step_written = self._write_shared_cameras
+
+    @property
+    def action_space(self):
+        return gym.spaces.Dict({_tls_id: _junction.action_space for _tls_id, _junction in self.junctions.items()})
+
+    @property
+    def observation_space(self):
+        return gym.spaces.Dict({_tls_id: _junction.observation_space for _tls_id, _junction in self.junctions.items()})
+
+    def reset(self, seed=1):
+        state = self.env.reset()
+        for _junction in self.junctions.values():
+            info = _junction._init_episode(state)
+            _junction._start_new_episode()
+        if self.shared_writer is not None: # 删除之前 episode 的共用相机
+            self.shared_steps = set()
+            self.shared_writer.clear()
+            if self.shared_writer.manifest is not None:
+                self.shared_writer.manifest.rewrite([])
+        info['can_perform_action'] = {_tls_id: True for _tls_id in self.tls_ids}
+        return {_tls_id: _junction.states for _tls_id, _junction in self.junctions.items()}, info
+
+    def step(self, action: Dict[str, int]):
+        """还没有到决策时刻的路口, 动作会被忽略 (与单路口 while 循环中重复发送动作相同)
+        """
+        action = {_tls_id: action[_tls_id] for _tls_id in self.tls_ids}
+        can_perform_action = {_tls_id: False for _tls_id in self.tls_ids}
+        for _tls_id, _junction in self.junctions.items(): # 上一次做了决策的路口从这里开始新的动作
+            _junction.capture_policy.start_decision(_junction.step_idx, action[_tls_id])
+        while not any(can_perform_action.values()):
+            render = any(_junction.needs_render() for _junction in self.junctions.values())
+            start_time = time.perf_counter()
+            states, rewards, truncated, dones, infos = self.env.step(action, render=render) # 与环境交互
+            env_step_ms = (time.perf_counter() - start_time) * 1000
+            for _tls_id, _junction in self.junctions.items():
+                _junction.writer.stats.record_time("env_step" if render else "env_step_no_render", env_step_ms)
+                infos, can_perform_action[_tls_id] = _junction._record_sim_step(action[_tls_id], states, infos)
+
+        for _tls_id, _junction in self.junctions.items():
+            if can_perform_action[_tls_id]:
+                _junction._log_decision(action[_tls_id])
+
+        rewards = {_tls_id: _junction.reward_wrapper(states=states) for _tls_id, _junction in self.junctions.items()}
+        infos['can_perform_action'] = can_perform_action
+        return {_tls_id: _junction.states for _tls_id, _junction in self.junctions.items()}, rewards, truncated, dones, infos
+
+    def _write_shared_cameras(self, step_idx: int, pixel) -> None:
+        """多个路口保存同一个时刻时, 共用的相机只保存一次
+        """
+        if step_idx in self.shared_steps:
+            return
+        self.shared_steps.add(step_idx)
+        camera_names = write_sensor_outputs(
+            self.shared_writer, f"{step_idx}", None, pixel,
+            lambda _element_id: any(
+                _element_id == _element or _element_id.startswith(f"{_element}_") for _element in self.shared_elements
+            )
+        )
+        self.shared_writer.commit_step(step_idx, {'cameras': sorted(camera_names)})
+
+    def close(self) -> None:
+        try:
+            for _junction in self.junctions.values():
+                _junction.close_outputs()
+            if self.shared_writer is not None:
+                self.shared_writer.close()
+                self.shared_writer.stats.dump(os.path.join(self.base_path, IO_STATS_FILE))
+                logger.info(f"SIM: I/O shared cameras {self.shared_writer.stats.summary()}")
+        finally:
+            self.env.close()
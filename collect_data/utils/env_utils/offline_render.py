@@ -0,0 +1,90 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 21:55:08
+LastEditors: WANG Maonan
+Description: 离线渲染 (两阶段采集的第二阶段)
++ 第一阶段 (COLLECT.SIM_ONLY=true) 只仿真, 保存 actions.jsonl, manifest 以及每个 step 的 step_info, state 和 annotations
++ 第二阶段把保存的 step 按时间分成多段, 每个进程一段: 使用 actions.jsonl 重放仿真 (之前的 step 只仿真), 渲染这一段的 step
++ 每个进程写入 <base_path>/.render/<shard>/, 全部结束之后合并到第一阶段的 step 文件夹, 并更新 manifest (files, cameras)
++ 只支持目录存储 (STORAGE_FORMAT=directory) 和单路口
+LastEditTime: 2026-10-18 21:55:12
+'''
+import os
+import shutil
+from loguru import logger
+from typing import Any, Dict, List
+
+from utils.env_utils.tsc_env3d import TSCEnvironment3D
+from utils.env_utils.tsc_wrapper import write_sensor_outputs
+from utils.io_utils.artifact_writer import make_artifact_writer
+from utils.io_utils.episode_manifest import MANIFEST_FILE, JsonlLog, read_jsonl
+
+RENDER_DIR = ".render" # 每个进程的临时输出
+
+def split_step_ranges(steps: List[int], num_shards: int) -> List[List[int]]:
+    """将 step 分成 num_shards 段连续的 step, 每段的数量接近
+    """
+    steps = sorted(steps)
+    num_shards = max(1, min(num_shards, len(steps)))
+    shard_size, remainder = divmod(len(steps), num_shards)
+    shards, start = [], 0
+    for _shard_idx in range(num_shards):
+        end = start + shard_size + (1 if _shard_idx < remainder else 0)
+        shards.append(steps[start:end])
+        start = end
+    return shards
+
+def render_shard(
+        shard_path: str,
+        steps: List[int],
+        decisions: List[Dict[str, Any]],
+        tls_id: str,
+        env_kwargs: Dict[str, Any],
+        writer_kwargs: Dict[str, Any],
+    ) -> int:
+    """重放 decisions, 渲染 steps 中的时刻, 保存在 shard_path. 在单独的进程中运行 (每个进程一个 SUMO 和 3D 场景)
+    """
+    os.makedirs(shard_path, exist_ok=True) # trip_info 也保存在这里
+    render_steps = set(steps)
+    last_step = max(steps)
+    env = TSCEnvironment3D(tls_ids=[tls_id], tls_action_type='choose_next_phase', **env_kwargs)
+    writer = make_artifact_writer(shard_path, **writer_kwargs)
+    try:
+        env.reset()
+        step_idx = 0
+        for _decision in decisions:
+            while step_idx <= min(_decision['end_step'], last_step):
+                render = step_idx in render_steps # 之前的 step 只仿真, 3D 场景在渲染时同步
+                states, _, _, _, _ = env.step({tls_id: _decision['action']}, render=render)
+                if render:
+                    camera_names = write_sensor_outputs(writer, f"{step_idx}", states['veh_3d_elements'], states['pixel'])
+                    writer.commit_step(step_idx, {'cameras': sorted(camera_names)})
+                step_idx += 1
+            if step_idx > last_step:
+                break
+            if not states['state']['tls'][tls_id]['can_perform_action']: # 与第一阶段的决策时刻不一致
+                raise RuntimeError(f"第 {_decision['decision']} 次决策应该在 step {_decision['end_step']} 结束, 仿真与记录不一致")
+        if step_idx <= last_step:
+            raise RuntimeError(f"actions.jsonl 只到 step {step_idx - 1}, 无法渲染到 step {last_step}")
+    finally:
+        writer.close()
+        env.close()
+    logger.info(f"SIM: 渲染 step {steps[0]}-{last_step}, I/O {writer.stats.summary()}")
+    return len(steps)
+
+def merge_render_shards(base_path: str, shard_paths: List[str]) -> None:
+    """将每个进程渲染的文件移动到 base_path/<step>/, 并在 manifest 中加入这些文件和相机
+    """
+    manifest_log = JsonlLog(os.path.join(base_path, MANIFEST_FILE))
+    manifest = {_record['step']: _record for _record in manifest_log.read()}
+    for _shard_path in shard_paths:
+        for _record in read_jsonl(os.path.join(_shard_path, MANIFEST_FILE)):
+            _step = _record['step']
+            for _key in _record['files']:
+                _target = os.path.join(base_path, _key)
+                os.makedirs(os.path.dirname(_target), exist_ok=True)
+                os.replace(os.path.join(_shard_path, _key), _target)
+            manifest[_step]['files'].update(_record['files'])
+            manifest[_step]['cameras'] = _record['cameras']
+    manifest_log.rewrite([manifest[_step] for _step in sorted(manifest)])
+    shutil.rmtree(os.path.join(base_path, RENDER_DIR), ignore_errors=True)
@@ -2,13 +2,45 @@
 Author: Maonan Wang
 Date: 2025-01-15 16:53:53
 Description: 信号灯控制环境 3D (Special Vehicles & Special Accidents)
++ 事故车辆按照出现时间放入优先队列, 每个 step 只处理到达时间的车辆, 同一个车道的车辆一起插入
++ 特殊车辆在 reset 时使用 depart 加入 SUMO, 由 SUMO 按时间插入
++ 使用 TraCI (use_gui=True) 时订阅事故车道上的车辆位置 (context subscription), 结果随 simulationStep 一起返回,
+  不需要每辆车单独查询; libsumo 没有通讯开销, 直接调用
++ step(action, render=False) 只推进 SUMO, 不更新 3D 场景, 也不渲染传感器 (pixel 和 veh_3d_elements 为 None)
++ render_current(state) 将 3D 场景同步到当前的 SUMO 并渲染, 不推进仿真. 在 step 之后才知道需要保存的时刻 (决策, 事件) 使用
++ 每个 tls_ids 中的路口都有路口相机, 多个路口共用一个 SUMO 和一个 3D 场景
++ soft_reset=True 时, 第一次之后的 reset 只重启 SUMO, 保留 3D 场景 (地图, 车辆模型, 相机和 offscreen buffer);
+  同一个地图运行多个 episode (例如使用 set_special_events 更换事故和特殊车辆) 时不需要重新初始化渲染, 见 collect_data_episodes.py
+  重启 SUMO 之前使用渲染器的 clear_dynamic_elements 删除上一个 episode 的车辆和飞行器节点 (新的 episode 会使用相同的 id, 
+  不能复用旧的节点), tshub 的渲染器没有这个方法时不支持 soft reset (创建环境时报错). 检查见 check_soft_reset.py
++ 3d_assets 中有模型缓存 (build_asset_cache.py 生成) 时, 从缓存加载模型
++ save_state 保存 SUMO 当前的状态, 用于反事实分支 (branch_labeler.py)
++ sumo_seed: sumocfg 中 SUMO 的随机种子, 记录在 actions.jsonl 中, replay 时检查
 LastEditors: WANG Maonan
-LastEditTime: 2025-08-19 17:30:35
+LastEditTime: 2026-10-18 23:36:50
 '''
+import heapq
 import gymnasium as gym
+import xml.etree.ElementTree as ET
+import traci.constants as tc
 from loguru import logger
 from typing import List, Dict, Any
 from tshub.tshub_env3d.tshub_env3d import Tshub3DEnvironment
+from utils.env_utils.asset_cache import enable_model_cache
+
+SUMO_DEFAULT_SEED = 23423 # sumocfg 中没有设置 seed 时 SUMO 使用的种子
+SCENE_RENDERER_ATTR = "tshub_render" # Tshub3DEnvironment 中 3D 场景渲染器的属性, step(state) 同步场景并渲染传感器
+SCENE_CLEAR_METHOD = "clear_dynamic_elements" # 渲染器删除所有车辆和飞行器节点的方法, soft reset 需要
+
+def sumocfg_seed(sumo_cfg:str):
+    """sumocfg 中的 seed, 使用 random (每次不同) 时返回 None
+    """
+    root = ET.parse(sumo_cfg).getroot()
+    random_element = root.find("./random_number/random")
+    if random_element is not None and random_element.get("value", "").lower() in ["true", "1"]:
+        return None
+    seed_element = root.find("./random_number/seed")
+    return int(seed_element.get("value")) if seed_element is not None else SUMO_DEFAULT_SEED
 
 class TSCEnvironment3D(gym.Env):
     def __init__(
@@ -27,8 +59,11 @@ class TSCEnvironment3D(gym.Env):
             resolution=0.5,
             use_gui:bool=False,
             aircraft_inits:Dict[str, Dict[str, Any]] = None, 
+            soft_reset:bool=False,
         ) -> None:
         super().__init__()
+        enable_model_cache(scenario_glb_dir) # 需要在创建 3D 场景之前设置
+        self.sumo_seed = sumocfg_seed(sumo_cfg)
         # 定义环境信息
         self.tsc_env = Tshub3DEnvironment(
             sumo_cfg=sumo_cfg,
@@ -59,10 +94,10 @@ class TSCEnvironment3D(gym.Env):
                     "a1": {"sensor_types": ['aircraft_all']}
                 },
                 'tls': {
-                    tls_ids[0]: {
+                    _tls_id: {
                         "tls_camera_height": 15,
                         "sensor_types":["junction_front_all"]
-                    }
+                    } for _tls_id in tls_ids
                 },
             }, # 需要渲染的图像
         )
@@ -74,19 +109,46 @@ class TSCEnvironment3D(gym.Env):
         # 判断事故车辆是否插入
         self.pending_vehicles = {}  # 存储待插入的车辆信息
         self.inserted_vehicles = set()  # 存储已插入的车辆ID
+        self.insertion_queue = [] # (depart_time, veh_id) 的最小堆, 按照出现时间排序
+        self.use_subscription = use_gui # TraCI 每次调用都是一次 socket 通讯, 使用订阅
+        self.subscribed_lanes = set() # 已经订阅的车道
+
+        # 3D 场景只在第一次 reset 时创建
+        self.soft_reset = soft_reset
+        self.scene_loaded = False
+        if soft_reset and not callable(getattr(getattr(self.tsc_env, SCENE_RENDERER_ATTR, None), SCENE_CLEAR_METHOD, None)):
+            raise ValueError(
+                f"当前 tshub 的 {SCENE_RENDERER_ATTR} 没有 {SCENE_CLEAR_METHOD}, 不支持 soft reset (COLLECT.SOFT_RESET=false)"
+            )
+
+    def set_special_events(self, accident_config:Dict[str, Any], special_vehicle_config:Dict[str, Any]) -> None:
+        """更换事故和特殊车辆, 下一次 reset 时生效
+        """
+        self.accident_configs = accident_config or []
+        self.special_vehicle_configs = special_vehicle_config or []
 
     def reset(self):
-        state_infos = self.tsc_env.reset()
+        if self.soft_reset and self.scene_loaded:
+            # 只重启 SUMO, 3D 场景中的车辆和飞行器在下一次渲染时按照新的 SUMO 重新创建
+            self._remove_scene_elements()
+            state_infos = self.tsc_env.tshub_env.reset()
+        else:
+            state_infos = self.tsc_env.reset()
+            self.scene_loaded = True
         self.conn = self.tsc_env.tshub_env.sumo # 获得 sumo 连接
         new_state = {'state': state_infos, 'pixel': None, 'veh_3d_elements':None}
 
         # 清空待插入车辆记录
         self.pending_vehicles = {}
         self.inserted_vehicles = set()
+        self.insertion_queue = []
+        self.subscribed_lanes = set() # 新的连接, 之前的订阅已经失效
 
         # 创建所有事故车辆（初始化事故，step 的时候再创建）
         for accident in self.accident_configs:
             self._create_accident_vehicle(accident)
+        if self.use_subscription:
+            self._subscribe_insertion_lanes()
         
         # 创建所有特殊车辆（立即创建，但设置出发时间）
         for vehicle in self.special_vehicle_configs:
@@ -94,65 +156,167 @@ class TSCEnvironment3D(gym.Env):
 
         return new_state
         
-    def step(self, action:Dict[str, Dict[str, int]]):
+    def step(self, action:Dict[str, Dict[str, int]], render:bool=True):
         action = {
             'vehicle': dict(), 
             'tls': action
         } # 这里只控制 tls 即可
 
-        # 在环境 step 前检查并插入到达出发时间的车辆
-        current_time = self.conn.simulation.getTime()
-        for veh_id, veh_info in list(self.pending_vehicles.items()):
-            if veh_id not in self.inserted_vehicles and current_time >= veh_info['depart_time']:
-                # 查看当前这个 lane 上面是否有车等待, 有的话就删除
-                lane_id = f"{veh_info['edge_id']}_{veh_info['lane_index']}"
-                lane_vehicles = self.conn.lane.getLastStepVehicleIDs(lane_id) # 获取当前车道上的所有车辆
-                # 检查是否有车辆在目标位置附近
-                for existing_veh in lane_vehicles:
-                    existing_pos = self.conn.vehicle.getLanePosition(existing_veh)
-                    # 如果现有车辆位置与目标位置太近（比如1米范围内）
-                    if veh_info['position'] - existing_pos < 1.0:
-                        self.conn.vehicle.remove(existing_veh)
-                        logger.info(f"INFO: 删除车辆 {existing_veh} 以插入新车辆 {veh_id}")
-                    
-                # 插入车辆
-                self.conn.vehicle.add(
-                    vehID=veh_id,
-                    routeID=veh_info['route_id'],
-                    typeID=veh_info['veh_type'],
-                    depart="now",
-                    departLane=veh_info['lane_index'],
-                    departPos=veh_info['position'],
-                    departSpeed=0,
-                )
-                # 立即移动到指定位置
-                self.conn.vehicle.moveTo(
-                    vehID=veh_id,
-                    laneID=f"{veh_info['edge_id']}_{veh_info['lane_index']}",
-                    pos=veh_info['position']
-                )
-                # 设置持续时间
-                self.conn.vehicle.setStop(
-                    vehID=veh_id,
-                    edgeID=veh_info['edge_id'],
-                    pos=veh_info['position'],
-                    laneIndex=veh_info['lane_index'],
-                    duration=veh_info['duration']
-                )
-                # 加入到已经添加的车辆
-                self.inserted_vehicles.add(veh_id)
-                logger.info(f"INFO: Time: {veh_info['depart_time']}, 成功插入障碍物, {veh_id}")
-
-        states, rewards, infos, dones, sensor_datas = self.tsc_env.step(action)
-        sensor_data = sensor_datas['image'] # 获得图片数据
-        vehicle_elements = sensor_datas['veh_elements'] # 车辆数据
+        # 在环境 step 前插入到达出发时间的车辆 (只查看队列头部)
+        due_vehicles = self._pop_due_vehicles(self.conn.simulation.getTime())
+        if due_vehicles:
+            self._insert_vehicles(due_vehicles)
+
+        if render:
+            states, rewards, infos, dones, sensor_datas = self.tsc_env.step(action)
+            sensor_data = sensor_datas['image'] # 获得图片数据
+            vehicle_elements = sensor_datas['veh_elements'] # 车辆数据
+        else: # 只仿真, 下一次渲染时 3D 场景会同步到当时的车辆
+            states, rewards, infos, dones = self.tsc_env.tshub_env.step(action)
+            sensor_data, vehicle_elements = None, None
         truncated = dones
 
         new_state = {'state': states, 'pixel': sensor_data, 'veh_3d_elements':vehicle_elements}
         return new_state, rewards, truncated, dones, infos
     
+    def _remove_scene_elements(self) -> None:
+        """删除 3D 场景中上一个 episode 的车辆和飞行器节点 (渲染器自己的记录也一起清空), 之后渲染时重新创建
+        """
+        getattr(self._scene_renderer(), SCENE_CLEAR_METHOD)()
+        logger.info("SIM: soft reset, 删除 3D 场景中的车辆和飞行器")
+
+    def render_current(self, new_state:Dict[str, Any]) -> Dict[str, Any]:
+        """渲染 step(render=False) 返回的时刻, 结果写入 new_state (pixel, veh_3d_elements), 已经渲染过时直接返回.
+        Tshub3DEnvironment.step 是 tshub_env.step 之后使用 state 调用渲染器 (tshub_render) 的 step, 这里只调用渲染器
+        """
+        if new_state['pixel'] is None:
+            sensor_datas = self._scene_renderer().step(new_state['state'])
+            new_state['pixel'] = sensor_datas['image'] # 获得图片数据
+            new_state['veh_3d_elements'] = sensor_datas['veh_elements'] # 车辆数据
+        return new_state
+
+    def _scene_renderer(self):
+        """Tshub3DEnvironment 中 3D 场景的渲染器, 没有时报错 (tshub 版本不同)
+        """
+        renderer = getattr(self.tsc_env, SCENE_RENDERER_ATTR, None)
+        if renderer is None or not callable(getattr(renderer, 'step', None)):
+            raise RuntimeError(
+                f"Tshub3DEnvironment 没有 {SCENE_RENDERER_ATTR}.step, 无法只渲染当前时刻, "
+                f"请使用 CAPTURE_POLICY=all 或更新 tshub"
+            )
+        return renderer
+
+    def save_state(self, file_path:str) -> None:
+        self.conn.simulation.saveState(file_path)
+
     def close(self) -> None:
         self.tsc_env.close()
+
+    # ====== 事故车辆插入 =======
+    def _pop_due_vehicles(self, current_time: float) -> List[str]:
+        """从队列中取出到达出发时间的车辆
+        """
+        due_vehicles = []
+        while self.insertion_queue and self.insertion_queue[0][0] <= current_time:
+            _, veh_id = heapq.heappop(self.insertion_queue)
+            if veh_id not in self.inserted_vehicles:
+                due_vehicles.append(veh_id)
+        return due_vehicles
+
+    @staticmethod
+    def _lane_of(veh_info: Dict[str, Any]) -> str:
+        return f"{veh_info['edge_id']}_{veh_info['lane_index']}"
+
+    def _subscribe_insertion_lanes(self) -> None:
+        """订阅事故车道上车辆的 lane 和位置, 每个 simulationStep 都会返回结果
+        """
+        for lane_id in {self._lane_of(_veh_info) for _veh_info in self.pending_vehicles.values()}:
+            self.conn.lane.subscribeContext(
+                lane_id, tc.CMD_GET_VEHICLE_VARIABLE, 0, # 距离为 0, 只需要车道上的车辆
+                [tc.VAR_LANE_ID, tc.VAR_LANEPOSITION]
+            )
+            self.subscribed_lanes.add(lane_id)
+        logger.info(f"SIM: 订阅 {len(self.subscribed_lanes)} 个事故车道")
+
+    def _unsubscribe_finished_lanes(self, lane_ids: List[str]) -> None:
+        """车道上的事故车辆都插入之后取消订阅
+        """
+        for lane_id in lane_ids:
+            if lane_id in self.subscribed_lanes and all(
+                _veh_id in self.inserted_vehicles 
+                for _veh_id, _veh_info in self.pending_vehicles.items() if self._lane_of(_veh_info) == lane_id
+            ):
+                self.conn.lane.unsubscribeContext(lane_id, tc.CMD_GET_VEHICLE_VARIABLE, 0)
+                self.subscribed_lanes.remove(lane_id)
+
+    def _lane_vehicle_positions(self, lane_id: str) -> Dict[str, float]:
+        """车道上所有车辆的位置 {veh_id: lane_position}, 订阅的车道从订阅结果中读取
+        """
+        if lane_id in self.subscribed_lanes:
+            results = self.conn.lane.getContextSubscriptionResults(lane_id) or {}
+            return {
+                _veh_id: _veh_vars[tc.VAR_LANEPOSITION]
+                for _veh_id, _veh_vars in results.items() if _veh_vars[tc.VAR_LANE_ID] == lane_id # 去掉相邻车道的车辆
+            }
+        return {
+            _veh_id: self.conn.vehicle.getLanePosition(_veh_id)
+            for _veh_id in self.conn.lane.getLastStepVehicleIDs(lane_id)
+        }
+
+    def _insert_vehicles(self, veh_ids: List[str]) -> None:
+        """插入车辆, 同一个车道的车辆只查询一次车道, 并一起删除附近的车辆
+        """
+        lane_vehicles = {} # lane_id -> [veh_id, ...]
+        for veh_id in veh_ids:
+            lane_vehicles.setdefault(self._lane_of(self.pending_vehicles[veh_id]), []).append(veh_id)
+
+        for lane_id, new_veh_ids in lane_vehicles.items():
+            # 查看当前这个 lane 上面是否有车等待, 有的话就删除
+            for existing_veh, existing_pos in self._lane_vehicle_positions(lane_id).items():
+                # 如果现有车辆位置与目标位置太近（比如1米范围内）
+                blocked_veh_ids = [
+                    _veh_id for _veh_id in new_veh_ids 
+                    if self.pending_vehicles[_veh_id]['position'] - existing_pos < 1.0
+                ]
+                if blocked_veh_ids:
+                    self.conn.vehicle.remove(existing_veh)
+                    logger.info(f"INFO: 删除车辆 {existing_veh} 以插入新车辆 {', '.join(blocked_veh_ids)}")
+
+            for veh_id in new_veh_ids:
+                self._insert_vehicle(veh_id, lane_id)
+
+        if self.subscribed_lanes:
+            self._unsubscribe_finished_lanes(list(lane_vehicles))
+
+    def _insert_vehicle(self, veh_id: str, lane_id: str) -> None:
+        veh_info = self.pending_vehicles[veh_id]
+        # 插入车辆
+        self.conn.vehicle.add(
+            vehID=veh_id,
+            routeID=veh_info['route_id'],
+            typeID=veh_info['veh_type'],
+            depart="now",
+            departLane=veh_info['lane_index'],
+            departPos=veh_info['position'],
+            departSpeed=0,
+        )
+        # 立即移动到指定位置
+        self.conn.vehicle.moveTo(
+            vehID=veh_id,
+            laneID=lane_id,
+            pos=veh_info['position']
+        )
+        # 设置持续时间
+        self.conn.vehicle.setStop(
+            vehID=veh_id,
+            edgeID=veh_info['edge_id'],
+            pos=veh_info['position'],
+            laneIndex=veh_info['lane_index'],
+            duration=veh_info['duration']
+        )
+        # 加入到已经添加的车辆
+        self.inserted_vehicles.add(veh_id)
+        logger.info(f"INFO: Time: {veh_info['depart_time']}, 成功插入障碍物, {veh_id}")
     
     # ====== 特殊场景创建 =======
     def _create_accident_vehicle(self, accident_config):
@@ -181,6 +345,7 @@ class TSCEnvironment3D(gym.Env):
             'veh_type': veh_type,
             'is_accident': True
         }
+        heapq.heappush(self.insertion_queue, (depart_time, veh_id))
 
         logger.info(f"SIM: 事故路障 {veh_id} 将在 {depart_time} 秒出现在 {edge_id}-{lane_index} 的 {position} 米处")
         return True
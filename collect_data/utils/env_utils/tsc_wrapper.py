@@ -2,23 +2,52 @@
 Author: Maonan Wang
 Date: 2025-01-15 18:33:20
 Description: TSC Wrapper for ENV 3D (collect data)
++ 每个仿真时刻的处理 (state, 保存数据) 在 _record_sim_step 中, 多路口时由 MultiTSCEnvWrapper 调用
++ 有 branch_labeler 时, 保存的决策时刻在 step_info.json 中记录每个相位的 Q 值 (phase_q), 见 branch_labeler.py
++ replay_decisions 不为 None 时, step 使用记录的动作 (之前的 actions.jsonl), 不需要策略; 决策时刻与记录不一致时报错
++ sim_only=True 时所有时刻都不渲染, 只保存 step_info, state 和 annotations, 图片和 3d_vehs.json 之后由 offline_render.py 生成
++ on_step_written: 保存一个时刻之后调用 (step_idx, pixel), 多路口时用于在 episode 根目录保存共用的相机 (只保存一次)
++ step 时只渲染 capture policy 预先知道需要的时刻, 其他时刻只仿真; step 之后才知道需要保存的时刻 (决策, 事件) 使用 render_current 渲染
++ 保存的时刻没有图片时 (缓存的时刻没有渲染), manifest 中记录 missing_frames=True
 LastEditors: WANG Maonan
-LastEditTime: 2025-08-11 19:07:01
+LastEditTime: 2026-10-18 23:29:05
 '''
 import os
-import cv2
 import copy
+import time
 import numpy as np
+from loguru import logger
+from collections import deque
 import gymnasium as gym
 from gymnasium.core import Env
 
-from utils.save_vector import save_states
-from parse_infos.parse_direction_infos import TrafficState2DICT # 将环境信息转换为 JSON
-from tshub.utils.format_dict import save_str_to_json
+from parse_infos.parse_direction_infos import TOPOLOGY_FILE, TrafficState2DICT # 将环境信息转换为 JSON
+from utils.io_utils.artifact_writer import ArtifactWriter, make_artifact_writer
+from utils.io_utils.state_store import EpisodeStateWriter
+from utils.io_utils.episode_manifest import ACTION_LOG_FILE, JsonlLog, read_action_log
+from utils.io_utils.io_stats import IO_STATS_FILE
+from utils.env_utils.capture_policy import CapturePolicy
+from utils.env_utils.event_trigger import EventTrigger
+from utils.env_utils.branch_labeler import BranchLabeler
 
-def convert_rgb_to_bgr(image):
-    # Convert an RGB image to BGR
-    return image[:, :, ::-1]
+def write_sensor_outputs(writer: ArtifactWriter, step_key: str, veh_3d_elements, pixel, is_saved_element=None):
+    """保存渲染的结果 (3d_vehs.json 和图片), 返回保存的相机名称. veh_3d_elements 为 None 时只保存图片
+    """
+    # -> 存储车辆数据
+    if veh_3d_elements is not None:
+        writer.write_json(f"{step_key}/3d_vehs.json", veh_3d_elements)
+
+    # -> 存储传感器数据 (图片)
+    camera_names = []
+    for element_id, cameras in pixel.items():
+        if is_saved_element is not None and not is_saved_element(element_id):
+            continue # 多路口时只保存这个路口的相机 (俯视的飞行器保存在 episode 根目录)
+        # Iterate over each camera type
+        for camera_type, image_array in cameras.items():
+            # Save the numpy array as an image (后缀由 writer 的 image codec 决定)
+            writer.write_image(f"{step_key}/low_quality_rgb/{element_id}_{camera_type}", image_array)
+            camera_names.append(f"{element_id}_{camera_type}")
+    return camera_names
 
 class TSCEnvWrapper(gym.Wrapper):
     def __init__(
@@ -28,7 +57,18 @@ class TSCEnvWrapper(gym.Wrapper):
             movement_num:int, 
             phase_num:int,
             max_states_length:int = 7, 
-            base_path: str = None
+            base_path: str = None,
+            writer: ArtifactWriter = None,
+            state_format: str = "npy",
+            state_capacity: int = 3600,
+            capture_policy: CapturePolicy = None,
+            event_trigger_config: dict = None,
+            resume: bool = False,
+            camera_elements: list = None,
+            branch_labeler: BranchLabeler = None,
+            replay_decisions: list = None,
+            sim_only: bool = False,
+            on_step_written = None,
         ) -> None:
         super().__init__(env)
         self.tls_id = tls_id
@@ -47,9 +87,37 @@ class TSCEnvWrapper(gym.Wrapper):
 
         # 每个 step 的信息保存 (图片&JSON)
         self.base_path = base_path
+        self.writer = writer or make_artifact_writer(base_path) # 默认同步写入, 每个文件单独保存
+        # state 的保存方式, npy: 每个 step 保存完整的窗口; memmap: 每个 episode 保存一份, 见 state_store.py
+        if state_format not in ["npy", "memmap"]:
+            raise ValueError(f"Unknown state format: {state_format}, should be 'npy' or 'memmap'")
+        self.state_format = state_format
+        self.state_capacity = state_capacity
+        self.state_store = None
         self.step_idx = 0
         self.can_perform_action_infos = {}
 
+        # 哪些时刻需要保存, 见 capture_policy.py
+        self.capture_policy = capture_policy or CapturePolicy(mode="all")
+        self.pre_roll_records = deque(maxlen=self.capture_policy.pre_roll) # 决策之前的时刻, 先缓存在内存中
+        self.captured_steps = [] # 已经保存的时刻, 写入 global.json
+        self.camera_elements = camera_elements # 保存哪些 element 的图片 (例如 [tls_id], 路口相机是 <tls_id>_<idx>), None 表示全部
+        self.on_step_written = on_step_written # 保存一个时刻之后调用 (step_idx, pixel), 用于保存其他路口共用的相机
+        self.event_trigger_config = event_trigger_config or {} # EventTrigger 的参数, event 模式使用
+        self.event_trigger = None
+        self.branch_labeler = branch_labeler # 决策时刻每个相位的 Q 值, None 表示不计算
+
+        # 每次决策的动作 (actions.jsonl), 中断之后 resume 时按顺序重放, 恢复仿真的进度
+        self.resume = resume
+        self.action_log = JsonlLog(os.path.join(base_path, ACTION_LOG_FILE))
+        self.decision_idx = 0
+        self.committed_steps = set() # resume 时已经保存过的时刻, 不再重复写入
+        self.replayed_actions = [] # resume 时重放的动作, 脚本可以用来恢复自己的状态
+        self._replaying = False
+        self.reset_seed = None
+        self.replay_decisions = replay_decisions # replay: 按顺序使用这些决策的动作, 忽略 step 传入的 action
+        self.sim_only = sim_only # 只仿真, 之后离线渲染
+
     # ########
     # RL Space
     # ########
@@ -136,9 +204,32 @@ class TSCEnvWrapper(gym.Wrapper):
     def reset(self, seed=1):
         """reset 时初始化. 初始的 Image 全部是 0
         """
+        self.reset_seed = seed
+        state = self.env.reset()
+        info = self._init_episode(state)
+
+        # 新的 episode 清空之前的记录; resume 时重放已经 commit 的决策
+        replay_decisions = self._prepare_resume() if self.resume else self._start_new_episode()
+        self._replaying = True
+        try:
+            for _decision in replay_decisions:
+                self.states, _, _, _, info = self.step(_decision['action'])
+        finally:
+            self._replaying = False
+        self.replayed_actions = [_decision['action'] for _decision in replay_decisions]
+        return self.states, info
+
+    def _init_episode(self, state):
+        """使用 reset 之后的 state 初始化路口信息, 返回 info
+        """
         self.step_idx = 0
+        self.buffer_idx = 0 # 与 step_idx 对齐, state_store 按照 step_idx 还原缓冲区的顺序
+        self.states = np.zeros((self.max_states_length, self.movement_num, 7), dtype=np.float32) # 上一个 episode 的 state 不保留
         self.can_perform_action_infos = {} # 最后存储全局信息
-        state = self.env.reset()
+        self.pre_roll_records.clear()
+        self.captured_steps = []
+        self.decision_idx = 0
+        self.capture_policy.reset()
 
         # 初始化路口静态信息
         self.movement_ids = state['state']['tls'][self.tls_id]['movement_ids']
@@ -151,67 +242,258 @@ class TSCEnvWrapper(gym.Wrapper):
 
         # 初始化路口信息, 特征转换器
         self.traffic_state_to_dict = TrafficState2DICT(self.tls_id, info)
-        return self.states, info
+        if self.capture_policy.needs_events:
+            self.event_trigger = EventTrigger(self.tls_id, info, **self.event_trigger_config)
 
-    def step(self, action: int):
+        if self.state_format == "memmap":
+            self.state_store = EpisodeStateWriter(
+                self.base_path, 
+                movement_num=self.movement_num,
+                max_states_length=self.max_states_length,
+                capacity=self.state_capacity
+            )
+        return info
+
+    def _start_new_episode(self):
+        self.committed_steps = set()
+        self.writer.clear() # 删除之前 episode 的 step (shard 和 index 也重新开始), 不会被读取到
+        self.writer.write_json(TOPOLOGY_FILE, self.traffic_state_to_dict.topology) # 路口不变的信息只保存一次
+        if self.writer.manifest is not None:
+            self.writer.manifest.rewrite([])
+        self.action_log.rewrite([self._action_log_header()])
+        return []
+
+    def _action_log_header(self):
+        """actions.jsonl 的第一行, 记录 episode 的随机种子
+        """
+        return {"seeds": {"sumo": getattr(self.env, 'sumo_seed', None), "reset": self.reset_seed}}
+
+    def _prepare_resume(self):
+        """找到最后一个完整保存的决策, 删除之后的数据, 返回需要重放的决策.
+        决策结束时刻 (end_step) 之前的 step 都已经 commit, 才可以从这个决策之后继续.
+        """
+        if self.writer.manifest is None:
+            raise ValueError("resume 需要 writer 记录 manifest")
+        self.writer.write_json(TOPOLOGY_FILE, self.traffic_state_to_dict.topology)
+        manifest = self.writer.manifest.read()
+        last_committed = manifest[-1]['step'] if manifest else -1 # step 是按顺序 commit 的
+
+        replay_decisions = []
+        _, logged_decisions = read_action_log(self.action_log.file_path)
+        for _decision in logged_decisions:
+            if _decision['end_step'] > last_committed:
+                break
+            replay_decisions.append(_decision)
+        resume_step = replay_decisions[-1]['end_step'] if replay_decisions else -1
+
+        # resume_step 之后的 step 会重新生成
+        kept_records = [_record for _record in manifest if _record['step'] <= resume_step]
+        for _record in manifest:
+            if _record['step'] > resume_step:
+                self.writer.storage.remove_step(_record['step'])
+        self.writer.storage.discard_uncommitted()
+        self.writer.manifest.rewrite(kept_records)
+        self.action_log.rewrite([self._action_log_header(), *replay_decisions])
+        self.committed_steps = {_record['step'] for _record in kept_records}
+
+        logger.info(f"SIM: resume, 重放 {len(replay_decisions)} 次决策, 从 step {resume_step+1} 继续保存")
+        return replay_decisions
+
+    def step(self, action: int = None):
+        if self.replay_decisions is not None:
+            action = self._replay_action()
         can_perform_action = False
         action = {self.tls_id: action} # 构建单路口 action 的动作
+        self.capture_policy.start_decision(self.step_idx, action[self.tls_id]) # 用于预测决策时刻
         while not can_perform_action:
-            states, rewards, truncated, dones, infos = super().step(action) # 与环境交互
-            pixel, process_obs, veh_3d_elements, can_perform_action = self.state_wrapper(state=states) # 只需要最后一个时刻的图像
-            self.states[self.buffer_idx] = np.array(process_obs, dtype=np.float32)
-            self.buffer_idx = (self.buffer_idx + 1) % self.max_states_length
+            render = self.needs_render()
+            start_time = time.perf_counter()
+            states, rewards, truncated, dones, infos = self.env.step(action, render=render) # 与环境交互
+            self.writer.stats.record_time("env_step" if render else "env_step_no_render", (time.perf_counter() - start_time) * 1000) # 仿真 + 渲染
+            infos, can_perform_action = self._record_sim_step(action[self.tls_id], states, infos)
 
-            # #################
-            # 存储每一个时刻的数据
-            # #################
-
-            # info 包含环境完整的信息, 用于转换为 json
-            infos = self.info_wrapper(infos=infos, raw_state=states) # info 需要转换为一个 dict
-            direction_infos = self.traffic_state_to_dict(infos)
-
-            step_data_path = os.path.join(self.base_path, f"{self.step_idx}")
-            low_quality_rgb_path = os.path.join(step_data_path, "low_quality_rgb")
-            annotations_path = os.path.join(step_data_path, "annotations") # 存储每一个方向对应的 JSON 文件
-
-            for _path in [step_data_path, low_quality_rgb_path, annotations_path]:
-                if not os.path.exists(_path):
-                    os.makedirs(_path)
-
-            # -> 每个 step 的总体数据
-            step_infp = {
-                "time_step": infos['step_time'],
-                "action": action[self.tls_id],
-                "can_perform_action": can_perform_action # 如果是
-            }
-            save_str_to_json(step_infp, os.path.join(step_data_path, "step_info.json"))
-
-            # -> 存储 Vector (RL 的 state)
-            save_states(states=self.states, filename=os.path.join(step_data_path, "state_vector.npy"))
-
-            # -> 存储车辆数据
-            save_str_to_json(veh_3d_elements, os.path.join(step_data_path, "3d_vehs.json"))
-
-            # -> 存储传感器数据 (图片)
-            for element_id, cameras in pixel.items():
-                # Iterate over each camera type
-                for camera_type, image_array in cameras.items():
-                    # Save the numpy array as an image
-                    image_path = os.path.join(low_quality_rgb_path, f"{element_id}_{camera_type}.png")
-                    cv2.imwrite(image_path, convert_rgb_to_bgr(image_array))
-
-            # -> 存储每个方向的 JSON 数据
-            for direction_idx, direction_info in direction_infos.items():
-                json_path = os.path.join(annotations_path, f"{direction_idx}.json")
-                save_str_to_json(direction_info, json_path)
-            
-            self.can_perform_action_infos[self.step_idx] = can_perform_action
-            self.step_idx += 1
+        self._log_decision(action[self.tls_id])
 
         # 需要返回动作的时候才计算 reward
         rewards = self.reward_wrapper(states=states)
 
         return self.states, rewards, truncated, dones, infos
+
+    def needs_render(self) -> bool:
+        """step 时是否渲染. 不会保存的时刻 (以及 resume 时已经保存过的时刻) 只仿真, 
+        step 之后发现需要保存时在 _record_sim_step 中渲染
+        """
+        if self.sim_only:
+            return False
+        return self.capture_policy.needs_render(self.step_idx) and self.step_idx not in self.committed_steps
+
+    def _record_sim_step(self, action, states, infos):
+        """处理一个仿真时刻 (1s): 更新 state 窗口, 按照 capture policy 保存数据. 返回 (infos, can_perform_action)
+        """
+        pixel, process_obs, veh_3d_elements, can_perform_action = self.state_wrapper(state=states) # 只需要最后一个时刻的图像
+        self.states[self.buffer_idx] = np.array(process_obs, dtype=np.float32)
+        self.buffer_idx = (self.buffer_idx + 1) % self.max_states_length
+
+        # -> 存储 Vector (memmap 每个时刻都保存, 便于还原任意时刻的窗口)
+        if self.state_store is not None:
+            self.state_store.append(self.step_idx, process_obs) # 只保存当前时刻
+
+        # #################
+        # 存储需要的时刻的数据
+        # #################
+        events = self.event_trigger(states) if self.event_trigger is not None else None
+        should_capture = self.capture_policy.should_capture(self.step_idx, can_perform_action, has_event=bool(events))
+        if should_capture and pixel is None and not self.sim_only and self.step_idx not in self.committed_steps:
+            # step 时没有渲染 (决策和事件在 step 之后才知道), 只渲染这个时刻
+            start_time = time.perf_counter()
+            states = self.env.render_current(states) # 多路口时结果写入 states, 其他路口不会重复渲染
+            self.writer.stats.record_time("render_current", (time.perf_counter() - start_time) * 1000)
+            pixel, veh_3d_elements = states['pixel'], states['veh_3d_elements']
+        if should_capture or can_perform_action or self.capture_policy.pre_roll > 0:
+            # info 包含环境完整的信息, 用于转换为 json (也是 step 返回的 info)
+            infos = self.info_wrapper(infos=infos, raw_state=states) # info 需要转换为一个 dict
+
+        phase_q = None
+        if (
+            self.branch_labeler is not None and can_perform_action and self.step_idx not in self.committed_steps
+            and (should_capture or self.capture_policy.pre_roll > 0)
+        ): # 只有会保存的决策时刻才需要计算
+            start_time = time.perf_counter()
+            phase_q = self.branch_labeler.label(self.env)
+            self.writer.stats.record_time("branch_label", (time.perf_counter() - start_time) * 1000)
+
+        if should_capture and self.step_idx in self.committed_steps: # resume 时重放, 已经保存过
+            self._flush_pre_roll_records() # 之前缓存的时刻也已经保存过
+            self.captured_steps.append(self.step_idx)
+        elif should_capture or self.capture_policy.pre_roll > 0:
+            step_record = self._make_step_record(
+                infos, action, can_perform_action, pixel, veh_3d_elements, events, phase_q
+            )
+            if should_capture:
+                self._flush_pre_roll_records() # 先保存之前缓存的时刻
+                self._write_step_record(step_record)
+            else:
+                self.pre_roll_records.append(step_record) # 超过长度的旧时刻会被丢弃
+        
+        self.can_perform_action_infos[self.step_idx] = can_perform_action
+        self.step_idx += 1
+        return infos, can_perform_action
+
+    def _replay_action(self) -> int:
+        if self.decision_idx >= len(self.replay_decisions):
+            raise RuntimeError(f"动作记录只有 {len(self.replay_decisions)} 次决策, 仿真还没有结束")
+        return self.replay_decisions[self.decision_idx]['action']
+
+    def _log_decision(self, action) -> None:
+        """记录本次决策, 用于 resume 和 replay
+        """
+        if self.replay_decisions is not None: # 相同的种子和动作, 每次决策的结束时刻应该相同
+            expected_step = self.replay_decisions[self.decision_idx]['end_step']
+            if expected_step != self.step_idx - 1:
+                raise RuntimeError(
+                    f"replay 与记录不一致: 第 {self.decision_idx} 次决策在 step {self.step_idx - 1} 结束, 记录是 {expected_step}"
+                )
+        self.capture_policy.end_decision(self.step_idx - 1)
+        if not self._replaying:
+            self.action_log.append({
+                "decision": self.decision_idx, 
+                "action": int(action), 
+                "end_step": self.step_idx - 1
+            })
+        self.decision_idx += 1
+
+    def _make_step_record(self, infos, action, can_perform_action, pixel, veh_3d_elements, events=None, phase_q=None):
+        """整理一个时刻需要保存的数据, 可以立即写入, 也可以先缓存
+        """
+        step_info = {
+            "time_step": infos['step_time'],
+            "action": action,
+            "can_perform_action": can_perform_action # 如果是
+        }
+        if events is not None: # event 模式下记录当前时刻触发的事件
+            step_info['events'] = events
+        if phase_q is not None: # 每个相位 (index) 在 horizon 内的累积奖励
+            step_info['phase_q'] = phase_q
+        return {
+            'step_idx': self.step_idx,
+            'step_info': step_info,
+            'states': None if self.state_store is not None else np.array(self.states, copy=True),
+            'veh_3d_elements': veh_3d_elements,
+            'pixel': pixel,
+            'direction_infos': self.traffic_state_to_dict(infos),
+        }
+
+    def _flush_pre_roll_records(self) -> None:
+        """保存缓存的时刻, resume 时已经保存过的时刻 (重放时没有渲染) 不再写入
+        """
+        while self.pre_roll_records:
+            step_record = self.pre_roll_records.popleft()
+            if step_record['step_idx'] in self.committed_steps:
+                self.captured_steps.append(step_record['step_idx'])
+            else:
+                self._write_step_record(step_record)
+
+    def _write_step_record(self, step_record) -> None:
+        start_time = time.perf_counter()
+        # 文件的 key 是相对 base_path 的路径, 由 writer 决定保存为文件还是 shard
+        step_key = f"{step_record['step_idx']}"
+
+        # -> 每个 step 的总体数据
+        self.writer.write_json(f"{step_key}/step_info.json", step_record['step_info'])
+
+        # -> 存储 Vector (RL 的 state)
+        if step_record['states'] is not None:
+            self.writer.write_states(f"{step_key}/state_vector.npy", step_record['states'])
+
+        # -> 存储车辆数据和图片 (sim_only 时没有渲染, 之后离线生成)
+        camera_names = []
+        manifest_info = {}
+        if step_record['pixel'] is not None:
+            camera_names = write_sensor_outputs(
+                self.writer, step_key, step_record['veh_3d_elements'], step_record['pixel'], self._is_saved_element
+            )
+        elif not self.sim_only: # 缓存时没有渲染 (例如 decision_plus_k_before 预测的决策时刻不对)
+            manifest_info['missing_frames'] = True
+            if not self.capture_policy.frameless_pre_roll:
+                logger.warning(f"SIM: {self.tls_id} step {step_record['step_idx']} 没有渲染, 只保存 JSON 和 state")
+
+        # -> 存储每个方向的 JSON 数据 (annotations, 只包含变化的信息, 不变的信息在 topology.json)
+        for direction_idx, direction_info in step_record['direction_infos'].items():
+            self.writer.write_json(f"{step_key}/annotations/{direction_idx}.json", direction_info)
+
+        # 文件全部写完之后 step 才可见, 并记录到 manifest.jsonl (读取时的 index)
+        self.writer.commit_step(
+            step_record['step_idx'], 
+            {**step_record['step_info'], 'cameras': sorted(camera_names), **manifest_info}
+        )
+        self.captured_steps.append(step_record['step_idx'])
+        if self.on_step_written is not None and step_record['pixel'] is not None:
+            self.on_step_written(step_record['step_idx'], step_record['pixel'])
+        self.writer.stats.record_time("write_step", (time.perf_counter() - start_time) * 1000) # 主线程中保存的耗时
     
+    def _is_saved_element(self, element_id: str) -> bool:
+        if self.camera_elements is None:
+            return True
+        return any(
+            element_id == _element or element_id.startswith(f"{_element}_") 
+            for _element in self.camera_elements
+        )
+
     def close(self) -> None:
-        return super().close()
\ No newline at end of file
+        try:
+            self.close_outputs()
+        finally:
+            super().close()
+
+    def close_outputs(self) -> None:
+        """关闭文件 (不关闭环境)
+        """
+        self.writer.close() # 等待后台的文件全部写完
+        if self.state_store is not None:
+            self.state_store.close()
+        self.action_log.close()
+        if self.branch_labeler is not None:
+            self.branch_labeler.close()
+        # 每类文件的数量, 大小和耗时
+        self.writer.stats.dump(os.path.join(self.base_path, IO_STATS_FILE))
+        logger.info(f"SIM: I/O {self.tls_id} {self.writer.stats.summary()}")
\ No newline at end of file
@@ -0,0 +1,7 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 10:02:11
+LastEditors: WANG Maonan
+Description: 采集数据时的文件读写工具
+LastEditTime: 2026-10-18 10:02:14
+'''
@@ -0,0 +1,339 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 10:08:45
+LastEditors: WANG Maonan
+Description: 存储每个 step 的数据 (图片, JSON, state vector)
++ ArtifactWriter: 在主线程直接写入 (与之前的行为一致)
++ AsyncArtifactWriter: 在线程池/进程池中编码, 队列有上限 (backpressure), close 的时候等待全部写完
++ 编码后的数据交给 storage 保存 (目录 或是 shard), 见 episode_storage.py
++ 图片的编码方式见 image_codec.py, JSON 的编码方式 (是否压缩) 见 json_codec.py
++ 一个 step 的文件全部写完之后按顺序 commit, 并在 manifest.jsonl 中追加一行
++ dedup_images: 图片编码之后计算 hash, 内容相同的图片只保存一次
++ manifest 中记录每个 step 的所有文件 (大小, crc32, shard 中的位置, 去重图片的 hash), 读取时不需要遍历文件夹
++ self.stats 记录每类文件的数量, 大小, 编码和写入的耗时, 见 io_stats.py
++ clear: 新的 episode 开始时删除 storage 中之前的数据 (已经训练的 zstd 字典会重新保存)
+LastEditTime: 2026-10-18 22:11:48
+'''
+import io
+import os
+import time
+import zlib
+import hashlib
+import threading
+import numpy as np
+from loguru import logger
+from collections import deque
+from numpy.typing import NDArray
+from typing import Any, Callable, Dict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from utils.io_utils.episode_storage import make_storage
+from utils.io_utils.episode_manifest import MANIFEST_FILE, JsonlLog, step_of_key
+from utils.io_utils.image_codec import ImageCodec, PNGCodec, make_image_codec
+from utils.io_utils.json_codec import ZstdJsonCodec, encode_json, make_json_codec, zstd_dict_key
+from utils.io_utils.io_stats import IOStats
+
+# ##########
+# 将数据编码为 bytes (需要是 top-level 函数, 进程池需要 pickle)
+# ##########
+def encode_states(states: NDArray[np.float32]) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, states)
+    return buffer.getvalue()
+
+def timed_encode(encode_func: Callable[..., bytes], *args):
+    """在 worker 中编码, 同时返回编码的耗时 (ms)
+    """
+    start_time = time.perf_counter()
+    data = encode_func(*args)
+    return data, (time.perf_counter() - start_time) * 1000
+
+
+class ArtifactWriter(object):
+    def __init__(
+            self, 
+            storage, 
+            image_codec: ImageCodec = None, 
+            manifest: JsonlLog = None,
+            dedup_images: bool = False,
+            json_codec: ZstdJsonCodec = None
+        ) -> None:
+        """同步写入, 每个文件写完才返回
+
+        Args:
+            storage: DirectoryStorage 或是 ShardStorage, key 是相对 episode 文件夹的路径
+            image_codec (ImageCodec): 图片的编码方式. Defaults to PNG.
+            manifest (JsonlLog): 记录已经 commit 的 step. Defaults to None (不记录).
+            dedup_images (bool): 内容相同的图片只保存一次. Defaults to False.
+            json_codec (ZstdJsonCodec): JSON 的压缩方式, key 会加上 .zst 后缀. Defaults to None (不压缩).
+        """
+        self.storage = storage
+        self.image_codec = image_codec or PNGCodec()
+        self.manifest = manifest
+        self.dedup_images = dedup_images
+        self.json_codec = json_codec
+        if self.json_codec is not None and self.json_codec.on_dictionary is None:
+            self.json_codec.on_dictionary = self.storage.put # 训练好的字典保存在 episode 中
+        self._step_files = {} # step -> {key: 文件信息}, commit 时写入 manifest
+        self._files_lock = threading.Lock() # 后台写入时多个线程同时更新
+        self.num_images = 0
+        self.num_duplicate_images = 0
+        self.stats = IOStats()
+
+    def write_image(self, key: str, image: NDArray[np.uint8]) -> None:
+        """key 不包含后缀, 后缀由 image_codec 决定
+        """
+        self.submit(f"{key}{self.image_codec.extension}", self.image_codec.encode, image, dedup=self.dedup_images)
+
+    def write_json(self, key: str, data: Dict[str, Any]) -> None:
+        if self.json_codec is None:
+            self.submit(key, encode_json, data)
+            return
+        encode_func, args = self.json_codec.encode_args(data) # 压缩在 worker 中进行
+        self.submit(f"{key}{self.json_codec.extension}", encode_func, *args)
+
+    def write_states(self, key: str, states: NDArray[np.float32]) -> None:
+        self.submit(key, encode_states, states)
+
+    def submit(self, key: str, encode_func: Callable[..., bytes], *args, dedup: bool = False) -> None:
+        data, encode_ms = timed_encode(encode_func, *args)
+        self._put(key, data, dedup, encode_ms)
+
+    def _put(self, key: str, data: bytes, dedup: bool = False, encode_ms: float = 0) -> None:
+        start_time = time.perf_counter()
+        file_info = {"size": len(data), "crc32": zlib.crc32(data)}
+        if dedup:
+            digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+            location, is_new = self.storage.put_blob(key, data, digest)
+            file_info["digest"] = digest # 相同的 hash 是同一份数据
+        else:
+            location = self.storage.put(key, data)
+        file_info.update(location)
+
+        with self._files_lock:
+            if dedup:
+                self.num_images += 1
+                self.num_duplicate_images += int(not is_new)
+            step_idx = step_of_key(key)
+            if step_idx is not None:
+                self._step_files.setdefault(step_idx, {})[key] = file_info
+        self.stats.record_artifact(key, len(data), encode_ms, (time.perf_counter() - start_time) * 1000)
+
+    def commit_step(self, step_idx: int, step_info: Dict[str, Any]) -> None:
+        """step 的文件已经全部提交, 写完之后这个 step 才可见.
+        step_info 与文件信息一起写入 manifest (例如 time_step, action, cameras)
+        """
+        self._commit(step_idx, step_info)
+
+    def _commit(self, step_idx: int, step_info: Dict[str, Any]) -> None:
+        self.storage.commit(step_idx)
+        with self._files_lock:
+            files = self._step_files.pop(step_idx, {})
+        if self.manifest is not None:
+            self.manifest.append({"step": step_idx, **step_info, "files": files})
+
+    def flush(self) -> None:
+        """等待所有的文件写入完成
+        """
+        self.storage.flush()
+
+    def clear(self) -> None:
+        """删除 storage 中之前的数据 (不包括 manifest), 用于新的 episode
+        """
+        self.flush()
+        self.storage.clear()
+        if self.json_codec is not None and self.json_codec.dict_data is not None: # 之后的 JSON 仍然使用这个字典
+            self.storage.put(zstd_dict_key(self.json_codec.dict_id), self.json_codec.dict_data)
+
+    def _log_dedup(self) -> None:
+        if self.dedup_images and self.num_images > 0:
+            logger.info(f"SIM: 图片去重, {self.num_duplicate_images}/{self.num_images} 张与之前的内容相同")
+
+    def close(self) -> None:
+        try:
+            self.flush()
+            self._log_dedup()
+        finally:
+            self.storage.close()
+            if self.manifest is not None:
+                self.manifest.close()
+
+
+class AsyncArtifactWriter(ArtifactWriter):
+    def __init__(
+            self,
+            storage,
+            image_codec: ImageCodec = None,
+            manifest: JsonlLog = None,
+            dedup_images: bool = False,
+            json_codec: ZstdJsonCodec = None,
+            num_workers: int = 4,
+            max_pending: int = 64,
+            executor_type: str = "thread"
+        ) -> None:
+        """在后台编码并写入文件, 仿真不需要等待图片编码和磁盘写入.
+        编码在 worker 中进行, 编码结果在回调中交给 storage (进程池时回调在主进程中执行).
+
+        Args:
+            storage: DirectoryStorage 或是 ShardStorage
+            image_codec (ImageCodec): 图片的编码方式. Defaults to PNG.
+            manifest (JsonlLog): 记录已经 commit 的 step. Defaults to None (不记录).
+            dedup_images (bool): 内容相同的图片只保存一次 (hash 在 worker 中计算). Defaults to False.
+            json_codec (ZstdJsonCodec): JSON 的压缩方式. Defaults to None (不压缩).
+            num_workers (int): worker 的数量. Defaults to 4.
+            max_pending (int): 最多等待写入的文件数量, 超过之后 submit 会阻塞 (backpressure). Defaults to 64.
+            executor_type (str): "thread" 或 "process". cv2 编码的时候会释放 GIL, 一般使用 thread 即可.
+        """
+        super().__init__(storage, image_codec, manifest, dedup_images, json_codec)
+        if executor_type == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="artifact_writer")
+        elif executor_type == "process":
+            self._executor = ProcessPoolExecutor(max_workers=num_workers)
+        else:
+            raise ValueError(f"Unknown executor type: {executor_type}, should be 'thread' or 'process'")
+
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._num_pending = 0 # 还没有写完的文件数量 (编码 + 写入)
+        self._errors = [] # 写入失败的信息, 在主线程中抛出
+        self._closed = False
+        self._step_pending = {} # step -> 还没有写完的文件数量
+        self._failed_steps = set() # 有文件写入失败的 step, 不会 commit
+        self._steps_to_commit = deque() # 等待 commit 的 (step, step_info), 按顺序 commit
+
+    def write_states(self, key: str, states: NDArray[np.float32]) -> None:
+        # states 是 wrapper 中的缓冲区, 会被后续的 step 修改, 这里需要复制一份
+        self.submit(key, encode_states, np.array(states, copy=True))
+
+    def submit(self, key: str, encode_func: Callable[..., bytes], *args, dedup: bool = False) -> None:
+        if self._closed:
+            raise RuntimeError("ArtifactWriter 已经关闭, 无法继续写入")
+        self._raise_errors() # 尽早把后台的错误报告给主线程
+
+        step_idx = step_of_key(key)
+        with self._cond:
+            if self._num_pending >= self.max_pending: # 队列满的时候在这里等待, 记录等待的时间
+                start_time = time.perf_counter()
+                while self._num_pending >= self.max_pending:
+                    self._cond.wait()
+                self.stats.record_time("backpressure_wait", (time.perf_counter() - start_time) * 1000)
+            self._num_pending += 1
+            if step_idx is not None:
+                self._step_pending[step_idx] = self._step_pending.get(step_idx, 0) + 1
+        try:
+            future = self._executor.submit(timed_encode, encode_func, *args)
+        except Exception:
+            self._finish(step_idx, error=RuntimeError(f"{key}: 无法提交"))
+            raise
+        future.add_done_callback(lambda _future: self._on_encoded(key, step_idx, dedup, _future))
+
+    def _on_encoded(self, key: str, step_idx: int, dedup: bool, future) -> None:
+        error = None
+        try:
+            data, encode_ms = future.result()
+            self._put(key, data, dedup, encode_ms)
+        except Exception as e:
+            error = RuntimeError(f"{key}: {e}")
+            error.__cause__ = e
+        self._finish(step_idx, error)
+
+    def _finish(self, step_idx: int, error) -> None:
+        with self._cond:
+            self._num_pending -= 1
+            if step_idx is not None:
+                self._step_pending[step_idx] -= 1
+            if error is not None:
+                self._errors.append(error)
+                if step_idx is not None:
+                    self._failed_steps.add(step_idx)
+            self._commit_ready_steps()
+            self._cond.notify_all()
+
+    def commit_step(self, step_idx: int, step_info: Dict[str, Any]) -> None:
+        """step 的文件可能还在后台写入, 全部写完之后 (并且之前的 step 已经 commit) 才会 commit
+        """
+        with self._cond:
+            self._steps_to_commit.append((step_idx, step_info))
+            self._commit_ready_steps()
+
+    def _commit_ready_steps(self) -> None:
+        """需要持有 self._cond
+        """
+        while self._steps_to_commit:
+            step_idx, step_info = self._steps_to_commit[0]
+            if self._step_pending.get(step_idx, 0) > 0:
+                break
+            if step_idx in self._failed_steps: # 不完整的 step (以及之后的 step) 留在临时位置, 保证 manifest 中的 step 是连续的
+                break
+            try:
+                self._commit(step_idx, step_info)
+            except Exception as e:
+                self._errors.append(RuntimeError(f"commit step {step_idx}: {e}"))
+                self._failed_steps.add(step_idx)
+                break
+            self._steps_to_commit.popleft()
+            self._step_pending.pop(step_idx, None)
+
+    def _raise_errors(self) -> None:
+        with self._cond:
+            errors, self._errors = self._errors, []
+        if errors:
+            for _error in errors[1:]:
+                logger.error(f"SIM: 后台写入失败, {_error}")
+            raise RuntimeError(f"后台写入失败 ({len(errors)} 个文件): {errors[0]}") from errors[0]
+
+    def flush(self) -> None:
+        with self._cond:
+            while self._num_pending > 0:
+                self._cond.wait()
+        self.storage.flush()
+        self._raise_errors()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.flush()
+            self._log_dedup()
+        finally:
+            self._executor.shutdown(wait=True)
+            self.storage.close()
+            if self.manifest is not None:
+                self.manifest.close()
+
+
+def make_artifact_writer(
+        base_path: str,
+        storage_format: str = "directory",
+        shard_size_mb: int = 1024,
+        image_codec: str = "png",
+        async_writer: bool = False,
+        num_workers: int = 4,
+        max_pending: int = 64,
+        executor_type: str = "thread",
+        dedup_images: bool = False,
+        json_codec: str = "json"
+    ) -> ArtifactWriter:
+    """根据配置创建 writer, 默认是同步写入, 每个文件单独保存
+    """
+    storage = make_storage(base_path, storage_format=storage_format, shard_size_mb=shard_size_mb)
+    codec = make_image_codec(image_codec)
+    json_codec = make_json_codec(json_codec, on_dictionary=storage.put)
+    manifest = JsonlLog(os.path.join(base_path, MANIFEST_FILE))
+    if async_writer:
+        logger.info(f"SIM: 使用后台写入, {executor_type} x {num_workers}, 队列长度 {max_pending}")
+        return AsyncArtifactWriter(
+            storage,
+            image_codec=codec,
+            manifest=manifest,
+            dedup_images=dedup_images,
+            json_codec=json_codec,
+            num_workers=num_workers,
+            max_pending=max_pending,
+            executor_type=executor_type
+        )
+    return ArtifactWriter(
+        storage, image_codec=codec, manifest=manifest, 
+        dedup_images=dedup_images, json_codec=json_codec
+    )
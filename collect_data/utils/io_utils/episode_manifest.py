@@ -0,0 +1,101 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 14:50:12
+LastEditors: WANG Maonan
+Description: 采集过程中持续追加的记录文件 (每行一个 JSON)
++ manifest.jsonl: 每一行是一个已经完整写入 (commit) 的 step, 也是读取时的 index:
+    {"step", "time_step", "action", "can_perform_action", "cameras", "files": {key: {"size", "crc32", ...}}}
++ actions.jsonl: 每一行是一次决策 (TSCEnvWrapper.step), 用于 resume 和 replay 时重放动作
+    第一行是 episode 的信息 {"seeds": {"sumo", "reset"}}, 之后每行是 {"decision", "action", "end_step"}
+LastEditTime: 2026-10-18 21:36:20
+'''
+import os
+import json
+import numpy as np
+from loguru import logger
+from typing import Any, Dict, List, Optional, Tuple
+
+MANIFEST_FILE = "manifest.jsonl"
+ACTION_LOG_FILE = "actions.jsonl"
+
+def _to_builtin(obj):
+    """记录中出现的 numpy 类型 (例如 action)
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def step_of_key(key: str) -> Optional[int]:
+    """key 属于哪个 step, 例如 "12/step_info.json" -> 12; 不属于某个 step 的文件返回 None
+    """
+    _step = key.split('/', 1)[0]
+    return int(_step) if _step.isdigit() else None
+
+
+class JsonlLog(object):
+    def __init__(self, file_path: str) -> None:
+        """只追加写入的 JSON Lines 文件, 每次写入后 flush, 程序中断时最多丢失最后一行
+        """
+        self.file_path = file_path
+        self._file = None
+
+    def append(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+            self._file = open(self.file_path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False, default=_to_builtin) + "\n")
+        self._file.flush()
+
+    def read(self) -> List[Dict[str, Any]]:
+        return read_jsonl(self.file_path)
+
+    def rewrite(self, records: List[Dict[str, Any]]) -> None:
+        """使用 records 替换文件内容 (先写临时文件再替换)
+        """
+        self.close()
+        os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for _record in records:
+                f.write(json.dumps(_record, ensure_ascii=False, default=_to_builtin) + "\n")
+        os.replace(tmp_path, self.file_path)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_manifest(base_path: str) -> Optional[Dict[int, Dict[str, Any]]]:
+    """读取 episode 的 manifest, 返回 {step: record}; 没有 manifest 的数据返回 None
+    """
+    manifest_path = os.path.join(base_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    return {_record['step']: _record for _record in read_jsonl(manifest_path)} # 同一个 step 以最后一次为准
+
+
+def read_action_log(file_path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """读取 actions.jsonl, 返回 (header, decisions); 没有 header 的旧文件返回空的 header
+    """
+    records = read_jsonl(file_path)
+    if records and 'decision' not in records[0]:
+        return records[0], records[1:]
+    return {}, records
+
+
+def read_jsonl(file_path: str) -> List[Dict[str, Any]]:
+    """读取 JSON Lines 文件, 跳过中断时没有写完的最后一行
+    """
+    records = []
+    if not os.path.exists(file_path):
+        return records
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for _line in f:
+            if not _line.strip():
+                continue
+            try:
+                records.append(json.loads(_line))
+            except json.JSONDecodeError:
+                logger.warning(f"SIM: 跳过不完整的记录, {file_path}")
+    return records
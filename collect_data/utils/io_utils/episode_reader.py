@@ -0,0 +1,241 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 11:40:05
+LastEditors: WANG Maonan
+Description: 读取一个 episode 的数据, 自动判断是目录结构还是 shard 结构
++ 有 manifest.jsonl 时直接使用 manifest 作为 index (打开时只读取一个文件, 每个 step 的查找是 O(1)),
+  之前采集的数据没有 manifest, 遍历文件夹 (或读取 shard 的 index)
++ JSON 文件可能使用 zstd 压缩 (.json.zst), read_json 自动判断并选择字典, 目录结构时流式读取文件 (load_json_file)
++ Example:
+    reader = EpisodeReader("exp_dataset/France_Massy_easy_high_density_none/")
+    for step in reader.steps():
+        meta = reader.step_meta(step) # time_step, action, can_perform_action, cameras
+        image = reader.read_image(step, "a1_aircraft_all") # RGB
+        annotation = reader.read_annotation(step, direction=0) # 已经与 topology.json 合并
+LastEditTime: 2026-10-18 23:44:30
+'''
+import io
+import os
+import zlib
+import threading
+import numpy as np
+from numpy.typing import NDArray
+from typing import Any, Dict, List
+
+from utils.io_utils.episode_storage import (
+    SHARD_DIR,
+    shard_file_name,
+    load_shard_index,
+    is_shard_episode,
+)
+from utils.io_utils.episode_manifest import load_manifest, step_of_key
+from utils.io_utils.json_codec import ZSTD_DICT_DIR, ZSTD_EXTENSION, load_json_bytes, load_json_file, load_dictionaries
+from parse_infos.parse_direction_infos import TOPOLOGY_FILE, merge_direction_info
+from utils.io_utils.state_store import EpisodeStates
+from utils.io_utils.image_codec import IMAGE_EXTENSIONS, codec_from_extension
+
+class EpisodeReader(object):
+    def __init__(self, base_path: str) -> None:
+        self.base_path = base_path
+        self.is_shard = is_shard_episode(base_path)
+
+        self._lock = threading.Lock()
+        self._shard_files = {} # 已经打开的 shard 文件
+        self.states = EpisodeStates(base_path) if EpisodeStates.exists(base_path) else None # memmap 保存的 state
+        self._topology = None # 第一次读取 annotation 的时候加载
+        self.manifest = load_manifest(base_path) # {step: record}, 之前的数据为 None
+        self._index = None # shard 的 index, 需要的时候再读取
+        self._step_keys = None # 没有 manifest 的 shard 数据, {step: [key, ...]}
+        self._dictionaries = None # zstd 字典 {dict_id: bytes}, 第一次读取压缩的 JSON 时加载
+
+    def _shard_index(self) -> Dict[str, Any]:
+        """{key: (shard, offset, size)}, 用于 manifest 中没有的文件 (例如 topology.json)
+        """
+        if self._index is None:
+            self._index = load_shard_index(self.base_path)
+        return self._index
+
+    def _file_info(self, key: str) -> Dict[str, Any]:
+        """manifest 中记录的文件信息, 没有记录时返回 None
+        """
+        step = step_of_key(key)
+        if self.manifest is None or step not in self.manifest:
+            return None
+        return self.manifest[step]['files'].get(key)
+
+    # ###########
+    # 基础的读取
+    # ###########
+    def steps(self) -> List[int]:
+        """所有保存的 step, 从小到大排序
+        """
+        if self.manifest is not None:
+            return sorted(self.manifest)
+        if self.is_shard:
+            if self._step_keys is None:
+                self._step_keys = {}
+                for _key in self._shard_index():
+                    _step = step_of_key(_key)
+                    if _step is not None:
+                        self._step_keys.setdefault(_step, []).append(_key)
+            return sorted(self._step_keys)
+        return sorted(
+            int(_dir) for _dir in os.listdir(self.base_path)
+            if _dir.isdigit() and os.path.isdir(os.path.join(self.base_path, _dir))
+        )
+
+    def step_meta(self, step: int) -> Dict[str, Any]:
+        """step 的信息 (time_step, action, can_perform_action, cameras, ...), 有 manifest 时不需要读取文件
+        """
+        if self.manifest is not None:
+            return {_k: _v for _k, _v in self.manifest[step].items() if _k != 'files'}
+        return {"step": step, **self.read_step_info(step), "cameras": self.cameras(step)}
+
+    def keys(self, step: int) -> List[str]:
+        """某个 step 的所有文件, 例如 ["12/step_info.json", "12/low_quality_rgb/a1_aircraft_all.png", ...]
+        """
+        if self.manifest is not None:
+            return sorted(self.manifest.get(step, {}).get('files', {}))
+        if self.is_shard:
+            self.steps() # 初始化 self._step_keys
+            return sorted(self._step_keys.get(step, []))
+        step_keys = []
+        step_path = os.path.join(self.base_path, str(step))
+        for _root, _, _files in os.walk(step_path):
+            _rel_root = os.path.relpath(_root, self.base_path).replace(os.sep, '/')
+            step_keys.extend(f"{_rel_root}/{_file}" for _file in _files)
+        return sorted(step_keys)
+
+    def has(self, key: str) -> bool:
+        if self.manifest is not None and step_of_key(key) is not None:
+            return self._file_info(key) is not None
+        if self.is_shard:
+            return key in self._shard_index()
+        return os.path.exists(os.path.join(self.base_path, key))
+
+    def read_bytes(self, key: str, verify: bool = False) -> bytes:
+        """读取文件, verify=True 时使用 manifest 中的 crc32 检查内容
+        """
+        file_info = self._file_info(key)
+        if not self.is_shard:
+            with open(os.path.join(self.base_path, key), 'rb') as f:
+                data = f.read()
+        else:
+            if file_info is not None:
+                shard_idx, offset, size = file_info['shard'], file_info['offset'], file_info['size']
+            elif key in self._shard_index():
+                shard_idx, offset, size = self._shard_index()[key]
+            else:
+                raise KeyError(f"{key} 不在 {self.base_path} 中")
+            data = self._read_shard(shard_idx, offset, size)
+
+        if verify and file_info is not None and zlib.crc32(data) != file_info['crc32']:
+            raise ValueError(f"{key} 的内容与 manifest 中的 crc32 不一致")
+        return data
+
+    def _read_shard(self, shard_idx: int, offset: int, size: int) -> bytes:
+        with self._lock:
+            if shard_idx not in self._shard_files:
+                self._shard_files[shard_idx] = open(
+                    os.path.join(self.base_path, SHARD_DIR, shard_file_name(shard_idx)), 'rb'
+                )
+            shard_file = self._shard_files[shard_idx]
+            shard_file.seek(offset)
+            return shard_file.read(size)
+
+    # ###########
+    # 按类型读取
+    # ###########
+    def cameras(self, step: int) -> List[str]:
+        """某个 step 保存的相机, 例如 ["a1_aircraft_all", "J1_0_junction_front_all", ...]
+        """
+        if self.manifest is not None and 'cameras' in self.manifest.get(step, {}):
+            return self.manifest[step]['cameras']
+        prefix = f"{step}/low_quality_rgb/"
+        return sorted(
+            os.path.splitext(_key[len(prefix):])[0]
+            for _key in self.keys(step) if _key.startswith(prefix)
+        )
+
+    def directions(self, step: int) -> List[int]:
+        """某个 step 保存了 annotation 的方向, 例如 [0, 1, 2, 3]
+        """
+        prefix = f"{step}/annotations/"
+        return sorted(
+            int(_key[len(prefix):].split('.')[0]) # 0.json 或 0.json.zst
+            for _key in self.keys(step) if _key.startswith(prefix) and '.json' in _key
+        )
+
+    def image_key(self, step: int, camera: str) -> str:
+        """图片对应的 key, 后缀与采集时的 image codec 有关
+        """
+        for _extension in IMAGE_EXTENSIONS:
+            _key = f"{step}/low_quality_rgb/{camera}{_extension}"
+            if self.has(_key):
+                return _key
+        raise KeyError(f"step {step} 中没有相机 {camera} 的图片")
+
+    def read_image(self, step: int, camera: str) -> NDArray[np.uint8]:
+        """读取图片, 返回 RGB 格式
+        """
+        key = self.image_key(step, camera)
+        return codec_from_extension(os.path.splitext(key)[1]).decode(self.read_bytes(key))
+
+    def read_json(self, key: str) -> Dict[str, Any]:
+        """key 是不压缩时的名称 (例如 "12/step_info.json"), 压缩的文件会自动查找 .zst
+        """
+        if not self.has(key) and self.has(f"{key}{ZSTD_EXTENSION}"):
+            key = f"{key}{ZSTD_EXTENSION}"
+        dictionaries = self._zstd_dictionaries() if key.endswith(ZSTD_EXTENSION) else None
+        if not self.is_shard: # 文件直接流式解压, 不需要先读取整个文件
+            return load_json_file(os.path.join(self.base_path, key), dictionaries)
+        return load_json_bytes(self.read_bytes(key), dictionaries)
+
+    def _zstd_dictionaries(self) -> Dict[int, bytes]:
+        if self._dictionaries is None:
+            if self.is_shard:
+                self._dictionaries = {
+                    int(os.path.splitext(os.path.basename(_key))[0]): self.read_bytes(_key)
+                    for _key in self._shard_index() if _key.startswith(f"{ZSTD_DICT_DIR}/")
+                }
+            else:
+                self._dictionaries = load_dictionaries(self.base_path)
+        return self._dictionaries
+
+    def read_topology(self) -> Dict[str, Any]:
+        """路口不变的信息, 之前采集的数据没有 topology.json, 返回 None
+        """
+        if self._topology is None and (self.has(TOPOLOGY_FILE) or self.has(f"{TOPOLOGY_FILE}{ZSTD_EXTENSION}")):
+            self._topology = self.read_json(TOPOLOGY_FILE)
+        return self._topology
+
+    def read_annotation(self, step: int, direction: int) -> Dict[str, Any]:
+        """完整的方向信息 (与 topology 合并), 可以直接用于 TrafficLightVQA
+        """
+        annotation = self.read_json(f"{step}/annotations/{direction}.json")
+        return merge_direction_info(self.read_topology(), direction, annotation)
+
+    def read_step_info(self, step: int) -> Dict[str, Any]:
+        return self.read_json(f"{step}/step_info.json")
+
+    def read_vehicles(self, step: int) -> Dict[str, Any]:
+        return self.read_json(f"{step}/3d_vehs.json")
+
+    def read_states(self, step: int) -> NDArray[np.float32]:
+        """与 state_vector.npy 相同的 (max_states_length, movement_num, 7)
+        """
+        if self.states is not None:
+            return self.states.window(step, ring_order=True)
+        return np.load(io.BytesIO(self.read_bytes(f"{step}/state_vector.npy")))
+
+    def close(self) -> None:
+        with self._lock:
+            for _file in self._shard_files.values():
+                _file.close()
+            self._shard_files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
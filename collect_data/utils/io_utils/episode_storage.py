@@ -0,0 +1,270 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 11:02:37
+LastEditors: WANG Maonan
+Description: 一个 episode 的存储方式, 每个文件使用相对路径作为 key, 例如 "12/low_quality_rgb/a1_aircraft_all.png"
++ DirectoryStorage: 每个 key 对应一个文件 (原来的目录结构)
++ ShardStorage: 追加写入少量的大文件 (shard), 使用 index 记录每个 key 的位置, 减少 inode 的数量
++ 属于某个 step 的文件在 commit(step) 之后才可见, 程序中断时不会留下只写了一半的 step
++ put_blob: 内容相同的文件只保存一次 (目录: blobs/ + 硬链接; shard: 复用之前的 offset)
++ put 和 put_blob 返回文件的位置 (shard 中是 shard 和 offset), 写入 manifest.jsonl
++ clear: 新的 episode (不是 resume) 开始时删除之前的数据 (目录: step 文件夹和 blobs; shard: shard 文件和 index)
+LastEditTime: 2026-10-18 22:10:25
+'''
+import os
+import json
+import shutil
+import threading
+from loguru import logger
+from typing import Any, Dict, Tuple
+
+from utils.io_utils.episode_manifest import step_of_key
+
+SHARD_DIR = "shards" # shard 文件所在的文件夹
+SHARD_INDEX = "index.jsonl" # 每一行是一个 key 的位置
+TMP_DIR = ".tmp" # 还没有 commit 的 step
+BLOB_DIR = "blobs" # 去重之后的文件, 按内容的 hash 命名
+
+def shard_file_name(shard_idx: int) -> str:
+    return f"shard_{shard_idx:05d}.bin"
+
+
+class DirectoryStorage(object):
+    def __init__(self, base_path: str) -> None:
+        """每个 key 保存为 base_path 下的一个文件.
+        step 的文件先写入 base_path/.tmp/<step>, commit 时整个文件夹 rename 为 base_path/<step>
+        """
+        self.base_path = base_path
+        self.tmp_path = os.path.join(base_path, TMP_DIR)
+        self._created_dirs = set() # 已经创建的文件夹, 避免重复调用 makedirs
+        self._lock = threading.Lock()
+
+    def _file_path(self, key: str) -> str:
+        if step_of_key(key) is None:
+            return os.path.join(self.base_path, key)
+        return os.path.join(self.tmp_path, key)
+
+    def put(self, key: str, data: bytes) -> Dict[str, Any]:
+        file_path = self._file_path(key)
+        self._ensure_dir(os.path.dirname(file_path))
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        return {} # 文件的位置就是 key
+
+    def put_blob(self, key: str, data: bytes, digest: str) -> Tuple[Dict[str, Any], bool]:
+        """内容保存为 blobs/<digest>, key 是指向它的硬链接 (读取时与普通文件相同).
+        文件系统不支持硬链接时复制一份. 返回 (文件的位置, 是否是新的内容).
+        """
+        blob_path = os.path.join(self.base_path, BLOB_DIR, digest[:2], f"{digest}{os.path.splitext(key)[1]}")
+        is_new = not os.path.exists(blob_path)
+        if is_new:
+            self._ensure_dir(os.path.dirname(blob_path))
+            tmp_blob_path = f"{blob_path}.{threading.get_ident()}.tmp" # 多个线程可能同时写入相同的内容
+            with open(tmp_blob_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_blob_path, blob_path)
+
+        file_path = self._file_path(key)
+        self._ensure_dir(os.path.dirname(file_path))
+        if os.path.lexists(file_path): # 不能直接覆盖, 可能是其他 blob 的硬链接
+            os.remove(file_path)
+        try:
+            os.link(blob_path, file_path)
+        except OSError:
+            shutil.copyfile(blob_path, file_path)
+        return {}, is_new
+
+    def commit(self, step_idx: int) -> None:
+        """step 的文件全部写完之后调用, rename 是原子操作
+        """
+        tmp_step_path = os.path.join(self.tmp_path, str(step_idx))
+        if not os.path.exists(tmp_step_path):
+            return
+        self.remove_step(step_idx) # resume 时会重新生成之前的 step
+        os.replace(tmp_step_path, os.path.join(self.base_path, str(step_idx)))
+        with self._lock:
+            self._created_dirs = {
+                _dir for _dir in self._created_dirs 
+                if os.path.commonpath([_dir, tmp_step_path]) != tmp_step_path
+            }
+
+    def remove_step(self, step_idx: int) -> None:
+        shutil.rmtree(os.path.join(self.base_path, str(step_idx)), ignore_errors=True)
+
+    def discard_uncommitted(self) -> None:
+        """删除上一次中断时没有 commit 的 step
+        """
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        with self._lock:
+            self._created_dirs.clear()
+
+    def clear(self) -> None:
+        """删除之前 episode 的 step 和去重的文件, 不属于 step 的文件 (例如 manifest) 由调用者处理
+        """
+        self.discard_uncommitted()
+        for _dir in os.listdir(self.base_path) if os.path.isdir(self.base_path) else []:
+            if _dir.isdigit() or _dir == BLOB_DIR:
+                shutil.rmtree(os.path.join(self.base_path, _dir), ignore_errors=True)
+
+    def _ensure_dir(self, directory: str) -> None:
+        with self._lock:
+            if directory in self._created_dirs:
+                return
+            os.makedirs(directory, exist_ok=True)
+            self._created_dirs.add(directory)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ShardStorage(object):
+    def __init__(self, base_path: str, shard_size_mb: int = 1024) -> None:
+        """将所有文件追加写入 base_path/shards/shard_xxxxx.bin, 超过 shard_size_mb 之后写入新的 shard.
+        index.jsonl 每一行记录 {"key", "shard", "offset", "size"}, step 的记录在 commit(step) 时才写入 index,
+        所以程序中断时没有 commit 的 step 不可见 (数据留在 shard 中, 但是没有 index 指向它).
+        """
+        self.shard_dir = os.path.join(base_path, SHARD_DIR)
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.shard_size = shard_size_mb * 1024 * 1024
+
+        self._lock = threading.Lock()
+        self._open_index()
+        self._shard_idx = len([
+            _file for _file in os.listdir(self.shard_dir) if _file.endswith('.bin')
+        ]) # 已有的 shard 不修改, 从新的 shard 开始写
+        self._shard_file = None
+        self._open_shard(self._shard_idx)
+        self._uncommitted = {} # step -> 还没有写入 index 的记录
+        self._blobs = {} # digest -> (shard, offset, size), 本次写入的内容 (之前的 shard 不参与去重)
+
+    def _open_index(self) -> None:
+        index_path = os.path.join(self.shard_dir, SHARD_INDEX)
+        self._index_file = open(index_path, 'a', encoding='utf-8')
+        if self._index_file.tell() > 0: # 上一次中断时最后一行可能没有写完, 新的记录从新的一行开始
+            with open(index_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._index_file.write("\n")
+
+    def _open_shard(self, shard_idx: int) -> None:
+        if self._shard_file is not None:
+            self._shard_file.close()
+        self._shard_idx = shard_idx
+        self._shard_file = open(os.path.join(self.shard_dir, shard_file_name(shard_idx)), 'ab')
+        logger.info(f"SIM: 写入 shard {shard_file_name(shard_idx)}")
+
+    def put(self, key: str, data: bytes) -> Dict[str, Any]:
+        with self._lock:
+            shard_idx, offset = self._append(data)
+            self._add_index(key, shard_idx, offset, len(data))
+        return {"shard": shard_idx, "offset": offset}
+
+    def put_blob(self, key: str, data: bytes, digest: str) -> Tuple[Dict[str, Any], bool]:
+        """内容相同时不再写入 shard, index 指向之前的位置. 返回 (文件的位置, 是否是新的内容).
+        """
+        with self._lock:
+            location = self._blobs.get(digest)
+            is_new = location is None
+            if is_new:
+                location = (*self._append(data), len(data))
+                self._blobs[digest] = location
+            self._add_index(key, *location, digest=digest)
+        return {"shard": location[0], "offset": location[1]}, is_new
+
+    def _append(self, data: bytes) -> Tuple[int, int]:
+        """需要持有 self._lock, 返回 (shard, offset)
+        """
+        offset = self._shard_file.tell()
+        if offset > 0 and offset + len(data) > self.shard_size:
+            self._open_shard(self._shard_idx + 1)
+            offset = 0
+        self._shard_file.write(data)
+        return self._shard_idx, offset
+
+    def _add_index(self, key: str, shard_idx: int, offset: int, size: int, digest: str = None) -> None:
+        """需要持有 self._lock
+        """
+        record = {"key": key, "shard": shard_idx, "offset": offset, "size": size}
+        if digest is not None:
+            record["digest"] = digest
+        record = json.dumps(record) + "\n"
+        step_idx = step_of_key(key)
+        if step_idx is None:
+            self._index_file.write(record)
+        else:
+            self._uncommitted.setdefault(step_idx, []).append(record)
+
+    def commit(self, step_idx: int) -> None:
+        """先 flush 数据, 再写入 index, index 中的记录一定可以读取
+        """
+        with self._lock:
+            records = self._uncommitted.pop(step_idx, [])
+            self._shard_file.flush()
+            self._index_file.write("".join(records))
+            self._index_file.flush()
+
+    def remove_step(self, step_idx: int) -> None:
+        pass # index 以最后一次写入为准, 重新生成的 step 会覆盖之前的记录
+
+    def discard_uncommitted(self) -> None:
+        with self._lock:
+            self._uncommitted.clear()
+
+    def clear(self) -> None:
+        """删除所有 shard 和 index, 从 shard_00000 重新开始写
+        """
+        with self._lock:
+            self._shard_file.close()
+            self._index_file.close()
+            for _file in os.listdir(self.shard_dir):
+                if _file.endswith('.bin') or _file == SHARD_INDEX:
+                    os.remove(os.path.join(self.shard_dir, _file))
+            self._uncommitted.clear()
+            self._blobs.clear()
+            self._open_index()
+            self._shard_file = None
+            self._open_shard(0)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._shard_file.flush()
+            self._index_file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._shard_file.close()
+            self._index_file.close()
+
+
+def load_shard_index(base_path: str) -> Dict[str, Tuple[int, int, int]]:
+    """读取 index, 返回 {key: (shard, offset, size)}, 同一个 key 以最后一次写入为准
+    """
+    index = {}
+    index_path = os.path.join(base_path, SHARD_DIR, SHARD_INDEX)
+    with open(index_path, 'r', encoding='utf-8') as f:
+        for _line in f:
+            if not _line.strip():
+                continue
+            try:
+                _record = json.loads(_line)
+            except json.JSONDecodeError: # 最后一行没有写完
+                logger.warning(f"SIM: 跳过不完整的 index 记录, {index_path}")
+                continue
+            index[_record['key']] = (_record['shard'], _record['offset'], _record['size'])
+    return index
+
+
+def is_shard_episode(base_path: str) -> bool:
+    return os.path.exists(os.path.join(base_path, SHARD_DIR, SHARD_INDEX))
+
+
+def make_storage(base_path: str, storage_format: str = "directory", shard_size_mb: int = 1024):
+    if storage_format == "directory":
+        return DirectoryStorage(base_path)
+    elif storage_format == "shard":
+        return ShardStorage(base_path, shard_size_mb=shard_size_mb)
+    else:
+        raise ValueError(f"Unknown storage format: {storage_format}, should be 'directory' or 'shard'")
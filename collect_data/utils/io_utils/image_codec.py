@@ -0,0 +1,122 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 13:05:12
+LastEditors: WANG Maonan
+Description: 相机图片的编码方式, 使用字符串配置:
++ png / png:<0-9>: PNG, 数字是压缩等级 (越大文件越小, 编码越慢)
++ webp: 无损 WebP; webp:<1-100>: 有损 WebP, 数字是质量
++ jpeg:<1-100>: JPEG, 数字是质量
++ raw: 不压缩, 保存为 .npy
+LastEditTime: 2026-10-18 13:05:16
+'''
+import io
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+class ImageCodec(object):
+    extension = None # 文件后缀
+
+    def encode(self, image: NDArray[np.uint8]) -> bytes:
+        """image 是 RGB 格式
+        """
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> NDArray[np.uint8]:
+        """返回 RGB 格式
+        """
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"图片解码失败 ({self.extension})")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def _imencode(self, image: NDArray[np.uint8], params) -> bytes:
+        success, buffer = cv2.imencode(self.extension, image[:, :, ::-1], params) # RGB -> BGR
+        if not success:
+            raise IOError(f"图片编码失败 ({self.extension})")
+        return buffer.tobytes()
+
+
+class PNGCodec(ImageCodec):
+    extension = ".png"
+
+    def __init__(self, level: int = None) -> None:
+        self.level = level # None 表示使用 OpenCV 的默认等级
+
+    def encode(self, image: NDArray[np.uint8]) -> bytes:
+        params = [] if self.level is None else [cv2.IMWRITE_PNG_COMPRESSION, self.level]
+        return self._imencode(image, params)
+
+    def __repr__(self) -> str:
+        return "png" if self.level is None else f"png:{self.level}"
+
+
+class WebPCodec(ImageCodec):
+    extension = ".webp"
+
+    def __init__(self, quality: int = None) -> None:
+        self.quality = quality # None 表示无损
+
+    def encode(self, image: NDArray[np.uint8]) -> bytes:
+        quality = 101 if self.quality is None else self.quality # OpenCV 中质量大于 100 是无损
+        return self._imencode(image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+
+    def __repr__(self) -> str:
+        return "webp" if self.quality is None else f"webp:{self.quality}"
+
+
+class JPEGCodec(ImageCodec):
+    extension = ".jpg"
+
+    def __init__(self, quality: int = 95) -> None:
+        self.quality = quality
+
+    def encode(self, image: NDArray[np.uint8]) -> bytes:
+        return self._imencode(image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+
+    def __repr__(self) -> str:
+        return f"jpeg:{self.quality}"
+
+
+class RawCodec(ImageCodec):
+    extension = ".npy"
+
+    def encode(self, image: NDArray[np.uint8]) -> bytes:
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(image))
+        return buffer.getvalue()
+
+    def decode(self, data: bytes) -> NDArray[np.uint8]:
+        return np.load(io.BytesIO(data))
+
+    def __repr__(self) -> str:
+        return "raw"
+
+
+IMAGE_EXTENSIONS = [".png", ".webp", ".jpg", ".npy"] # 读取时依次查找
+
+def make_image_codec(codec: str = "png") -> ImageCodec:
+    """根据字符串创建 codec, 例如 "png:1", "webp", "jpeg:90", "raw"
+    """
+    name, _, value = codec.lower().partition(':')
+    value = int(value) if value else None
+    if name == "png":
+        return PNGCodec(level=value)
+    elif name == "webp":
+        return WebPCodec(quality=value)
+    elif name in ["jpeg", "jpg"]:
+        return JPEGCodec(quality=95 if value is None else value)
+    elif name == "raw":
+        return RawCodec()
+    else:
+        raise ValueError(f"Unknown image codec: {codec}, should be png, webp, jpeg or raw")
+
+def codec_from_extension(extension: str) -> ImageCodec:
+    """读取的时候根据后缀选择解码方式
+    """
+    return {
+        ".png": PNGCodec(),
+        ".webp": WebPCodec(),
+        ".jpg": JPEGCodec(),
+        ".npy": RawCodec(),
+    }[extension]
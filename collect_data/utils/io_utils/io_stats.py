@@ -0,0 +1,115 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 18:48:26
+LastEditors: WANG Maonan
+Description: 统计采集时每类文件的数量, 大小, 编码和写入的耗时 (直方图)
++ 文件类型由 key 决定, 例如 images (low_quality_rgb), annotations, step_info, 3d_vehs, state_vector
++ 也可以记录其他耗时, 例如每个 step 的仿真时间 (env_step) 和保存时间 (write_step)
++ close 时保存为 io_stats.json, 并输出一行总结
+LastEditTime: 2026-10-18 18:48:29
+'''
+import json
+import bisect
+import threading
+from typing import Any, Dict
+
+IO_STATS_FILE = "io_stats.json"
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000] # 直方图的上边界
+
+def artifact_type(key: str) -> str:
+    """例如 "12/low_quality_rgb/a1_aircraft_all.png" -> images, "12/3d_vehs.json.zst" -> 3d_vehs
+    """
+    parts = key.split('/')
+    if parts[0].isdigit():
+        parts = parts[1:]
+    if len(parts) > 1:
+        return "images" if parts[0] == "low_quality_rgb" else parts[0]
+    return parts[0].split('.')[0]
+
+
+class LatencyHistogram(object):
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1) # 最后一个是超过 1000ms
+        self.num = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, latency_ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.num += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets = {f"<={_bound}": _count for _bound, _count in zip(LATENCY_BUCKETS_MS, self.counts)}
+        buckets[f">{LATENCY_BUCKETS_MS[-1]}"] = self.counts[-1]
+        return {
+            "count": self.num,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.num, 3) if self.num else 0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets": buckets,
+        }
+
+
+class IOStats(object):
+    def __init__(self) -> None:
+        """线程安全, 后台写入的 worker 也会记录
+        """
+        self._lock = threading.Lock()
+        self.artifacts = {} # type -> {"count", "bytes", "encode", "write"}
+        self.timers = {} # name -> LatencyHistogram
+
+    def record_artifact(self, key: str, num_bytes: int, encode_ms: float, write_ms: float) -> None:
+        _type = artifact_type(key)
+        with self._lock:
+            if _type not in self.artifacts:
+                self.artifacts[_type] = {
+                    "count": 0, "bytes": 0,
+                    "encode": LatencyHistogram(), "write": LatencyHistogram()
+                }
+            _stats = self.artifacts[_type]
+            _stats["count"] += 1
+            _stats["bytes"] += num_bytes
+            _stats["encode"].add(encode_ms)
+            _stats["write"].add(write_ms)
+
+    def record_time(self, name: str, latency_ms: float) -> None:
+        with self._lock:
+            if name not in self.timers:
+                self.timers[name] = LatencyHistogram()
+            self.timers[name].add(latency_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "artifacts": {
+                    _type: {
+                        "count": _stats["count"],
+                        "bytes": _stats["bytes"],
+                        "encode_ms": _stats["encode"].to_dict(),
+                        "write_ms": _stats["write"].to_dict(),
+                    } for _type, _stats in sorted(self.artifacts.items())
+                },
+                "timers_ms": {_name: _hist.to_dict() for _name, _hist in sorted(self.timers.items())},
+            }
+
+    def summary(self) -> str:
+        """一行总结, 例如: 4800 files 312.4 MB (images 290.1 MB, ...), encode 45.2 s, write 12.1 s, env_step 300.2 s, write_step 80.1 s
+        """
+        with self._lock:
+            num_files = sum(_stats["count"] for _stats in self.artifacts.values())
+            num_bytes = sum(_stats["bytes"] for _stats in self.artifacts.values())
+            by_type = ", ".join(
+                f"{_type} {_stats['bytes']/1024/1024:.1f} MB"
+                for _type, _stats in sorted(self.artifacts.items(), key=lambda _item: -_item[1]["bytes"])
+            )
+            encode_s = sum(_stats["encode"].total_ms for _stats in self.artifacts.values()) / 1000
+            write_s = sum(_stats["write"].total_ms for _stats in self.artifacts.values()) / 1000
+            timers = ", ".join(f"{_name} {_hist.total_ms/1000:.1f} s" for _name, _hist in sorted(self.timers.items()))
+        summary = f"{num_files} files {num_bytes/1024/1024:.1f} MB ({by_type}), encode {encode_s:.1f} s, write {write_s:.1f} s"
+        return f"{summary}, {timers}" if timers else summary
+
+    def dump(self, file_path: str) -> None:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=4)
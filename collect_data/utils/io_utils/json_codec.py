@@ -0,0 +1,187 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 18:05:33
+LastEditors: WANG Maonan
+Description: JSON 文件的编码方式, 使用字符串配置:
++ json: 不压缩 (默认)
++ zstd / zstd:<1-22>: 使用 zstandard 压缩, 文件后缀为 .json.zst, 数字是压缩等级.
+  每个 episode 使用前 train_samples 个 JSON 训练字典 (小文件压缩效果更好), 字典保存在 zstd_dict/<dict_id>.dict
++ 读取时根据 magic bytes 判断是否压缩, 使用 frame 中的 dict_id 选择字典 (load_json_bytes / load_json_file)
++ zstandard 是可选依赖, 只有使用 zstd 时才需要安装 (pip install zstandard)
+LastEditTime: 2026-10-18 18:05:36
+'''
+import io
+import os
+import json
+import threading
+import numpy as np
+from loguru import logger
+from typing import Any, Callable, Dict, Tuple
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd" # zstd frame 的开头
+ZSTD_EXTENSION = ".zst"
+ZSTD_DICT_DIR = "zstd_dict" # 字典所在的文件夹 (相对 episode)
+
+def _import_zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("压缩 JSON 需要安装 zstandard: pip install zstandard") from e
+    return zstandard
+
+def zstd_dict_key(dict_id: int) -> str:
+    return f"{ZSTD_DICT_DIR}/{dict_id}.dict"
+
+# ##########
+# 编码 (需要是 top-level 函数, 进程池需要 pickle)
+# ##########
+def _json_default(obj):
+    """JSON 中出现的 numpy 类型
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def encode_json(data: Dict[str, Any]) -> bytes:
+    return json.dumps(data, indent=4, ensure_ascii=False, default=_json_default).encode('utf-8')
+
+_local = threading.local() # 每个线程缓存自己的 compressor (ZstdCompressor 不是线程安全的)
+
+def _get_compressor(level: int, dict_id: int, dict_data: bytes):
+    zstandard = _import_zstd()
+    compressors = getattr(_local, 'compressors', None)
+    if compressors is None:
+        compressors = _local.compressors = {}
+    if (level, dict_id) not in compressors:
+        compression_dict = zstandard.ZstdCompressionDict(dict_data) if dict_data else None
+        compressors[(level, dict_id)] = zstandard.ZstdCompressor(level=level, dict_data=compression_dict)
+    return compressors[(level, dict_id)]
+
+def compress_bytes(raw: bytes, level: int = 3, dict_id: int = 0, dict_data: bytes = None) -> bytes:
+    return _get_compressor(level, dict_id, dict_data).compress(raw)
+
+def compress_json(data: Dict[str, Any], level: int = 3, dict_id: int = 0, dict_data: bytes = None) -> bytes:
+    return compress_bytes(encode_json(data), level, dict_id, dict_data)
+
+
+class ZstdJsonCodec(object):
+    extension = ZSTD_EXTENSION
+
+    def __init__(
+            self,
+            level: int = 3,
+            dict_size: int = 64*1024,
+            train_samples: int = 300,
+            on_dictionary: Callable[[str, bytes], None] = None
+        ) -> None:
+        """
+        Args:
+            level (int): 压缩等级. Defaults to 3.
+            dict_size (int): 字典的大小 (bytes). Defaults to 64KB.
+            train_samples (int): 使用多少个 JSON 训练字典, 训练之前的 JSON 不使用字典压缩. 0 表示不使用字典.
+            on_dictionary (Callable): 字典训练完成之后调用 on_dictionary(key, dict_bytes), 用于保存字典
+        """
+        _import_zstd() # 尽早检查依赖
+        self.level = level
+        self.dict_size = dict_size
+        self.train_samples = train_samples
+        self.on_dictionary = on_dictionary
+        self.dict_id = 0
+        self.dict_data = None
+        self._samples = []
+
+    def encode_args(self, data: Dict[str, Any]) -> Tuple[Callable[..., bytes], tuple]:
+        """返回 (encode_func, args), encode_func 可以在后台 worker 中执行.
+        字典训练需要在调用线程中收集样本 (只有前 train_samples 个 JSON).
+        """
+        if self.dict_data is None and len(self._samples) < self.train_samples:
+            raw = encode_json(data)
+            self._add_sample(raw)
+            return compress_bytes, (raw, self.level, 0, None)
+        return compress_json, (data, self.level, self.dict_id, self.dict_data)
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        encode_func, args = self.encode_args(data)
+        return encode_func(*args)
+
+    def _add_sample(self, raw: bytes) -> None:
+        self._samples.append(raw)
+        if len(self._samples) < self.train_samples:
+            return
+        zstandard = _import_zstd()
+        try:
+            dictionary = zstandard.train_dictionary(self.dict_size, self._samples)
+        except zstandard.ZstdError as e: # 样本太少或太小, 之后不使用字典
+            logger.warning(f"SIM: zstd 字典训练失败, 不使用字典压缩, {e}")
+            return
+        finally:
+            self._samples = [] # 不再需要样本
+        self.dict_id = dictionary.dict_id()
+        self.dict_data = dictionary.as_bytes()
+        logger.info(f"SIM: zstd 字典训练完成, dict_id {self.dict_id}, {len(self.dict_data)/1024:.1f} KB")
+        if self.on_dictionary is not None:
+            self.on_dictionary(zstd_dict_key(self.dict_id), self.dict_data)
+
+    def __repr__(self) -> str:
+        return f"zstd:{self.level}"
+
+
+def make_json_codec(codec: str = "json", on_dictionary: Callable[[str, bytes], None] = None) -> ZstdJsonCodec:
+    """根据字符串创建 codec, 例如 "json", "zstd", "zstd:9"; json 返回 None (不压缩)
+    """
+    name, _, value = codec.lower().partition(':')
+    if name == "json":
+        return None
+    elif name == "zstd":
+        return ZstdJsonCodec(level=int(value) if value else 3, on_dictionary=on_dictionary)
+    else:
+        raise ValueError(f"Unknown json codec: {codec}, should be json or zstd")
+
+# ##########
+# 读取 (自动判断是否压缩)
+# ##########
+def is_zstd(data: bytes) -> bool:
+    return data[:4] == ZSTD_MAGIC
+
+def _decompressor(data: bytes, dictionaries: Dict[int, bytes]):
+    zstandard = _import_zstd()
+    dict_id = zstandard.get_frame_parameters(data).dict_id
+    if dict_id == 0:
+        return zstandard.ZstdDecompressor()
+    if dictionaries is None or dict_id not in dictionaries:
+        raise KeyError(f"缺少 zstd 字典 {dict_id} ({zstd_dict_key(dict_id)})")
+    return zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(dictionaries[dict_id]))
+
+def load_json_bytes(data: bytes, dictionaries: Dict[int, bytes] = None) -> Dict[str, Any]:
+    """JSON 或是 zstd 压缩的 JSON
+    """
+    if is_zstd(data):
+        data = _decompressor(data, dictionaries).decompress(data)
+    return json.loads(data)
+
+def load_json_file(file_path: str, dictionaries: Dict[int, bytes] = None) -> Dict[str, Any]:
+    """读取文件, 压缩的文件使用流式解压 (不需要先读取整个文件)
+    """
+    with open(file_path, 'rb') as f:
+        header = f.read(18) # frame header 最长 18 bytes, 用于获得 dict_id
+        f.seek(0)
+        if not is_zstd(header):
+            return json.load(f)
+        with _decompressor(header, dictionaries).stream_reader(f) as reader:
+            return json.load(io.TextIOWrapper(reader, encoding='utf-8'))
+
+def load_dictionaries(base_path: str) -> Dict[int, bytes]:
+    """读取目录结构的 episode 中保存的字典, {dict_id: dict_bytes}
+    """
+    dictionaries = {}
+    dict_dir = os.path.join(base_path, ZSTD_DICT_DIR)
+    if not os.path.isdir(dict_dir):
+        return dictionaries
+    for _file in os.listdir(dict_dir):
+        _dict_id, _extension = os.path.splitext(_file)
+        if _extension == ".dict" and _dict_id.isdigit():
+            with open(os.path.join(dict_dir, _file), 'rb') as f:
+                dictionaries[int(_dict_id)] = f.read()
+    return dictionaries
@@ -0,0 +1,139 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 12:10:31
+LastEditors: WANG Maonan
+Description: 每个 episode 只保存一份 state, 不再每个 step 保存 (max_states_length, movement_num, 7) 的窗口
++ states/dynamic.npy: (max_states_length-1 + num_steps, movement_num, 3), occupancy, queue_length, is_now_phase
+    - 前面 max_states_length-1 行是 0, 对应 episode 开始之前的空白时刻
++ states/static.npy: (movement_num, 4), 直行/左转/右转 flags 和车道数量, 整个 episode 不变
++ 读取时使用 memmap, 可以直接得到任意 step 的窗口
+LastEditTime: 2026-10-18 12:10:35
+'''
+import os
+import json
+import numpy as np
+from numpy.typing import NDArray
+from numpy.lib.format import open_memmap
+from numpy.lib.stride_tricks import sliding_window_view
+
+STATE_DIR = "states"
+DYNAMIC_FEATURES = 3 # occupancy, queue_length, is_now_phase
+STATIC_FEATURES = 4 # s, l, r, lane_numbers
+
+class EpisodeStateWriter(object):
+    def __init__(
+            self,
+            base_path: str,
+            movement_num: int,
+            max_states_length: int = 7,
+            capacity: int = 3600
+        ) -> None:
+        """写入每个 step 的 state
+
+        Args:
+            base_path (str): episode 的文件夹
+            movement_num (int): movement 的数量
+            max_states_length (int): 窗口的长度, 与 TSCEnvWrapper 一致. Defaults to 7.
+            capacity (int): 预先分配的 step 数量, 超过之后会扩容. Defaults to 3600.
+        """
+        self.state_dir = os.path.join(base_path, STATE_DIR)
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.movement_num = movement_num
+        self.max_states_length = max_states_length
+        self.pad = max_states_length - 1 # 窗口开始之前的空白
+
+        self.num_steps = 0
+        self.static = None
+        self.dynamic = self._open_dynamic(capacity)
+
+    def _open_dynamic(self, capacity: int):
+        return open_memmap(
+            os.path.join(self.state_dir, "dynamic.npy"), mode='w+', dtype=np.float32,
+            shape=(self.pad + capacity, self.movement_num, DYNAMIC_FEATURES)
+        ) # open_memmap 新建的文件全部是 0
+
+    def _grow(self, capacity: int) -> None:
+        """扩容, 将已有的数据复制到新的文件中
+        """
+        old_dynamic = np.array(self.dynamic[:self.pad + self.num_steps])
+        del self.dynamic
+        self.dynamic = self._open_dynamic(capacity)
+        self.dynamic[:len(old_dynamic)] = old_dynamic
+
+    def append(self, step_idx: int, process_obs: NDArray[np.float32]) -> None:
+        """保存 step_idx 时刻的特征, process_obs 的大小为 (movement_num, 7)
+        """
+        process_obs = np.asarray(process_obs, dtype=np.float32)
+        if self.static is None:
+            self.static = process_obs[:, DYNAMIC_FEATURES:]
+            np.save(os.path.join(self.state_dir, "static.npy"), self.static)
+
+        row = self.pad + step_idx
+        if row >= len(self.dynamic):
+            self._grow(capacity=2 * (step_idx + 1))
+        self.dynamic[row] = process_obs[:, :DYNAMIC_FEATURES]
+        self.num_steps = max(self.num_steps, step_idx + 1)
+
+    def close(self) -> None:
+        """去掉没有使用的行, 并保存 meta 信息
+        """
+        dynamic = np.array(self.dynamic[:self.pad + self.num_steps])
+        del self.dynamic
+        np.save(os.path.join(self.state_dir, "dynamic.npy"), dynamic)
+        with open(os.path.join(self.state_dir, "meta.json"), 'w') as f:
+            json.dump({
+                "num_steps": self.num_steps,
+                "movement_num": self.movement_num,
+                "max_states_length": self.max_states_length,
+            }, f, indent=4)
+
+
+class EpisodeStates(object):
+    def __init__(self, base_path: str) -> None:
+        """读取 EpisodeStateWriter 保存的 state
+        """
+        state_dir = os.path.join(base_path, STATE_DIR)
+        with open(os.path.join(state_dir, "meta.json"), 'r') as f:
+            meta = json.load(f)
+        self.num_steps = meta['num_steps']
+        self.max_states_length = meta['max_states_length']
+        self.dynamic = np.load(os.path.join(state_dir, "dynamic.npy"), mmap_mode='r')
+        self.static = np.load(os.path.join(state_dir, "static.npy"))
+
+    @staticmethod
+    def exists(base_path: str) -> bool:
+        return os.path.exists(os.path.join(base_path, STATE_DIR, "meta.json"))
+
+    def dynamic_window(self, step: int) -> NDArray[np.float32]:
+        """step 时刻的动态特征窗口, (max_states_length, movement_num, 3), 按时间从早到晚排列.
+        返回的是 memmap 的 view, 不会复制数据
+        """
+        if not 0 <= step < self.num_steps:
+            raise IndexError(f"step {step} 超出范围 [0, {self.num_steps})")
+        return self.dynamic[step:step + self.max_states_length]
+
+    def dynamic_windows(self) -> NDArray[np.float32]:
+        """所有 step 的动态特征窗口, (num_steps, max_states_length, movement_num, 3), 不会复制数据
+        """
+        windows = sliding_window_view(self.dynamic, self.max_states_length, axis=0)
+        return np.moveaxis(windows, -1, 1)
+
+    def window(self, step: int, ring_order: bool = False) -> NDArray[np.float32]:
+        """还原 step 时刻完整的 state, (max_states_length, movement_num, 7)
+
+        Args:
+            step (int): 第几个 step
+            ring_order (bool): True 时按 TSCEnvWrapper 缓冲区的顺序排列, 与之前保存的 state_vector.npy 相同;
+                False 时按时间从早到晚排列. Defaults to False.
+        """
+        dynamic = self.dynamic_window(step)
+        static = np.broadcast_to(self.static, dynamic.shape[:2] + self.static.shape[1:])
+        states = np.concatenate([dynamic, static], axis=-1)
+
+        # episode 开始之前的时刻在缓冲区中全部是 0 (包括静态特征)
+        num_empty = max(0, self.max_states_length - 1 - step)
+        states[:num_empty] = 0
+
+        if ring_order:
+            states = np.roll(states, shift=(step + 1) % self.max_states_length, axis=0)
+        return states
@@ -5,6 +5,8 @@ import numpy as np
 from ultralytics import YOLO
 from typing import List, Tuple, Dict
 
+from utils.io_utils.episode_reader import EpisodeReader
+
 # 类型别名定义
 BoundingBox = Tuple[float, float, float, float]  # (x, y, width, height)
 Detection = Tuple[BoundingBox, float, str]  # (bbox, confidence, class_name)
@@ -235,8 +237,9 @@ def process_multiple_images(root_dir: List[str],
     print("正在加载YOLO模型...")
     model = load_yolo_model('yolo11x.pt')  # 可以使用 'yolov8s.pt', 'yolov8m.pt' 等
 
-    for timestep in os.listdir(root_dir):
-        timestep_path = os.path.join(root_dir, timestep, 'high_quality_rgb')
+    # 使用 manifest 获得所有 timestep, 不需要遍历文件夹
+    for timestep in EpisodeReader(root_dir).steps():
+        timestep_path = os.path.join(root_dir, str(timestep), 'high_quality_rgb')
         if not os.path.isdir(timestep_path):
             continue
         
@@ -0,0 +1,7 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 10:04:36
+LastEditors: WANG Maonan
+Description: 数据采集的配置 (写入方式等)
+LastEditTime: 2026-10-18 10:04:38
+'''
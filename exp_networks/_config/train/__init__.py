@@ -0,0 +1,7 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 20:26:02
+LastEditors: WANG Maonan
+Description: RL 训练环境的配置 (reset 的方式等)
+LastEditTime: 2026-10-18 20:26:04
+'''
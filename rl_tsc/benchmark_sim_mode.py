@@ -0,0 +1,117 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 21:19:26
+LastEditors: WANG Maonan
+Description: 比较 micro 和 meso 两种仿真模式
++ 速度: 使用固定配时运行 episode, 统计 reset 时间, 每秒的决策次数和每秒仿真的时间
++ 策略: 在 micro 上测试 micro 和 meso 训练的模型 (<MAP>_<SCENE>_models/ 和 <MAP>_<SCENE>_meso_models/), 比较累积奖励
++ 结果保存在 <MAP>_<SCENE>_sim_mode_benchmark.json
++ Command Example: MAP=France_Massy SCENE=easy_high_density_none python benchmark_sim_mode.py
+LastEditTime: 2026-10-18 21:19:30
+'''
+import os
+import json
+import time
+import torch
+import hydra
+from omegaconf import DictConfig, OmegaConf
+from loguru import logger
+from tshub.utils.get_abs_path import get_abs_path
+
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import VecNormalize, SubprocVecEnv
+
+from utils.env_utils.make_tsc_env import make_env
+from utils.env_utils.sim_mode import SIM_MODES
+
+path_convert = get_abs_path(__file__)
+logger.remove()
+
+NUM_EPISODES = 3 # 测试速度的 episode 数量
+REPEAT_NUMBER = 5 # 固定配时, 每个 traffic phase 重复的次数
+
+def benchmark_speed(params, sim_mode: str, phase_num: int):
+    """固定配时运行 NUM_EPISODES 个 episode
+    """
+    env = make_env(env_index=f'benchmark_{sim_mode}', sim_mode=sim_mode, **params)()
+    reset_time, step_time, num_decisions, sim_seconds = 0.0, 0.0, 0, 0.0
+    for _ in range(NUM_EPISODES):
+        start_time = time.perf_counter()
+        env.reset()
+        reset_time += time.perf_counter() - start_time
+
+        dones, index, infos = False, 0, {'step_time': 0}
+        start_time = time.perf_counter()
+        while not dones:
+            _, _, truncated, dones, infos = env.step((index // REPEAT_NUMBER) % phase_num)
+            index += 1
+        step_time += time.perf_counter() - start_time
+        num_decisions += index
+        sim_seconds += infos['step_time']
+    env.close()
+    return {
+        "reset_s": reset_time / NUM_EPISODES,
+        "decisions_per_s": num_decisions / step_time,
+        "sim_seconds_per_s": sim_seconds / step_time,
+    }
+
+def evaluate_model(params, model_path: str):
+    """在 micro 上测试模型, 返回累积奖励
+    """
+    env = SubprocVecEnv([make_env(env_index='benchmark_eval', sim_mode="micro", **params)])
+    env = VecNormalize.load(load_path=f"{model_path}/last_vec_normalize.pkl", venv=env)
+    env.training = False # 测试的时候不要更新
+    env.norm_reward = False
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model = PPO.load(f"{model_path}/last_rl_model.zip", env=env, device=device)
+    obs = env.reset()
+    dones = False
+    total_reward = 0.0
+    while not dones:
+        action, _ = model.predict(obs, deterministic=True)
+        obs, rewards, dones, infos = env.step(action)
+        total_reward += float(rewards[0])
+    env.close()
+    return total_reward
+
+@hydra.main(
+    config_path=path_convert("../exp_networks/_config/"), # 配置文件所在的文件夹
+    config_name="selector"
+)
+def main(cfg: DictConfig):
+    OmegaConf.resolve(cfg) # 解析 cfg
+    SCENARIO_IDX = f"{cfg.map}_{cfg.scene}" # 场景 id
+    sumo_cfg = path_convert(f"../exp_networks/{cfg.SCENARIO_NAME}/{cfg.SUMOCFG}")
+    params = {
+        'tls_id': cfg.JUNCTION_NAME,
+        'num_seconds': cfg.NUM_SECONDS,
+        'phase_num': cfg.PHASE_NUMBER,
+        'movement_num': cfg.MOVEMENT_NUMBER,
+        'sumo_cfg': sumo_cfg,
+        'use_gui': False,
+        'log_file': path_convert('./log/'),
+    }
+    os.makedirs(params['log_file'], exist_ok=True)
+
+    results = {}
+    for _sim_mode in SIM_MODES:
+        results[_sim_mode] = benchmark_speed(params, _sim_mode, cfg.PHASE_NUMBER)
+        run_idx = SCENARIO_IDX if _sim_mode == "micro" else f"{SCENARIO_IDX}_{_sim_mode}" # 与 train_rl_model.py 相同
+        model_path = path_convert(f'./{run_idx}_models/')
+        if os.path.exists(f"{model_path}/last_rl_model.zip"):
+            results[_sim_mode]["micro_eval_reward"] = evaluate_model(params, model_path)
+
+    print(f"{'mode':<8}{'reset (s)':>12}{'decisions/s':>14}{'sim s/s':>12}{'micro reward':>16}")
+    for _sim_mode, _result in results.items():
+        _reward = _result.get("micro_eval_reward")
+        _reward = "-" if _reward is None else f"{_reward:.2f}" # 没有训练好的模型
+        print(
+            f"{_sim_mode:<8}{_result['reset_s']:>12.2f}{_result['decisions_per_s']:>14.1f}"
+            f"{_result['sim_seconds_per_s']:>12.1f}{_reward:>16}"
+        )
+    with open(path_convert(f"./{SCENARIO_IDX}_sim_mode_benchmark.json"), 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,10 @@
 + Action Design: Choose Next Phase 
 + Reward Design: Average Queue Length
 + Command Example: MAP=France_Massy SCENE=easy_random_perturbation_none python train_rl_model.py
-LastEditTime: 2025-09-08 17:12:56
++ 中观仿真预训练, 之后在微观仿真上 fine-tune:
+    python train_rl_model.py TRAIN.SIM_MODE=meso
+    python train_rl_model.py TRAIN.INIT_MODEL=./<MAP>_<SCENE>_meso_models/last_rl_model.zip
+LastEditTime: 2026-10-18 21:15:03
 '''
 import os
 import torch
@@ -17,6 +20,7 @@ from tshub.utils.get_abs_path import get_abs_path
 from tshub.utils.init_log import set_logger
 
 from utils.env_utils.make_tsc_env import make_env
+from utils.env_utils.env_pool import PrewarmedVecEnv
 from utils.training_utils.simple_int import IntersectionNet
 from utils.training_utils.sb3_utils import VecNormalizeCallback, linear_schedule, CustomEvalCallback
 
@@ -46,10 +50,12 @@ def main(cfg: DictConfig):
     MOVEMENT_NUMBER = cfg.MOVEMENT_NUMBER # 有效 movement 的数量
     # networks & sumocfg
     SUMOCFG = cfg.SUMOCFG
+    SIM_MODE = cfg.TRAIN.SIM_MODE # micro 或 meso
+    RUN_IDX = SCENARIO_IDX if SIM_MODE == "micro" else f"{SCENARIO_IDX}_{SIM_MODE}" # meso 的模型单独保存
 
-    log_path = path_convert(f'./{SCENARIO_IDX}_log/')
-    model_path = path_convert(f'./{SCENARIO_IDX}_models/')
-    tensorboard_path = path_convert(f'./{SCENARIO_IDX}_tensorboard/')
+    log_path = path_convert(f'./{RUN_IDX}_log/')
+    model_path = path_convert(f'./{RUN_IDX}_models/')
+    tensorboard_path = path_convert(f'./{RUN_IDX}_tensorboard/')
     if not os.path.exists(log_path):
         os.makedirs(log_path)
     if not os.path.exists(model_path):
@@ -69,8 +75,20 @@ def main(cfg: DictConfig):
         'sumo_cfg':sumo_cfg,
         'use_gui':False,
         'log_file':log_path,
+        'warmup_seconds':cfg.TRAIN.WARMUP_SECONDS,
+        'snapshot_dir':cfg.TRAIN.SNAPSHOT_DIR,
+        'sim_mode':SIM_MODE,
     }
-    env = SubprocVecEnv([make_env(env_index=f'{i}', **params) for i in range(12)])
+    NUM_ENVS = 12
+    POOL_SIZE = cfg.TRAIN.ENV_POOL_SIZE # 后台 reset 的备用环境数量
+    if POOL_SIZE > 0:
+        env = PrewarmedVecEnv(
+            [make_env(env_index=f'{i}', **params) for i in range(NUM_ENVS)],
+            pool_env_fns=[make_env(env_index=f'{i}', **params) for i in range(NUM_ENVS, NUM_ENVS+POOL_SIZE)],
+            memory_cap_mb=cfg.TRAIN.ENV_POOL_MEMORY_MB,
+        )
+    else:
+        env = SubprocVecEnv([make_env(env_index=f'{i}', **params) for i in range(NUM_ENVS)])
     env = VecNormalize(env, norm_obs=False, norm_reward=True)
 
     eval_env = SubprocVecEnv([make_env(env_index=f'{i}', **params) for i in range(1)])
@@ -116,7 +134,10 @@ def main(cfg: DictConfig):
                 tensorboard_log=tensorboard_path, 
                 device=device
             )
-    model.learn(total_timesteps=1e6, tb_log_name=f"{SCENARIO_IDX}", callback=callback_list)
+    if cfg.TRAIN.INIT_MODEL is not None: # 从预训练的模型开始 (例如 meso 上训练的模型)
+        model.set_parameters(path_convert(cfg.TRAIN.INIT_MODEL), device=device)
+        logger.info(f"SIM: 从 {cfg.TRAIN.INIT_MODEL} 开始训练")
+    model.learn(total_timesteps=1e6, tb_log_name=f"{RUN_IDX}", callback=callback_list)
     
     # #################
     # 保存 model 和 env
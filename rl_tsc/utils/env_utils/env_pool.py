@@ -0,0 +1,219 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 20:33:47
+LastEditors: WANG Maonan
+Description: 预先 reset 的环境池 (VecEnv), 代替 SubprocVecEnv 用于训练
++ 每个环境在单独的进程中 (libsumo 每个进程只能有一个仿真), 除了 num_envs 个正在使用的环境, 还有 pool_size 个备用环境在后台 reset
++ 某个环境结束时, 直接换成已经 reset 好的备用环境, 结束的环境在后台 reset 之后成为备用环境, step 不再等待 SUMO 重启
++ memory_cap_mb: 所有环境进程的内存 (RSS) 超过上限时减少备用环境的数量
++ Example:
+    env = PrewarmedVecEnv(
+        [make_env(env_index=f'{i}', **params) for i in range(12)],
+        pool_env_fns=[make_env(env_index=f'{i}', **params) for i in range(12, 14)], # 2 个备用环境
+    )
+LastEditTime: 2026-10-18 20:33:50
+'''
+import numpy as np
+import multiprocessing as mp
+from loguru import logger
+from collections import deque
+from typing import Any, Callable, List
+
+import gymnasium as gym
+from stable_baselines3.common.env_util import is_wrapped
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv
+from stable_baselines3.common.vec_env.subproc_vec_env import _flatten_obs
+
+def _worker(remote, parent_remote, env_fn_wrapper: CloudpickleWrapper) -> None:
+    """与 SubprocVecEnv 的 worker 类似, 但是 step 结束时不会自动 reset (由 PrewarmedVecEnv 决定何时 reset)
+    """
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                remote.send(env.step(data)) # (obs, reward, terminated, truncated, info)
+            elif cmd == "reset":
+                remote.send(env.reset())
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "env_method":
+                method_name, args, kwargs = data
+                remote.send(getattr(env, method_name)(*args, **kwargs))
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+    except KeyboardInterrupt:
+        pass
+
+def process_rss_mb(pid: int) -> float:
+    """进程的内存 (RSS), 读取 /proc (Linux), 其他系统返回 0
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for _line in f:
+                if _line.startswith("VmRSS:"):
+                    return int(_line.split()[1]) / 1024 # kB
+    except OSError:
+        pass
+    return 0.0
+
+
+class _EnvProcess(object):
+    """一个环境进程, pending 表示有一个还没有读取的返回值 (例如后台 reset)
+    """
+    def __init__(self, ctx, env_fn: Callable[[], gym.Env]) -> None:
+        self.remote, work_remote = ctx.Pipe()
+        self.process = ctx.Process(target=_worker, args=(work_remote, self.remote, CloudpickleWrapper(env_fn)), daemon=True)
+        self.process.start()
+        work_remote.close()
+        self.pending = False
+
+    def send(self, cmd: str, data: Any = None) -> None:
+        self.remote.send((cmd, data))
+        self.pending = True
+
+    def recv(self) -> Any:
+        result = self.remote.recv()
+        self.pending = False
+        return result
+
+    def call(self, cmd: str, data: Any = None) -> Any:
+        self.send(cmd, data)
+        return self.recv()
+
+    def close(self) -> None:
+        try:
+            if self.pending: # 等待后台 reset 结束
+                self.recv()
+            self.send("close")
+        except (BrokenPipeError, EOFError):
+            pass
+        self.process.join(timeout=30)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class PrewarmedVecEnv(VecEnv):
+    def __init__(
+            self,
+            env_fns: List[Callable[[], gym.Env]],
+            pool_env_fns: List[Callable[[], gym.Env]] = None,
+            memory_cap_mb: float = None,
+            start_method: str = None,
+        ) -> None:
+        """
+        Args:
+            env_fns (List[Callable]): 正在使用的环境, 与 SubprocVecEnv 相同
+            pool_env_fns (List[Callable]): 备用环境, 数量就是 pool size. 需要与 env_fns 相同的环境 (例如不同的 Monitor 文件)
+            memory_cap_mb (float): 所有环境进程的内存上限 (MB), None 表示不限制
+            start_method (str): multiprocessing 的启动方式, 默认 forkserver (与 SubprocVecEnv 相同)
+        """
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+        self.memory_cap_mb = memory_cap_mb
+        self.waiting = False
+        self.closed = False
+
+        self.envs = [_EnvProcess(ctx, _env_fn) for _env_fn in env_fns] # 每个位置正在使用的环境
+        self.pool = deque(_EnvProcess(ctx, _env_fn) for _env_fn in (pool_env_fns or []))
+        for _env in self.pool:
+            _env.send("reset") # 备用环境在后台 reset
+
+        observation_space, action_space = self.envs[0].call("get_spaces")
+        super().__init__(len(env_fns), observation_space, action_space)
+        logger.info(f"SIM: 环境池, {self.num_envs} 个环境, {len(self.pool)} 个备用环境")
+
+    def reset(self):
+        for _env in self.envs:
+            _env.send("reset")
+        results = [_env.recv() for _env in self.envs]
+        obs, self.reset_infos = zip(*results)
+        self.reset_infos = list(self.reset_infos)
+        return _flatten_obs(obs, self.observation_space)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        for _env, _action in zip(self.envs, actions):
+            _env.send("step", _action)
+        self.waiting = True
+
+    def step_wait(self):
+        results = [_env.recv() for _env in self.envs]
+        self.waiting = False
+        obs, rewards, terminated, truncated, infos = (list(_x) for _x in zip(*results))
+        dones = [_terminated or _truncated for _terminated, _truncated in zip(terminated, truncated)]
+        for env_idx, done in enumerate(dones):
+            if done: # 与 SubprocVecEnv 相同, 返回 reset 之后的 obs, 结束时的 obs 放在 info 中
+                infos[env_idx]["TimeLimit.truncated"] = truncated[env_idx] and not terminated[env_idx]
+                infos[env_idx]["terminal_observation"] = obs[env_idx]
+                obs[env_idx], self.reset_infos[env_idx] = self._swap(env_idx)
+        if any(dones):
+            self._enforce_memory_cap()
+        return _flatten_obs(obs, self.observation_space), np.stack(rewards), np.stack(dones), infos
+
+    def _swap(self, env_idx: int):
+        """换成备用环境, 结束的环境在后台 reset. 没有备用环境时直接 reset (与 SubprocVecEnv 相同)
+        """
+        finished_env = self.envs[env_idx]
+        if not self.pool:
+            return finished_env.call("reset")
+        self.envs[env_idx] = self.pool.popleft()
+        finished_env.send("reset")
+        self.pool.append(finished_env)
+        return self.envs[env_idx].recv() # 备用环境通常已经 reset 完成
+
+    def memory_mb(self) -> float:
+        return sum(process_rss_mb(_env.process.pid) for _env in [*self.envs, *self.pool])
+
+    def _enforce_memory_cap(self) -> None:
+        if self.memory_cap_mb is None:
+            return
+        memory_mb = self.memory_mb()
+        while self.pool and memory_mb > self.memory_cap_mb:
+            _env = self.pool.pop()
+            memory_mb -= process_rss_mb(_env.process.pid)
+            _env.close()
+            logger.warning(f"SIM: 环境池内存超过 {self.memory_cap_mb} MB, 减少为 {len(self.pool)} 个备用环境")
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.waiting:
+            for _env in self.envs:
+                _env.recv()
+        for _env in [*self.envs, *self.pool]:
+            _env.close()
+        self.closed = True
+
+    # ##########
+    # VecEnv 的其他接口, 只作用于正在使用的环境
+    # ##########
+    def _target_envs(self, indices) -> List[_EnvProcess]:
+        return [self.envs[_idx] for _idx in self._get_indices(indices)]
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        return [_env.call("get_attr", attr_name) for _env in self._target_envs(indices)]
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        for _env in self._target_envs(indices):
+            _env.call("set_attr", (attr_name, value))
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        return [
+            _env.call("env_method", (method_name, method_args, method_kwargs))
+            for _env in self._target_envs(indices)
+        ]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return [_env.call("is_wrapped", wrapper_class) for _env in self._target_envs(indices)]
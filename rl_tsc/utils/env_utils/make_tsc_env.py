@@ -2,7 +2,7 @@
 @Author: WANG Maonan
 @Date: 2023-09-08 17:45:54
 @Description: 创建 TSC Env + Wrapper
-LastEditTime: 2025-07-10 17:29:58
+LastEditTime: 2026-10-18 21:12:40
 '''
 import gymnasium as gym
 from utils.env_utils.tsc_env import TSCEnvironment
@@ -15,6 +15,9 @@ def make_env(
         sumo_cfg:str, use_gui:bool,
         log_file:str, env_index:int,
         trip_info:str=None, 
+        warmup_seconds:int=0,
+        snapshot_dir:str=None,
+        sim_mode:str="micro",
     ):
     def _init() -> gym.Env: 
         tsc_scenario = TSCEnvironment(
@@ -24,6 +27,9 @@ def make_env(
             tls_action_type='choose_next_phase',
             use_gui=use_gui,
             trip_info=trip_info,
+            warmup_seconds=warmup_seconds,
+            snapshot_dir=snapshot_dir,
+            sim_mode=sim_mode,
         )
         tsc_wrapper = TSCEnvWrapper(
             tsc_scenario, tls_id=tls_id, 
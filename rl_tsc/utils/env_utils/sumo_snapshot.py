@@ -0,0 +1,93 @@
+'''
+Author: WANG Maonan
+Date: 2026-10-18 20:21:08
+LastEditors: WANG Maonan
+Description: 保存 SUMO 的状态 (saveState), 启动时通过 load-state 读取, 用于 reset 时跳过 warm-up
++ 快照的文件名由 sumocfg 以及其中引用的 net/route/additional 文件的内容 hash 和 warm-up 时间决定, 修改路网或流量后自动失效
++ 默认保存在 sumocfg 所在文件夹的 .snapshots/ 中
++ sumocfg_with_state 生成启动时读取快照的 <name>.warmup_<s>s.sumocfg (load-state, begin 为快照的时间),
+  这样 tshub reset 时读取的是 warm-up 之后的状态 (车辆, 信号灯的相位和计时), 不需要在 reset 之后再 loadState
+LastEditTime: 2026-10-18 23:47:20
+'''
+import os
+import hashlib
+import xml.etree.ElementTree as ET
+from loguru import logger
+from typing import List
+
+SNAPSHOT_DIR = ".snapshots"
+SUMOCFG_INPUTS = ["net-file", "route-files", "additional-files"] # 影响仿真结果的输入文件
+
+def sumocfg_inputs(sumo_cfg: str) -> List[str]:
+    """sumocfg 中引用的输入文件 (绝对路径)
+    """
+    cfg_dir = os.path.dirname(os.path.abspath(sumo_cfg))
+    input_files = []
+    for _element in ET.parse(sumo_cfg).getroot().iter():
+        if _element.tag in SUMOCFG_INPUTS and _element.get('value'):
+            input_files.extend(
+                os.path.join(cfg_dir, _file.strip())
+                for _file in _element.get('value').split(',') if _file.strip()
+            )
+    return input_files
+
+def sumocfg_hash(sumo_cfg: str) -> str:
+    """sumocfg 和输入文件内容的 hash
+    """
+    sha1 = hashlib.sha1()
+    for _file in [sumo_cfg, *sumocfg_inputs(sumo_cfg)]:
+        with open(_file, 'rb') as f:
+            sha1.update(f.read())
+    return sha1.hexdigest()[:16]
+
+def snapshot_path(sumo_cfg: str, warmup_seconds: int, snapshot_dir: str = None) -> str:
+    """例如 exp_networks/France_Massy/.snapshots/easy_high_density_3f2a..._300s.xml
+    """
+    snapshot_dir = snapshot_dir or os.path.join(os.path.dirname(os.path.abspath(sumo_cfg)), SNAPSHOT_DIR)
+    cfg_name = os.path.splitext(os.path.basename(sumo_cfg))[0]
+    return os.path.join(snapshot_dir, f"{cfg_name}_{sumocfg_hash(sumo_cfg)}_{warmup_seconds}s.xml")
+
+def save_snapshot(conn, file_path: str) -> None:
+    """先保存为临时文件再重命名, 多个进程 (SubprocVecEnv) 同时保存时不会读到不完整的文件
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{os.path.splitext(file_path)[0]}.{os.getpid()}.tmp.xml"
+    conn.simulation.saveState(tmp_path)
+    os.replace(tmp_path, file_path)
+    logger.info(f"SIM: 保存 SUMO 快照 {file_path}")
+
+def sumocfg_with_state(sumo_cfg: str, state_file: str, begin: int) -> str:
+    """生成启动时读取 state_file 的 sumocfg (与 sumo_cfg 在同一个文件夹, 相对路径不变), 从 begin 开始仿真
+    """
+    tree = ET.parse(sumo_cfg)
+    root = tree.getroot()
+    for _section_name, _option, _value in [
+        ("input", "load-state", os.path.abspath(state_file)),
+        ("time", "begin", str(begin)), # 与快照的时间相同, 之前出发的车辆从快照中读取
+    ]:
+        _section = root.find(_section_name)
+        if _section is None:
+            _section = ET.SubElement(root, _section_name)
+        _element = _section.find(_option)
+        if _element is None:
+            _element = ET.SubElement(_section, _option)
+        _element.set("value", _value)
+    content = ET.tostring(root, encoding="unicode")
+
+    state_cfg = f"{os.path.splitext(sumo_cfg)[0]}.warmup_{begin}s.sumocfg"
+    if os.path.exists(state_cfg): # 内容相同时不重复写入 (多个进程同时创建环境)
+        with open(state_cfg, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return state_cfg
+    tmp_cfg = f"{state_cfg}.{os.getpid()}.tmp"
+    with open(tmp_cfg, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_cfg, state_cfg)
+    logger.info(f"SIM: 生成读取快照的配置 {state_cfg}")
+    return state_cfg
+
+def warmup_and_save(conn, file_path: str, warmup_seconds: int) -> None:
+    """仿真到 warmup_seconds 并保存快照 (之后通过 sumocfg_with_state 读取)
+    """
+    conn.simulationStep(warmup_seconds) # 运行到 warmup_seconds 时刻
+    save_snapshot(conn, file_path)
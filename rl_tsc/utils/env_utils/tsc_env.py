@@ -2,12 +2,18 @@
 @Author: WANG Maonan
 @Date: 2023-09-04 20:43:53
 @Description: 信号灯控制环境
-LastEditTime: 2025-07-10 17:30:41
++ warmup_seconds > 0 时, SUMO 启动时直接读取 warm-up 之后的快照 (没有快照时在创建环境时仿真并保存), 见 sumo_snapshot.py
+  reset 返回的 state 以及 tshub 信号灯控制器的相位和计时都是快照时刻的, 与 SUMO 一致
++ sim_mode: micro (默认) 或 meso (中观仿真, 用于预训练), state 和 reward 与 micro 相同, 见 sim_mode.py
+LastEditTime: 2026-10-18 23:47:45
 '''
+import os
 import gymnasium as gym
 
 from typing import List, Dict
 from tshub.tshub_env.tshub_env import TshubEnvironment
+from utils.env_utils.sumo_snapshot import snapshot_path, sumocfg_with_state, warmup_and_save
+from utils.env_utils.sim_mode import sumocfg_for_mode
 
 class TSCEnvironment(gym.Env):
     def __init__(
@@ -17,25 +23,39 @@ class TSCEnvironment(gym.Env):
             tls_ids:List[str], 
             tls_action_type:str, 
             trip_info:str=None, 
-            use_gui:bool=False
+            use_gui:bool=False,
+            warmup_seconds:int=0,
+            snapshot_dir:str=None,
+            sim_mode:str="micro",
         ) -> None:
         super().__init__()
+        sumo_cfg = sumocfg_for_mode(sumo_cfg, sim_mode) # meso 使用生成的 sumocfg (快照也是分开的)
+        # warm-up 的快照, 每个 episode 从 warmup_seconds 开始 (0 表示从头开始仿真)
+        self.warmup_seconds = warmup_seconds
+        self.snapshot_file = snapshot_path(sumo_cfg, warmup_seconds, snapshot_dir) if warmup_seconds > 0 else None
+        env_kwargs = {
+            'is_aircraft_builder_initialized': False, 
+            'is_vehicle_builder_initialized': True, # 用于获得 vehicle 的 waiting time 来计算 reward
+            'is_traffic_light_builder_initialized': True,
+            'tls_ids': tls_ids, 
+            'num_seconds': num_seconds,
+            'tls_action_type': tls_action_type,
+            'use_gui': use_gui,
+            'trip_info': trip_info,
+            'is_libsumo': (not use_gui), # 如果不开界面, 就是用 libsumo
+        }
 
-        self.tsc_env = TshubEnvironment(
-            sumo_cfg=sumo_cfg,
-            is_aircraft_builder_initialized=False, 
-            is_vehicle_builder_initialized=True, # 用于获得 vehicle 的 waiting time 来计算 reward
-            is_traffic_light_builder_initialized=True,
-            tls_ids=tls_ids, 
-            num_seconds=num_seconds,
-            tls_action_type=tls_action_type,
-            use_gui=use_gui,
-            trip_info=trip_info,
-            is_libsumo=(not use_gui), # 如果不开界面, 就是用 libsumo
-        )
+        if self.snapshot_file is not None:
+            if not os.path.exists(self.snapshot_file): # 第一次使用时仿真到 warmup_seconds 并保存快照
+                warmup_env = TshubEnvironment(sumo_cfg=sumo_cfg, **env_kwargs)
+                warmup_env.reset()
+                warmup_and_save(warmup_env.sumo, self.snapshot_file, self.warmup_seconds)
+                warmup_env.close()
+            sumo_cfg = sumocfg_with_state(sumo_cfg, self.snapshot_file, self.warmup_seconds)
+        self.tsc_env = TshubEnvironment(sumo_cfg=sumo_cfg, **env_kwargs)
 
     def reset(self):
-        state_infos = self.tsc_env.reset()
+        state_infos = self.tsc_env.reset() # 使用快照时, SUMO 启动时已经在 warmup_seconds 时刻
         return state_infos
         
     def step(self, action:Dict[str, Dict[str, int]]):
@@ -3,10 +3,12 @@ Author: WANG Maonan
 Date: 2025-06-30 15:37:30
 LastEditors: WANG Maonan
 Description: 将渲染的结果存储为 gif 文件
-LastEditTime: 2025-11-06 18:21:47
+LastEditTime: 2026-10-18 22:16:05
 '''
 import os
+import sys
 import imageio
+import numpy as np
 from PIL import Image
 from tqdm import tqdm
 from PIL import Image, ImageDraw, ImageFont
@@ -14,6 +16,23 @@ from PIL import Image, ImageDraw, ImageFont
 from tshub.utils.get_abs_path import get_abs_path
 path_convert = get_abs_path(__file__)
 
+sys.path.insert(0, path_convert("./collect_data/")) # 使用 collect_data 中的 EpisodeReader
+from utils.io_utils.episode_reader import EpisodeReader
+from utils.io_utils.image_codec import IMAGE_EXTENSIONS
+
+def read_step_image(reader, step, image_name, subfolder=""):
+    """读取 step 中的图片 (RGB). 采集时保存的图片 (low_quality_rgb) 使用 reader 读取 (支持 shard 和不同的 image codec);
+    Blender 渲染的图片 (例如 high_quality_rgb, 见 render_scene.py) 不在 manifest 中, 直接从文件夹读取
+    """
+    if subfolder == "low_quality_rgb":
+        return reader.read_image(step, image_name)
+    for _extension in IMAGE_EXTENSIONS:
+        image_path = os.path.join(reader.base_path, str(step), subfolder, f"{image_name}{_extension}")
+        if os.path.exists(image_path):
+            with Image.open(image_path) as img:
+                return np.array(img.convert("RGB"))
+    raise KeyError(f"step {step} 中没有图片 {os.path.join(subfolder, image_name)}")
+
 def create_gif_from_subdirs(
     root_dir, 
     image_name, 
@@ -47,36 +66,30 @@ def create_gif_from_subdirs(
     full_output_dir = os.path.join(root_dir, output_dir)
     os.makedirs(full_output_dir, exist_ok=True)
     
-    # Get all numbered subdirectories
-    subdirs = sorted(
-        [d for d in os.listdir(root_dir) if os.path.isdir(os.path.join(root_dir, d)) and d.isdigit()],
-        key=lambda x: int(x)
-    )
+    # Get all steps (manifest / shard index / numbered subdirectories)
+    reader = EpisodeReader(root_dir)
+    steps = reader.steps()
     
-    if not subdirs:
-        raise ValueError(f"No numbered subdirectories found in {root_dir}")
+    if not steps:
+        raise ValueError(f"No steps found in {root_dir}")
 
-    # Filter subdirectories based on start_num and end_num
+    # Filter steps based on start_num and end_num
     if start_num is not None:
-        subdirs = [d for d in subdirs if int(d) >= start_num]
+        steps = [d for d in steps if d >= start_num]
     if end_num is not None:
-        subdirs = [d for d in subdirs if int(d) <= end_num]
+        steps = [d for d in steps if d <= end_num]
     
     images_for_gif = []
     missing_images = []
     
-    for subdir in tqdm(subdirs, desc="Processing images", disable=not verbose):
-        # Construct image path (handle subfolder if provided)
-        if subfolder:
-            image_path = os.path.join(root_dir, subdir, subfolder, f"{image_name}.png")
-        else:
-            image_path = os.path.join(root_dir, subdir, f"{image_name}.png")
-        
-        if not os.path.exists(image_path):
-            missing_images.append(image_path)
+    for step in tqdm(steps, desc="Processing images", disable=not verbose):
+        try:
+            img = Image.fromarray(read_step_image(reader, step, image_name, subfolder))
+        except KeyError as e:
+            missing_images.append(str(e))
             continue
             
-        with Image.open(image_path) as img:
+        with img:
             # Resize the image
             width_percent = (gif_width / float(img.size[0]))
             height_size = int((float(img.size[1]) * float(width_percent)))
@@ -93,7 +106,7 @@ def create_gif_from_subdirs(
                     font = ImageFont.load_default()
                 
                 # 准备时间戳文本
-                timestamp_text = timestamp_format.format(subdir)
+                timestamp_text = timestamp_format.format(step)
                 bbox = draw.textbbox((0, 0), timestamp_text, font=font)
                 text_width = bbox[2] - bbox[0]
                 text_height = bbox[3] - bbox[1]
@@ -116,8 +129,9 @@ def create_gif_from_subdirs(
                 draw.text(position, timestamp_text, fill="white", font=font)
             images_for_gif.append(img_resized)
     
+    reader.close()
     if not images_for_gif:
-        raise FileNotFoundError(f"No images found matching {image_name}.png in {root_dir}")
+        raise FileNotFoundError(f"No images found matching {image_name} in {root_dir}")
     
     if missing_images and verbose:
         print(f"Warning: {len(missing_images)} images missing (e.g., {missing_images[0]})")